@@ -0,0 +1,145 @@
+"""
+Persistent on-disk cache for preprocessed training arrays
+Stores one .npy file per entry, keyed by a caller-supplied key (e.g. ProductPhotos.Id)
+and validated against a source-file fingerprint, with size-capped LRU eviction
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def file_fingerprint(path, with_hash=False):
+    """Returns a dict identifying the current contents of a file (size, mtime and optional SHA-1)"""
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    if with_hash:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(chunk)
+        fingerprint["sha1"] = sha1.hexdigest()
+
+    return fingerprint
+
+
+class ArrayCache:
+    """Size-capped LRU cache of numpy arrays stored as individual .npy files"""
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.index = self._load_index()
+        self.total_bytes = sum(entry["bytes"] for entry in self.index.values())
+
+    def _load_index(self):
+        """Loads the entry index, starting over if it is missing or unreadable"""
+        index_file = self.root / self.INDEX_FILE
+        if not index_file.exists():
+            return {}
+
+        try:
+            with open(index_file) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache index {index_file}: {e}")
+            for stale in self.root.glob("*.npy"):
+                stale.unlink(missing_ok=True)
+            return {}
+
+    def _entry_file(self, key):
+        return hashlib.sha1(str(key).encode('utf-8')).hexdigest() + ".npy"
+
+    def contains(self, key, fingerprint):
+        """Returns True if a fresh entry exists for key, without reading it or counting a hit"""
+        entry = self.index.get(str(key))
+        return entry is not None and entry["fingerprint"] == fingerprint
+
+    def get(self, key, fingerprint):
+        """Returns the cached array (memory-mapped, read-only) or None if missing or stale"""
+        key = str(key)
+        entry = self.index.get(key)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            self.misses += 1
+            return None
+
+        try:
+            array = np.load(self.root / entry["file"], mmap_mode='r')
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        entry["last_access"] = time.time()
+        self.hits += 1
+        return array
+
+    def put(self, key, fingerprint, array):
+        """Stores an array for key, replacing any previous version, then enforces the size cap"""
+        key = str(key)
+        if key in self.index:
+            self._remove(key)
+
+        file_name = self._entry_file(key)
+        tmp_path = self.root / (file_name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, self.root / file_name)
+
+        size = (self.root / file_name).stat().st_size
+        self.index[key] = {
+            "file": file_name,
+            "fingerprint": fingerprint,
+            "bytes": size,
+            "last_access": time.time()
+        }
+        self.total_bytes += size
+
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _remove(self, key):
+        entry = self.index.pop(key)
+        self.total_bytes -= entry["bytes"]
+        (self.root / entry["file"]).unlink(missing_ok=True)
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is back under 90% of its cap"""
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for key, _ in sorted(self.index.items(), key=lambda item: item[1]["last_access"]):
+            if self.total_bytes <= target:
+                break
+            self._remove(key)
+            evicted += 1
+        logger.info(f"Evicted {evicted} entries from {self.root} ({self.total_bytes / 1e6:.1f} MB kept)")
+
+    def save(self):
+        """Persists the entry index atomically"""
+        index_file = self.root / self.INDEX_FILE
+        tmp_file = self.root / (self.INDEX_FILE + ".tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_file, index_file)
+
+    def stats(self):
+        """Returns hit/miss counters and current size"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.index),
+            "bytes": self.total_bytes
+        }
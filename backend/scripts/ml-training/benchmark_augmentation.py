@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Augmentation Benchmark
+Compares steps/sec of the legacy ImageDataGenerator.flow augmentation against the
+in-graph, batched augmentation pipeline used by ModelTrainer, on synthetic images
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+import numpy as np
+
+from train_model import ModelTrainer, import_ml_modules
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def measure(iterator, steps, step_fn=None):
+    """Returns steps/sec over `steps` batches, after one warm-up batch"""
+    batch = next(iterator)
+    if step_fn:
+        step_fn(batch)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        batch = next(iterator)
+        if step_fn:
+            step_fn(batch)
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark training-time data augmentation')
+    parser.add_argument('--images', type=int, default=512, help='Number of synthetic images')
+    parser.add_argument('--steps', type=int, default=50, help='Batches measured per pipeline')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--with-model', action='store_true',
+                        help='Also run a training step on the MobileNetV2 model for every batch')
+    args = parser.parse_args()
+
+    import_ml_modules()
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    trainer = ModelTrainer(
+        job_id='benchmark',
+        connection_string='',
+        storage_path=tempfile.gettempdir(),
+        output_path=tempfile.gettempdir()
+    )
+    trainer.batch_size = args.batch_size
+
+    rng = np.random.default_rng(42)
+    X = rng.integers(0, 256, size=(args.images, *trainer.img_size, 3), dtype=np.uint8)
+    y = rng.integers(0, 10, size=args.images)
+
+    step_fn = None
+    if args.with_model:
+        model = trainer.create_model(num_classes=10)
+        step_fn = lambda batch: model.train_on_batch(batch[0], batch[1])
+
+    # Before: per-image NumPy/SciPy transforms in Python
+    datagen = ImageDataGenerator(
+        rotation_range=15,
+        width_shift_range=0.1,
+        height_shift_range=0.1,
+        brightness_range=[0.8, 1.2],
+        horizontal_flip=True,
+        zoom_range=0.1
+    )
+    legacy = measure(iter(datagen.flow(X.astype(np.float32) / 255.0, y, batch_size=args.batch_size)), args.steps, step_fn)
+
+    # After: batched Keras preprocessing layers inside the tf.data graph
+    dataset = trainer._array_dataset(X, y, training=True).repeat()
+    in_graph = measure(iter(dataset), args.steps, step_fn)
+
+    results = {
+        "images": args.images,
+        "batch_size": args.batch_size,
+        "steps": args.steps,
+        "with_model": args.with_model,
+        "image_data_generator_steps_per_sec": round(legacy, 2),
+        "in_graph_steps_per_sec": round(in_graph, 2),
+        "speedup": round(in_graph / legacy, 2)
+    }
+    logger.info(f"ImageDataGenerator: {legacy:.2f} steps/sec, in-graph: {in_graph:.2f} steps/sec "
+                f"({in_graph / legacy:.1f}x)")
+    print(json.dumps(results, indent=2))
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+End-to-end Training Pipeline Benchmark
+Generates synthetic product catalogs on disk with a SQLite stand-in for the
+ProductPhotos/Products/ModelTrainingJobs/ModelMetadata tables, runs ModelTrainer at
+several scales and reports per-stage wall time, CPU time, throughput and peak memory
+as JSON and CSV, optionally compared against a stored baseline
+"""
+
+import re
+import sys
+import csv
+import json
+import uuid
+import shutil
+import time
+import sqlite3
+import argparse
+import logging
+import platform
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Photo layout of the generated storage, the default of train_model --photo-key-template
+PHOTO_KEY_TEMPLATE = "products/{file_name}"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "Products" (
+    "Id" TEXT PRIMARY KEY, "SKU" TEXT, "Name" TEXT, "IsActive" BOOLEAN
+);
+CREATE TABLE IF NOT EXISTS "ProductPhotos" (
+    "Id" TEXT PRIMARY KEY, "ProductId" TEXT, "FileName" TEXT, "DisplayOrder" INTEGER
+);
+CREATE TABLE IF NOT EXISTS "ModelTrainingJobs" (
+    "Id" TEXT PRIMARY KEY, "Status" TEXT, "ProgressPercentage" INTEGER, "CurrentStage" TEXT,
+    "StartedAt" TEXT, "CompletedAt" TEXT, "ErrorMessage" TEXT, "DurationSeconds" INTEGER,
+    "ResultModelVersion" TEXT, "StageTimings" TEXT, "SupersededByJobId" TEXT, "CreatedAt" TEXT, "UpdatedAt" TEXT
+);
+CREATE TABLE IF NOT EXISTS "ModelMetadata" (
+    "Id" TEXT PRIMARY KEY, "Version" TEXT, "TrainedAt" TEXT, "ModelPath" TEXT, "AccuracyMetrics" TEXT,
+    "TotalPhotosUsed" INTEGER, "TotalProductsUsed" INTEGER, "IsActive" BOOLEAN, "CreatedAt" TEXT, "UpdatedAt" TEXT
+);
+"""
+
+# PostgreSQL constructs used by ModelTrainer and ProgressReporter, rewritten for SQLite
+SQL_REWRITES = [
+    (re.compile(r'%s'), "?"),
+    (re.compile(r'EXTRACT\(EPOCH FROM \(NOW\(\) - "(\w+)"\)\)::int'),
+     r"""CAST(strftime('%s', 'now') - strftime('%s', "\1") AS INTEGER)"""),
+    (re.compile(r'NOW\(\)'), "CURRENT_TIMESTAMP"),
+    (re.compile(r'gen_random_uuid\(\)'), "lower(hex(randomblob(16)))")
+]
+
+
+REPORT_FIELDS = ["scale", "run", "stage", "wall_seconds", "cpu_seconds", "rss_delta_mb", "peak_rss_mb",
+                 "photos_per_sec", "baseline_wall_seconds", "change", "error"]
+
+
+class SqliteCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        for pattern, replacement in SQL_REWRITES:
+            sql = pattern.sub(replacement, sql)
+        self.cursor.execute(sql, tuple(str(p) if isinstance(p, uuid.UUID) else p for p in params))
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+class SqliteConnection:
+    """The subset of the psycopg2 connection interface ModelTrainer uses, backed by SQLite"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)  # Shared like a psycopg2 connection
+        # A benchmark run is the only training on its database, so the training lock is always free
+        self.conn.create_function("pg_try_advisory_lock", 1, lambda key: True)
+        self.closed = False
+
+    def cursor(self):
+        return SqliteCursor(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+        self.closed = True
+
+
+def parse_scale(value):
+    """'50x10' -> (50 products, 10 photos per product)"""
+    products, photos = value.lower().split('x')
+    return int(products), int(photos)
+
+
+def generate_catalog(root, products, photos_per_product, image_size, quality, seed=42):
+    """
+    Writes a synthetic catalog under root/storage/products/ (the backend layout) and a SQLite
+    database at root/catalog.db. Each product has its own random texture; its photos are
+    shifted, scaled and noisy views of it, so the classifier has something to learn.
+    Reuses an existing catalog generated with the same parameters and photo layout.
+    """
+    root = Path(root)
+    db_path = root / "catalog.db"
+    if (root / "catalog.json").exists():
+        with open(root / "catalog.json") as f:
+            if json.load(f).get("layout") == PHOTO_KEY_TEMPLATE:
+                return db_path
+
+    shutil.rmtree(root, ignore_errors=True)  # Left over from an interrupted generation
+    rng = np.random.default_rng(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    width, height = image_size
+    photo_dir = root / "storage" / "products"
+    photo_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    for p in range(products):
+        product_id = str(uuid.UUID(int=int(rng.integers(2 ** 63)) << 64 | p))
+        conn.execute('INSERT INTO "Products" VALUES (?, ?, ?, 1)', (product_id, f"SYN-{p:05d}", f"Synthetic {p}"))
+        texture = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)).resize(
+            (width * 2, height * 2), Image.Resampling.BICUBIC)
+
+        for k in range(photos_per_product):
+            left = int(rng.integers(0, width // 2))
+            top = int(rng.integers(0, height // 2))
+            view = texture.crop((left, top, left + width + left // 2, top + height + top // 2)).resize((width, height))
+            noise = rng.normal(0, 8, (height, width, 3))
+            pixels = np.clip(np.asarray(view, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+            file_name = f"{p:05d}_{k:03d}.jpg"
+            Image.fromarray(pixels).save(photo_dir / file_name, quality=quality)
+            conn.execute('INSERT INTO "ProductPhotos" VALUES (?, ?, ?, ?)',
+                         (str(uuid.uuid4()), product_id, file_name, k))
+    conn.commit()
+    conn.close()
+
+    with open(root / "catalog.json", 'w') as f:
+        json.dump({"products": products, "photos_per_product": photos_per_product,
+                   "image_size": list(image_size), "jpeg_quality": quality, "layout": PHOTO_KEY_TEMPLATE}, f)
+    logger.info(f"Generated {products * photos_per_product} photos in {time.perf_counter() - start:.1f}s at {root}")
+    return db_path
+
+
+def create_job(db_path):
+    conn = sqlite3.connect(db_path)
+    job_id = str(uuid.uuid4())
+    conn.execute("""INSERT INTO "ModelTrainingJobs" ("Id", "Status", "ProgressPercentage", "CreatedAt", "UpdatedAt")
+                    VALUES (?, 'Queued', 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)""", (job_id,))
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def run_case(task):
+    """
+    Runs one benchmark case in a fresh process (so peak RSS belongs to this case) and
+    returns its stage timings. 'data' mode stops after the TensorFlow-free data stages.
+    An exception is recorded under "error" (with the stages completed so far) rather than
+    raised, so the other cases still run.
+    """
+    catalog_dir, output_dir, mode, trainer_options, epochs = task
+    from train_model import ModelTrainer
+
+    class BenchmarkTrainer(ModelTrainer):
+        def _connect(self):
+            return SqliteConnection(str(Path(catalog_dir) / "catalog.db"))
+
+    trainer = None
+    error = None
+    start = time.perf_counter()
+    try:
+        job_id = create_job(Path(catalog_dir) / "catalog.db")
+        trainer = BenchmarkTrainer(job_id=job_id, connection_string='', storage_path=Path(catalog_dir) / "storage",
+                                   output_path=output_dir, **trainer_options)
+        trainer.epochs = epochs
+
+        if mode == 'full':
+            success = trainer.train()
+        else:
+            with trainer.timings.stage("fetch_product_photos"):
+                photos = trainer.fetch_product_photos()
+            with trainer.timings.stage("download_and_prepare_dataset"):
+                product_photos = trainer.download_and_prepare_dataset(photos)
+            if trainer.duplicates != 'off':
+                with trainer.timings.stage("deduplicate_photos"):
+                    product_photos = trainer.deduplicate_photos(product_photos)
+            with trainer.timings.stage("augment_and_load_data"):
+                trainer.augment_and_load_data(product_photos)
+            trainer.progress.shutdown()
+            trainer.conn.close()
+            success = True
+    except Exception as e:
+        logger.exception("Benchmark case failed")
+        success = False
+        error = f"{type(e).__name__}: {e}"
+
+    timings = failed_case(error)
+    if trainer is not None:
+        timings.update(trainer.timings.to_dict())
+    timings["success"] = success
+    timings["wall_seconds"] = round(time.perf_counter() - start, 3)
+    split = trainer.run_info.get("split", {}) if trainer is not None else {}
+    timings["photos"] = split.get("train_photos", 0) + split.get("validation_photos", 0)
+    return timings
+
+
+def failed_case(error):
+    """Timings of a case that produced none, e.g. because its process died"""
+    return {"success": False, "error": error, "wall_seconds": 0.0, "peak_rss_mb": None,
+            "stages": [], "epochs": [], "photos": 0}
+
+
+def rows_for(scale, run, timings):
+    """Flattens one case into report rows: one per stage plus a 'total' row"""
+    rows = []
+    for stage in timings["stages"]:
+        rows.append({
+            "scale": scale, "run": run, "stage": stage["stage"],
+            "wall_seconds": stage["wall_seconds"], "cpu_seconds": stage["cpu_seconds"],
+            "rss_delta_mb": stage["rss_delta_mb"], "peak_rss_mb": stage["process_peak_rss_mb"],
+            "photos_per_sec": round(timings["photos"] / stage["wall_seconds"], 1)
+            if stage["wall_seconds"] > 0 and timings["photos"] else None
+        })
+    epochs = [e["images_per_sec"] for e in timings["epochs"] if e["images_per_sec"]]
+    rows.append({
+        "scale": scale, "run": run, "stage": "total",
+        "wall_seconds": timings["wall_seconds"], "cpu_seconds": None, "rss_delta_mb": None,
+        "peak_rss_mb": timings["peak_rss_mb"],
+        "photos_per_sec": round(float(np.median(epochs)), 1) if epochs else None,  # Median training images/sec
+        "error": timings.get("error")
+    })
+    return rows
+
+
+def compare(rows, baseline_rows, tolerance, min_seconds):
+    """Returns wall-time regressions beyond tolerance (fraction) and a min_seconds noise floor"""
+    baseline = {(r["scale"], r["run"], r["stage"]): r for r in baseline_rows}
+    regressions = []
+    for row in rows:
+        before = baseline.get((row["scale"], row["run"], row["stage"]))
+        if before is None or row.get("error") or before.get("error"):
+            continue
+        delta = row["wall_seconds"] - before["wall_seconds"]
+        row["baseline_wall_seconds"] = before["wall_seconds"]
+        row["change"] = round(delta / before["wall_seconds"], 3) if before["wall_seconds"] > 0 else None
+        if delta > min_seconds and delta > before["wall_seconds"] * tolerance:
+            regressions.append(row)
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the training pipeline on synthetic catalogs')
+    parser.add_argument('--scales', default='10x5,50x10,200x10',
+                        help='Comma-separated <products>x<photos per product> catalog sizes')
+    parser.add_argument('--image-size', default='1024x768', help='Synthetic photo size, WIDTHxHEIGHT')
+    parser.add_argument('--jpeg-quality', type=int, default=85)
+    parser.add_argument('--mode', choices=['full', 'data'], default='full',
+                        help='full: the whole train() flow; data: only the TensorFlow-free data stages')
+    parser.add_argument('--epochs', type=int, default=3, help='Training epochs per case in full mode')
+    parser.add_argument('--training-mode', choices=['full', 'features'], default='full')
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--warm', action='store_true',
+                        help='Run each scale a second time with the caches of the first run')
+    parser.add_argument('--work-dir', default='.benchmark', help='Catalogs and per-case output directories')
+    parser.add_argument('--output', default='benchmark_report.json',
+                        help='JSON report path; a CSV with the same rows is written next to it')
+    parser.add_argument('--baseline', default=None, help='Previous JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Wall-time increase over the baseline (fraction) reported as a regression')
+    parser.add_argument('--min-seconds', type=float, default=0.5,
+                        help='Ignore wall-time differences smaller than this')
+    args = parser.parse_args()
+
+    image_size = tuple(int(v) for v in args.image_size.lower().split('x'))
+    work_dir = Path(args.work_dir).resolve()
+    trainer_options = {"training_mode": args.training_mode, "streaming": args.streaming}
+
+    rows = []
+    failures = []
+    for scale in args.scales.split(','):
+        products, photos_per_product = parse_scale(scale)
+        catalog_dir = work_dir / f"catalog-{scale}-{image_size[0]}x{image_size[1]}-q{args.jpeg_quality}"
+        generate_catalog(catalog_dir, products, photos_per_product, image_size, args.jpeg_quality)
+
+        output_dir = work_dir / f"run-{scale}-{int(time.time())}"
+        for run in (['cold', 'warm'] if args.warm else ['cold']):
+            logger.info(f"=== Scale {scale} ({products * photos_per_product} photos), {run} run ===")
+            task = (str(catalog_dir), str(output_dir), args.mode, trainer_options, args.epochs)
+            # A fresh process per case, so imports, caches and peak RSS do not carry over
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                    timings = pool.submit(run_case, task).result()
+            except Exception as e:  # The case's process died (e.g. killed when out of memory)
+                timings = failed_case(f"{type(e).__name__}: {e}")
+            if not timings["success"]:
+                failures.append(f"{scale} {run}")
+                logger.error(f"Scale {scale} {run} run failed: {timings.get('error') or 'see the log above'}")
+            rows.extend(rows_for(scale, run, timings))
+
+    report = {
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": git_commit(),
+        "platform": {"python": platform.python_version(), "machine": platform.machine(),
+                     "cpus": multiprocessing.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        "rows": rows
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f)["rows"], args.tolerance, args.min_seconds)
+        report["baseline"] = args.baseline
+        report["regressions"] = regressions
+
+    output = Path(args.output)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    with open(output.with_suffix('.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"\n{'scale':>12} {'run':>5} {'stage':<30} {'wall s':>9} {'CPU s':>9} {'RSS +MB':>8} {'peak MB':>8} {'photos/s':>9} {'vs base':>8}")
+    for row in rows:
+        change = f"{row['change']:+.0%}" if row.get('change') is not None else ''
+        print(f"{row['scale']:>12} {row['run']:>5} {row['stage']:<30} {row['wall_seconds']:>9.2f} "
+              f"{row['cpu_seconds'] if row['cpu_seconds'] is not None else '':>9} "
+              f"{row['rss_delta_mb'] if row['rss_delta_mb'] is not None else '':>8} "
+              f"{row['peak_rss_mb'] or '':>8} {row['photos_per_sec'] or '':>9} {change:>8}")
+    logger.info(f"Report written to {output} and {output.with_suffix('.csv')}")
+
+    for row in regressions:
+        logger.error(f"Regression: {row['scale']} {row['run']} {row['stage']} "
+                     f"{row['baseline_wall_seconds']:.2f}s -> {row['wall_seconds']:.2f}s")
+    if failures:
+        logger.error(f"Failed cases: {', '.join(failures)}")
+    if regressions or failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Per-job training checkpoints
+Each checkpoint is a directory holding the trainable weights, the optimizer state and a
+JSON state file (epoch, class mapping, dataset manifest hash). It is written to a
+temporary directory and renamed into place, so an interrupted write never leaves a
+partial checkpoint behind
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "state.json"
+WEIGHTS_FILE = "weights.npz"
+OPTIMIZER_FILE = "optimizer.npz"
+
+
+def _save_arrays(path, arrays):
+    with open(path, 'wb') as f:
+        np.savez(f, *arrays)
+
+
+def _load_arrays(path):
+    with np.load(path) as data:
+        return [data[f"arr_{i}"] for i in range(len(data.files))]
+
+
+class CheckpointStore:
+    """Keeps the latest epoch checkpoint of one training job"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def save(self, epoch, weights, optimizer_weights, state):
+        """Atomically writes the checkpoint for a completed epoch and drops older ones"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_dir = self.root / f"epoch-{epoch:04d}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+
+        _save_arrays(tmp_dir / WEIGHTS_FILE, weights)
+        _save_arrays(tmp_dir / OPTIMIZER_FILE, optimizer_weights)
+        with open(tmp_dir / STATE_FILE, 'w') as f:
+            json.dump({**state, "epoch": epoch, "saved_at": time.time()}, f)
+
+        final_dir = self.root / f"epoch-{epoch:04d}"
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+
+        for old in self.root.glob("epoch-*"):
+            if old != final_dir:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def load_latest(self):
+        """Returns (state, weights, optimizer weights) of the newest complete checkpoint, or None"""
+        if not self.root.exists():
+            return None
+
+        for checkpoint_dir in sorted(self.root.glob("epoch-[0-9][0-9][0-9][0-9]"), reverse=True):
+            try:
+                with open(checkpoint_dir / STATE_FILE) as f:
+                    state = json.load(f)
+                return state, _load_arrays(checkpoint_dir / WEIGHTS_FILE), _load_arrays(checkpoint_dir / OPTIMIZER_FILE)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable checkpoint {checkpoint_dir}: {e}")
+        return None
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @staticmethod
+    def remove_stale(parent, max_age_days=7):
+        """Removes checkpoint directories of other jobs not written to for max_age_days"""
+        parent = Path(parent)
+        if not parent.exists():
+            return
+        cutoff = time.time() - max_age_days * 86400
+        for job_dir in parent.iterdir():
+            if job_dir.is_dir() and job_dir.stat().st_mtime < cutoff:
+                logger.info(f"Removing stale checkpoints {job_dir}")
+                shutil.rmtree(job_dir, ignore_errors=True)
@@ -0,0 +1,122 @@
+"""
+Multi-worker training cluster configuration
+Reads and builds the TF_CONFIG cluster description used by MultiWorkerMirroredStrategy
+(kept free of TensorFlow imports so the role of a process is known before TensorFlow
+loads), and launches a local cluster of training processes on one host
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+
+def cluster_role(environ=None):
+    """
+    Returns {"num_workers", "worker_index", "is_chief", "workers"} from TF_CONFIG. The chief
+    is the "chief" task if the cluster has one, otherwise worker 0.
+    """
+    environ = os.environ if environ is None else environ
+    if not environ.get('TF_CONFIG'):
+        raise ValueError("Distributed training requires TF_CONFIG (or --worker-hosts and --worker-index)")
+
+    try:
+        config = json.loads(environ['TF_CONFIG'])
+        cluster = config['cluster']
+        task_type, task_index = config['task']['type'], int(config['task']['index'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid TF_CONFIG: {e}") from e
+
+    chiefs = cluster.get('chief', [])
+    workers = chiefs + cluster.get('worker', [])
+    if task_type not in ('chief', 'worker') or not workers:
+        raise ValueError(f"TF_CONFIG task {task_type}:{task_index} is not a chief or worker of the cluster")
+
+    worker_index = task_index if task_type == 'chief' else len(chiefs) + task_index
+    return {
+        "num_workers": len(workers),
+        "worker_index": worker_index,
+        "is_chief": worker_index == 0,
+        "workers": workers
+    }
+
+
+def tf_config(workers, worker_index):
+    """Returns the TF_CONFIG value for worker worker_index of a cluster of host:port addresses"""
+    return json.dumps({
+        "cluster": {"worker": list(workers)},
+        "task": {"type": "worker", "index": worker_index}
+    })
+
+
+def free_ports(count):
+    """Returns count TCP ports that are currently free on localhost"""
+    sockets = []
+    try:
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('localhost', 0))
+            sockets.append(sock)
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def _cpu_slices(num_workers):
+    """Splits the CPUs available to this process into one disjoint set per worker (None if not possible)"""
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return None
+    if len(cpus) < num_workers:
+        return None
+    per_worker = len(cpus) // num_workers
+    return [set(cpus[i * per_worker:(i + 1) * per_worker]) for i in range(num_workers)]
+
+
+def launch_local_workers(script, arguments, num_workers, poll_interval=1.0):
+    """
+    Runs num_workers copies of the training script as a local cluster, each with its own
+    TF_CONFIG and (on Linux) pinned to its own share of the CPUs, so thread pools and decode
+    workers size themselves to that share. When a worker fails the others are stopped, since
+    the survivors would block on its collectives. Returns each worker's exit code.
+    """
+    workers = [f"localhost:{port}" for port in free_ports(num_workers)]
+    cpu_slices = _cpu_slices(num_workers)
+    logger.info(f"Launching {num_workers} local training workers on {', '.join(workers)}")
+
+    processes = []
+    for index in range(num_workers):
+        env = dict(os.environ, TF_CONFIG=tf_config(workers, index))
+        preexec = None
+        if cpu_slices:
+            cpus = cpu_slices[index]
+            preexec = lambda cpus=cpus: os.sched_setaffinity(0, cpus)
+        processes.append(subprocess.Popen([sys.executable, script, *arguments, '--distributed'],
+                                          env=env, preexec_fn=preexec))
+
+    codes = [None] * num_workers
+    try:
+        while None in codes:
+            time.sleep(poll_interval)
+            for index, process in enumerate(processes):
+                if codes[index] is None:
+                    codes[index] = process.poll()
+            failed = [index for index, code in enumerate(codes) if code not in (None, 0)]
+            if failed and None in codes:
+                logger.error(f"Worker {failed[0]} exited with code {codes[failed[0]]}; stopping the other workers")
+                break
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for index, process in enumerate(processes):
+            codes[index] = process.wait()
+
+    return codes
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Product Embedding Index
+Stores a few L2-normalised prototype embeddings per product (float16, one contiguous
+binary file plus a JSON sidecar) and answers cosine top-k queries. Products can be
+added or removed in place from their photos, without retraining a classifier.
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+import numpy as np
+
+from image_loader import decode_photos, default_workers
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "embeddings.bin"
+INDEX_FILE = "embeddings_index.json"
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def compute_prototypes(vectors, max_prototypes):
+    """
+    Reduces a product's embeddings to at most max_prototypes unit vectors:
+    the normalised centroid for 1, otherwise a few rounds of spherical k-means
+    seeded with farthest-point initialisation (deterministic)
+    """
+    vectors = _normalize(vectors)
+    if max_prototypes <= 1 or len(vectors) == 1:
+        return _normalize(vectors.mean(axis=0, keepdims=True))
+    if len(vectors) <= max_prototypes:
+        return vectors
+
+    centers = [vectors[0]]
+    for _ in range(max_prototypes - 1):
+        similarity = np.max(vectors @ np.array(centers).T, axis=1)
+        centers.append(vectors[np.argmin(similarity)])
+    centers = np.array(centers)
+
+    for _ in range(10):
+        assignment = np.argmax(vectors @ centers.T, axis=1)
+        updated = np.array([
+            vectors[assignment == k].mean(axis=0) if np.any(assignment == k) else centers[k]
+            for k in range(len(centers))
+        ])
+        updated = _normalize(updated)
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+
+    return centers
+
+
+class EmbeddingIndex:
+    """Per-product prototype embeddings with vectorised cosine top-k search"""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.vectors = np.zeros((0, dim), dtype=np.float16)  # Rows grouped by product
+        self.row_products = []  # Product id of each row
+        self.skus = {}  # Product id -> SKU
+
+    @property
+    def product_ids(self):
+        """Product ids in row order (each listed once)"""
+        return list(dict.fromkeys(self.row_products))
+
+    @classmethod
+    def load(cls, directory):
+        """Loads an index written by save()"""
+        directory = Path(directory)
+        with open(directory / INDEX_FILE) as f:
+            sidecar = json.load(f)
+
+        index = cls(sidecar["dim"])
+        index.vectors = np.fromfile(directory / VECTORS_FILE, dtype='<f2').reshape(-1, index.dim)
+        index.row_products = sidecar["rows"]
+        index.skus = sidecar["skus"]
+        return index
+
+    def save(self, directory):
+        """Writes the vectors and sidecar atomically (temp file + rename)"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        tmp_vectors = directory / (VECTORS_FILE + ".tmp")
+        np.ascontiguousarray(self.vectors, dtype='<f2').tofile(tmp_vectors)
+
+        tmp_index = directory / (INDEX_FILE + ".tmp")
+        with open(tmp_index, 'w') as f:
+            json.dump({
+                "dim": self.dim,
+                "dtype": "float16",
+                "num_products": len(self.skus),
+                "rows": self.row_products,
+                "skus": self.skus
+            }, f)
+
+        os.replace(tmp_vectors, directory / VECTORS_FILE)
+        os.replace(tmp_index, directory / INDEX_FILE)
+
+    def remove_product(self, product_id):
+        """Removes all rows of a product; returns the number of rows removed"""
+        keep = np.array([pid != product_id for pid in self.row_products], dtype=bool)
+        removed = int(len(keep) - keep.sum())
+        self.vectors = self.vectors[keep]
+        self.row_products = [pid for pid in self.row_products if pid != product_id]
+        self.skus.pop(product_id, None)
+        return removed
+
+    def set_product(self, product_id, sku, embeddings, max_prototypes=3):
+        """Replaces a product's rows with prototypes computed from its photo embeddings"""
+        self.remove_product(product_id)
+        prototypes = compute_prototypes(embeddings, max_prototypes)
+        self.vectors = np.concatenate([self.vectors, prototypes.astype(np.float16)])
+        self.row_products.extend([product_id] * len(prototypes))
+        self.skus[product_id] = sku
+        return len(prototypes)
+
+    def search(self, queries, k=5):
+        """
+        Returns, for each query embedding, the top-k (product_id, cosine similarity)
+        pairs, scoring each product by its best-matching prototype
+        """
+        if not self.row_products:
+            return [[] for _ in range(len(queries))]
+
+        queries = _normalize(np.atleast_2d(queries))
+        scores = queries @ self.vectors.astype(np.float32).T  # (queries, rows)
+
+        # Rows are grouped by product, so a segmented max gives per-product scores
+        product_ids = self.product_ids
+        starts = np.flatnonzero(np.r_[True, np.array(self.row_products[1:]) != np.array(self.row_products[:-1])])
+        product_scores = np.maximum.reduceat(scores, starts, axis=1)  # (queries, products)
+
+        k = min(k, len(product_ids))
+        top = np.argpartition(-product_scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(product_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(product_ids[idx], float(score)) for idx, score in zip(row_idx, row_scores)]
+            for row_idx, row_scores in zip(top, top_scores)
+        ]
+
+
+def _write_json(path, data):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def sync_version_files(directory, index):
+    """
+    Brings the version's other per-product files in line with an edited index:
+    product_mapping.json, class_labels.json (if present) and the product and vector
+    counts in metadata.json
+    """
+    directory = Path(directory)
+    product_ids = index.product_ids
+    _write_json(directory / "product_mapping.json", {idx: product_id for idx, product_id in enumerate(product_ids)})
+
+    labels_file = directory / "class_labels.json"
+    if labels_file.exists():
+        with open(labels_file) as f:
+            labels = json.load(f)
+        labels["labels"] = [index.skus[product_id] for product_id in product_ids]
+        _write_json(labels_file, labels)
+
+    metadata_file = directory / "metadata.json"
+    if metadata_file.exists():
+        with open(metadata_file) as f:
+            metadata = json.load(f)
+        metadata["num_products"] = len(product_ids)
+        if "embedding_index" in metadata:
+            metadata["embedding_index"]["num_vectors"] = len(index.row_products)
+        _write_json(metadata_file, metadata)
+
+
+def embed_photos(photo_paths, img_size=(224, 224), batch_size=32, workers=None):
+    """
+    Embeds photos with the frozen MobileNetV2 feature extractor used for training.
+    Returns (loaded photo paths, embeddings); unreadable photos are logged and skipped.
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+    from tensorflow.keras.applications import MobileNetV2
+
+    extractor = keras.Sequential([
+        MobileNetV2(input_shape=(*img_size, 3), include_top=False, weights='imagenet'),
+        keras.layers.GlobalAveragePooling2D()
+    ])
+
+    loaded = []
+    images = []
+    for path, (img_array, error) in zip(photo_paths, decode_photos(photo_paths, img_size, workers or default_workers())):
+        if error is not None:
+            logger.warning(f"Failed to load {path}: {error}")
+            continue
+        loaded.append(path)
+        images.append(img_array)
+
+    if not images:
+        raise ValueError("None of the photos could be loaded")
+
+    embeddings = []
+    for start in range(0, len(images), batch_size):
+        batch = tf.cast(np.stack(images[start:start + batch_size]), tf.float32) / 255.0
+        embeddings.append(extractor(batch, training=False).numpy())
+    return loaded, np.concatenate(embeddings)
+
+
+def main():
+    """Command line entry point to inspect and edit an exported index in place"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description='Manage a product embedding index')
+    parser.add_argument('--index-dir', required=True, help='Model version directory containing the index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add = subparsers.add_parser('add', help="Add or replace a product's vectors from its photos")
+    add.add_argument('--product-id', required=True)
+    add.add_argument('--sku', required=True)
+    add.add_argument('--photos', nargs='+', required=True)
+    add.add_argument('--prototypes', type=int, default=3, help='Maximum prototypes per product')
+
+    remove = subparsers.add_parser('remove', help="Remove a product's vectors")
+    remove.add_argument('--product-id', required=True)
+
+    search = subparsers.add_parser('search', help='Find the closest products for photos')
+    search.add_argument('--photos', nargs='+', required=True)
+    search.add_argument('--top-k', type=int, default=5)
+
+    subparsers.add_parser('info', help='Print index statistics')
+
+    args = parser.parse_args()
+    index = EmbeddingIndex.load(args.index_dir)
+
+    if args.command == 'add':
+        _, embeddings = embed_photos(args.photos)
+        count = index.set_product(args.product_id, args.sku, embeddings, args.prototypes)
+        index.save(args.index_dir)
+        sync_version_files(args.index_dir, index)
+        logger.info(f"Stored {count} prototypes for product {args.product_id} ({args.sku})")
+    elif args.command == 'remove':
+        removed = index.remove_product(args.product_id)
+        index.save(args.index_dir)
+        sync_version_files(args.index_dir, index)
+        logger.info(f"Removed {removed} vectors for product {args.product_id}")
+    elif args.command == 'search':
+        paths, embeddings = embed_photos(args.photos)
+        for path, matches in zip(paths, index.search(embeddings, args.top_k)):
+            print(json.dumps({
+                "photo": path,
+                "matches": [{"product_id": pid, "sku": index.skus[pid], "score": round(score, 4)}
+                            for pid, score in matches]
+            }))
+    else:
+        print(json.dumps({
+            "dim": index.dim,
+            "products": len(index.skus),
+            "vectors": len(index.row_products),
+            "bytes": int(index.vectors.nbytes)
+        }, indent=2))
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
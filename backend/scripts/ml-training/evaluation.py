@@ -0,0 +1,108 @@
+"""
+Validation report for a trained classifier
+Turns the class probabilities predicted for the validation split into top-k accuracy,
+per-class precision/recall and the most confused class pairs with vectorised NumPy,
+and condenses the report to fit ModelMetadata.AccuracyMetrics
+"""
+
+import json
+import numpy as np
+
+TOP_K = (1, 3, 5)
+MAX_LISTED = 20  # Classes and pairs listed in the condensed metrics, before trimming to fit
+
+
+def top_k_accuracy(probabilities, labels, k):
+    """Share of samples whose label is among the k highest probabilities"""
+    k = min(k, probabilities.shape[1])
+    # Unordered top-k columns per row; ties at the k-th value are broken arbitrarily
+    top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    return float(np.mean(np.any(top == labels[:, None], axis=1)))
+
+
+def evaluation_report(probabilities, labels, class_names, predict_seconds=None, top_confusions=20):
+    """
+    Returns the evaluation dict stored under "evaluation" in metadata.json. Classes without
+    validation photos (train-only) have no recall, and classes never predicted no precision.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    labels = np.asarray(labels, dtype=np.int64)
+    num_samples, num_classes = probabilities.shape
+    predictions = np.argmax(probabilities, axis=1)
+
+    # Per-class counts with bincount rather than a dense confusion matrix, which would grow
+    # with the square of the catalog size
+    hits = predictions == labels
+    correct = np.bincount(labels[hits], minlength=num_classes)
+    support = np.bincount(labels, minlength=num_classes)
+    predicted = np.bincount(predictions, minlength=num_classes)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recall = np.where(support > 0, correct / support, np.nan)
+        precision = np.where(predicted > 0, correct / predicted, np.nan)
+
+    per_class = [
+        {
+            "sku": class_names[c],
+            "support": int(support[c]),
+            "precision": None if np.isnan(precision[c]) else round(float(precision[c]), 4),
+            "recall": None if np.isnan(recall[c]) else round(float(recall[c]), 4)
+        }
+        for c in range(num_classes)
+    ]
+
+    # Misclassified (true, predicted) pairs, most frequent first
+    pairs, counts = np.unique(labels[~hits] * num_classes + predictions[~hits], return_counts=True)
+    order = np.argsort(-counts, kind='stable')[:top_confusions]
+    confused = [
+        {
+            "true": class_names[pair // num_classes],
+            "predicted": class_names[pair % num_classes],
+            "count": int(count),
+            "share_of_true": round(float(count / support[pair // num_classes]), 4)
+        }
+        for pair, count in zip(pairs[order].tolist(), counts[order].tolist())
+    ]
+
+    report = {
+        "samples": int(num_samples),
+        **{f"top{k}": round(top_k_accuracy(probabilities, labels, k), 4) for k in TOP_K},
+        "macro_precision": round(float(np.nanmean(precision)), 4) if np.any(predicted > 0) else None,
+        "macro_recall": round(float(np.nanmean(recall)), 4) if np.any(support > 0) else None,
+        "classes_evaluated": int(np.count_nonzero(support)),
+        "per_class": per_class,
+        "confused_pairs": confused
+    }
+    if predict_seconds is not None and num_samples:
+        report["predict_ms_per_image"] = round(predict_seconds * 1000 / num_samples, 3)
+    return report
+
+
+def compact_metrics(report, max_chars, base=None):
+    """
+    Condenses an evaluation report into a JSON string of at most max_chars: the summary
+    figures, then as many of the lowest-recall classes and most confused pairs as fit
+    """
+    metrics = dict(base or {})
+    for key in ("samples", *(f"top{k}" for k in TOP_K), "macro_precision", "macro_recall", "predict_ms_per_image"):
+        if key in report:
+            metrics[key] = report[key]
+
+    worst = sorted((c for c in report["per_class"] if c["recall"] is not None), key=lambda c: (c["recall"], -c["support"]))
+    worst = [[c["sku"], c["recall"], c["support"]] for c in worst if c["recall"] < 1][:MAX_LISTED]
+    confused = [[p["true"], p["predicted"], p["count"]] for p in report["confused_pairs"]][:MAX_LISTED]
+
+    # Shorten both lists evenly until the JSON fits
+    while True:
+        metrics["lowest_recall"] = worst
+        metrics["confused_pairs"] = confused
+        encoded = json.dumps(metrics, separators=(',', ':'))
+        if len(encoded) <= max_chars or not (worst or confused):
+            break
+        if len(worst) >= len(confused):
+            worst = worst[:-1]
+        else:
+            confused = confused[:-1]
+
+    if len(encoded) > max_chars:
+        raise ValueError(f"Evaluation summary does not fit in {max_chars} characters")
+    return encoded
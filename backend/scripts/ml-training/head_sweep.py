@@ -0,0 +1,148 @@
+"""
+Parallel hyperparameter sweep for the classification head
+Trials train heads on the cached backbone embeddings in separate worker processes.
+The embeddings are shared as memory-mapped .npy files, and each trial's results and
+weights are returned to the parent for best-model selection
+"""
+
+import time
+import random
+import logging
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import numpy as np
+
+from image_loader import default_workers
+
+logger = logging.getLogger(__name__)
+
+# Default head configuration first, so the sweep never does worse than a normal run
+DEFAULT_CONFIG = {"learning_rate": 0.001, "hidden_units": 128, "dropout": 0.2}
+
+SEARCH_SPACE = {
+    "learning_rate": [0.0003, 0.001, 0.003],
+    "hidden_units": [64, 128, 256],
+    "dropout": [0.1, 0.2, 0.4]
+}
+
+
+def sample_configs(num_trials, seed=42):
+    """Returns the default configuration plus num_trials - 1 distinct random grid points"""
+    keys = list(SEARCH_SPACE)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(SEARCH_SPACE[k] for k in keys))]
+    others = [config for config in grid if config != DEFAULT_CONFIG]
+    random.Random(seed).shuffle(others)
+    return [DEFAULT_CONFIG] + others[:max(num_trials - 1, 0)]
+
+
+def save_shared_data(directory, X_train, y_train, X_val, y_val):
+    """Writes the split embeddings once as .npy files that every trial memory-maps"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in (("X_train", X_train), ("y_train", y_train), ("X_val", X_val), ("y_val", y_val)):
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+    return directory
+
+
+def run_trial(task):
+    """
+    Trains one head configuration (runs in a worker process); returns its result and weights.
+    Training stops at the first epoch end past deadline (a time.time() value, or None).
+    """
+    trial, data_dir, config, epochs, batch_size, patience, threads, seed, deadline = task
+
+    # Imported here so the parent can pass this function to a spawned pool cheaply
+    import train_model
+    train_model.import_ml_modules()
+    tf, keras = train_model.tf, train_model.keras
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    keras.utils.set_random_seed(seed)
+
+    data_dir = Path(data_dir)
+    X_train, y_train, X_val, y_val = (np.load(data_dir / f"{name}.npy", mmap_mode='r')
+                                      for name in ("X_train", "y_train", "X_val", "y_val"))
+
+    trainer = train_model.ModelTrainer(job_id='sweep', connection_string='', storage_path=data_dir, output_path=data_dir)
+    trainer.head_config = config
+    trainer.batch_size = batch_size
+    num_classes = int(max(y_train.max(), y_val.max())) + 1
+    head = trainer.create_head_model(num_classes, report_progress=False, feature_dim=X_train.shape[1])
+
+    class Deadline(keras.callbacks.Callback):
+        stopped = False
+
+        def on_epoch_end(self, epoch, logs=None):
+            if time.time() >= deadline:
+                self.model.stop_training = True
+                self.stopped = True
+
+    start = time.perf_counter()
+    callbacks = []
+    if patience > 0:
+        callbacks.append(keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=patience,
+                                                       restore_best_weights=True))
+    stop_at_deadline = Deadline()
+    if deadline is not None:
+        callbacks.append(stop_at_deadline)
+    validation = trainer._array_dataset(np.asarray(X_val), np.asarray(y_val), training=False, images=False)
+    history = head.fit(
+        trainer._array_dataset(np.asarray(X_train), np.asarray(y_train), training=True, images=False),
+        validation_data=validation,
+        epochs=epochs,
+        callbacks=callbacks,
+        verbose=0
+    )
+    _, val_accuracy = head.evaluate(validation, verbose=0)
+
+    return {
+        "trial": trial,
+        "config": config,
+        "val_accuracy": float(val_accuracy),
+        "epochs_run": len(history.epoch),
+        "stopped_by": "time_budget" if stop_at_deadline.stopped else None,
+        "seconds": round(time.perf_counter() - start, 2)
+    }, head.get_weights()
+
+
+def run_sweep(data_dir, configs, epochs, batch_size, patience, workers, on_result=None, time_limit=None):
+    """
+    Runs the trials over a spawned process pool, splitting the CPU cores between them.
+    Returns (results in trial order, best result, weights of the best trial); ties go to
+    the earlier trial, so the default configuration wins unless another one is better.
+    With time_limit (seconds), running trials stop at their next epoch end once it has
+    passed and trials not yet started are skipped.
+    """
+    workers = max(1, min(workers, len(configs)))
+    threads = max(1, default_workers() // workers)
+    deadline = time.time() + time_limit if time_limit is not None else None
+    tasks = [(i, str(data_dir), config, epochs, batch_size, patience, threads, 42 + i, deadline)
+             for i, config in enumerate(configs)]
+
+    results = []
+    weights = {}
+    # spawn: TensorFlow is not fork-safe once the parent has initialised it
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(run_trial, task) for task in tasks]
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            result, trial_weights = future.result()
+            weights[result["trial"]] = trial_weights
+            results.append(result)
+            logger.info(f"Trial {len(results)}/{len(tasks)} {result['config']}: "
+                        f"{result['val_accuracy']:.2%} in {result['seconds']:.1f}s")
+            if on_result:
+                on_result(results)
+            if deadline is not None and time.time() >= deadline:
+                skipped = sum(f.cancel() for f in futures)
+                if skipped:
+                    logger.warning(f"Time budget reached; skipping {skipped} trials that had not started")
+
+    if not results:
+        raise ValueError("No sweep trial finished within the time budget")
+    results.sort(key=lambda r: r["trial"])
+    best = max(results, key=lambda r: (r["val_accuracy"], -r["trial"]))
+    return results, best, weights[best["trial"]]
@@ -0,0 +1,88 @@
+"""
+Parallel photo decoding for the training pipeline
+Kept free of TensorFlow imports so worker processes start quickly
+"""
+
+import os
+import time
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+import numpy as np
+
+_pools = {}  # Worker count -> persistent process pool
+_pool_cpu_seconds = 0.0  # CPU time spent in pool tasks; the processes are never reaped, so os.times() misses it
+
+
+def default_workers():
+    """Returns the number of CPU cores available to this process"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def process_pool(workers):
+    """
+    Returns a persistent pool of spawned processes, shared by every decode and hash call (and
+    by every job of a resident worker). spawn rather than fork: photos are decoded while
+    TensorFlow's thread pools and the progress reporter thread run, and forking a
+    multi-threaded process is unsafe.
+    """
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _pools[workers] = pool
+    return pool
+
+
+def _timed_call(fn, task):
+    start = time.process_time()
+    result = fn(task)
+    return result, time.process_time() - start
+
+
+def pool_map(fn, tasks, workers):
+    """Maps fn over tasks on the persistent pool, in input order; a broken pool is replaced on the next call"""
+    global _pool_cpu_seconds
+    chunksize = max(1, len(tasks) // (min(workers, len(tasks)) * 4))
+    try:
+        timed = list(process_pool(workers).map(functools.partial(_timed_call, fn), tasks, chunksize=chunksize))
+    except BrokenProcessPool:
+        _pools.pop(workers, None)
+        raise
+    _pool_cpu_seconds += sum(seconds for _, seconds in timed)
+    return [result for result, _ in timed]
+
+
+def pool_cpu_seconds():
+    """CPU time used by pool tasks so far in this process"""
+    return _pool_cpu_seconds
+
+
+def decode_photo(task):
+    """
+    Decodes and resizes one photo to a uint8 RGB array.
+    Returns (array, None) on success or (None, error message) so failures can be
+    reported by the caller instead of aborting the whole pool.
+    """
+    photo_path, img_size = task
+    try:
+        with Image.open(photo_path) as img:
+            # For JPEGs, let libjpeg decode at 1/2, 1/4 or 1/8 scale when the photo
+            # is much larger than the target size; no-op for other formats
+            img.draft('RGB', img_size)
+            img = img.convert('RGB').resize(img_size)
+            return np.asarray(img, dtype=np.uint8), None
+    except Exception as e:
+        return None, str(e)
+
+
+def decode_photos(photo_paths, img_size, workers):
+    """Decodes photos on the process pool, returning (array, error) results in input order"""
+    tasks = [(str(path), tuple(img_size)) for path in photo_paths]
+    if workers <= 1 or len(tasks) <= 1:
+        return [decode_photo(task) for task in tasks]
+    return pool_map(decode_photo, tasks, workers)
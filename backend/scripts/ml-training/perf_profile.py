@@ -0,0 +1,98 @@
+"""
+CPU performance profiles for training
+Detects cores, memory and CPU features (kept free of TensorFlow imports so the
+environment can be prepared before TensorFlow initialises) and plans thread pools,
+mixed precision and the memory budget for batch size selection
+"""
+
+import os
+import logging
+
+from image_loader import default_workers
+
+logger = logging.getLogger(__name__)
+
+# CPU flags that select bfloat16 compute (AVX-512 BF16 or AMX tiles) or matter for oneDNN kernels
+BF16_FLAGS = {"avx512_bf16", "amx_bf16"}
+REPORTED_FLAGS = BF16_FLAGS | {"avx2", "avx512f", "avx512_vnni", "amx_tile"}
+
+
+def _meminfo():
+    """Returns /proc/meminfo values in MB (Linux), or an empty dict"""
+    values = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                values[key] = int(value.split()[0]) / 1024  # kB
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def _cpu_flags():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def detect_hardware():
+    """Returns usable cores, total/available memory in MB and relevant CPU flags"""
+    meminfo = _meminfo()
+    total = meminfo.get("MemTotal")
+    available = meminfo.get("MemAvailable")
+    if total is None:
+        try:
+            page = os.sysconf("SC_PAGE_SIZE")
+            total = os.sysconf("SC_PHYS_PAGES") * page / 1e6
+            available = os.sysconf("SC_AVPHYS_PAGES") * page / 1e6
+        except (ValueError, OSError, AttributeError):
+            total = available = None
+
+    flags = _cpu_flags()
+    return {
+        "cores": default_workers(),
+        "memory_total_mb": round(total) if total else None,
+        "memory_available_mb": round(available) if available else None,
+        "cpu_flags": sorted(flags & REPORTED_FLAGS),
+        "bf16": bool(flags & BF16_FLAGS)
+    }
+
+
+def plan_profile(profile, hardware):
+    """
+    Resolves auto/throughput/low-memory into concrete settings. auto picks low-memory
+    when there is less than 2 GB of available memory per core.
+    """
+    if profile == "auto":
+        available = hardware["memory_available_mb"]
+        profile = "low-memory" if available and available / hardware["cores"] < 2048 else "throughput"
+
+    throughput = profile == "throughput"
+    return {
+        "profile": profile,
+        "intra_op_threads": hardware["cores"],
+        "inter_op_threads": 2 if throughput else 1,
+        "onednn": True,
+        "mixed_precision": "mixed_bfloat16" if hardware["bf16"] else None,
+        "memory_fraction": 0.5 if throughput else 0.25,  # Share of available memory batches may use
+        "max_batch_size": 128 if throughput else 32,
+        "default_batch_size": 64 if throughput else 16  # Used when the footprint cannot be measured
+    }
+
+
+def choose_batch_size(per_sample_mb, budget_mb, minimum=8, maximum=128):
+    """Largest power of two batch that fits the memory budget, within [minimum, maximum]"""
+    batch_size = minimum
+    while batch_size * 2 <= maximum and batch_size * 2 * per_sample_mb <= budget_mb:
+        batch_size *= 2
+    return batch_size
+
+
+def available_memory_mb():
+    return _meminfo().get("MemAvailable")
@@ -0,0 +1,147 @@
+"""
+Near-duplicate photo detection
+Computes 64-bit difference hashes (dHash) of the training photos, cached per photo, and
+groups photos of the same product whose hashes differ in only a few bits (burst shots,
+re-uploads) with a blocked, vectorised Hamming-distance pass
+"""
+
+import os
+import json
+import logging
+from pathlib import Path
+from PIL import Image
+import numpy as np
+from image_loader import pool_map
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8  # 8x8 gradient bits -> 64-bit hash
+
+# Set bits per byte value, for popcounts of XOR-ed hashes
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def dhash(task):
+    """
+    Returns (hash, None) for one photo, or (None, error message). The photo is decoded
+    at reduced scale (JPEG draft mode), shrunk to 9x8 grayscale, and each bit records
+    whether a pixel is brighter than its right-hand neighbour.
+    """
+    photo_path = task
+    try:
+        with Image.open(photo_path) as img:
+            img.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+            small = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+        pixels = np.asarray(small, dtype=np.int16)
+        bits = pixels[:, 1:] > pixels[:, :-1]
+        return int(np.packbits(bits.ravel()).view('>u8')[0]), None
+    except Exception as e:
+        return None, str(e)
+
+
+class PhotoHashCache:
+    """Hashes keyed by photo id and validated against the file fingerprint, stored as one JSON file"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Discarding unreadable photo hash cache {self.path}: {e}")
+
+    def get(self, photo_id, fingerprint):
+        entry = self.entries.get(photo_id)
+        if entry is not None and entry["fingerprint"] == fingerprint:
+            self.hits += 1
+            return int(entry["hash"], 16)
+        self.misses += 1
+        return None
+
+    def put(self, photo_id, fingerprint, value):
+        self.entries[photo_id] = {"fingerprint": fingerprint, "hash": f"{value:016x}"}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def hash_photos(items, cache, workers, fingerprint):
+    """
+    Returns a hash (or None if the photo cannot be read) for each (photo_id, photo_path)
+    item, in order. Cached hashes are reused; the rest are computed by a process pool.
+    """
+    results = [None] * len(items)
+    fingerprints = [None] * len(items)
+    misses = []
+    for i, (photo_id, photo_path) in enumerate(items):
+        try:
+            fingerprints[i] = fingerprint(photo_path)
+        except OSError as e:
+            logger.warning(f"Failed to hash {photo_path}: {e}")
+            continue
+        results[i] = cache.get(photo_id, fingerprints[i])
+        if results[i] is None:
+            misses.append(i)
+
+    paths = [str(items[i][1]) for i in misses]
+    if workers <= 1 or len(paths) <= 1:
+        computed = [dhash(path) for path in paths]
+    else:
+        computed = pool_map(dhash, paths, workers)
+
+    for i, (value, error) in zip(misses, computed):
+        if error is not None:
+            logger.warning(f"Failed to hash {items[i][1]}: {error}")
+            continue
+        results[i] = value
+        cache.put(items[i][0], fingerprints[i], value)
+    return results
+
+
+def hamming_distances(a, b):
+    """Pairwise Hamming distances between two uint64 hash arrays, as a len(a) x len(b) matrix"""
+    xor = np.ascontiguousarray(a[:, None] ^ b[None, :])
+    return POPCOUNT[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def find_duplicate_groups(hashes, labels, max_distance, block_size=1024):
+    """
+    Compares all hashes in blocks of rows and links pairs within max_distance bits.
+    Pairs of the same label are merged into groups (union-find); returns (group of each
+    photo as the index of its first member, list of (i, j) pairs across labels).
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    labels = np.asarray(labels)
+    n = len(hashes)
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    cross_pairs = []
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        close = hamming_distances(hashes[start:stop], hashes) <= max_distance
+        # Upper triangle only: each pair once, never a photo with itself
+        close &= np.arange(n)[None, :] > np.arange(start, stop)[:, None]
+        rows, cols = np.nonzero(close)
+        for i, j in zip(rows + start, cols):
+            if labels[i] != labels[j]:
+                cross_pairs.append((int(i), int(j)))
+                continue
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    return np.array([find(i) for i in range(n)], dtype=np.int64), cross_pairs
@@ -0,0 +1,211 @@
+"""
+Photo storage backends for the training pipeline
+LocalPhotoStorage reads photos from the storage directory. S3PhotoStorage mirrors them
+from an S3-compatible bucket (AWS S3, MinIO, moto) into a local directory using pooled,
+bounded-concurrency downloads, so the decoder and the image cache keep working on files
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class LocalPhotoStorage:
+    """Photos stored under a local directory, keyed by their path relative to it"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def location(self, key):
+        return str(self.root / key)
+
+    def resolve(self, keys, download=True):
+        """Returns {key: local path} for the keys that exist, listing each directory once"""
+        listings = {}
+        paths = {}
+        for key in keys:
+            parent, name = os.path.split(key)
+            if parent not in listings:
+                try:
+                    with os.scandir(self.root / parent) as entries:
+                        listings[parent] = {entry.name for entry in entries if entry.is_file()}
+                except OSError:
+                    listings[parent] = set()
+            if name in listings[parent]:
+                paths[key] = self.location(key)
+        return paths
+
+    def stats(self):
+        return {"backend": "local"}
+
+
+class S3PhotoStorage:
+    """
+    Photos in an S3-compatible bucket, mirrored to mirror_dir. The bucket is listed once
+    (1000 keys per request) instead of probing each photo, and only objects whose mirror
+    copy differs in size or modification time are downloaded. Downloads share one client
+    whose connection pool is sized to max_concurrency, stream to a temporary file that is
+    renamed into place, and are retried with backoff.
+    """
+
+    def __init__(self, bucket, mirror_dir, prefix='', endpoint_url=None, max_concurrency=32, max_retries=4):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError as e:
+            raise RuntimeError("S3 photo storage requires boto3 (pip install boto3)") from e
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.mirror_dir = Path(mirror_dir)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        # boto3 clients are thread-safe; keep-alive connections are reused across downloads
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, config=Config(
+            max_pool_connections=max_concurrency,
+            retries={'max_attempts': max_retries, 'mode': 'standard'},
+            tcp_keepalive=True
+        ))
+        self._lock = threading.Lock()
+        self.list_requests = 0
+        self.downloads = 0
+        self.reused = 0  # Objects already mirrored with the same size and mtime
+        self.bytes = 0
+        self.retries = 0
+        self.failures = 0
+        self.download_seconds = 0.0
+        self.first_byte_latencies = []
+
+    def _object_key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def location(self, key):
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    def _list(self, keys):
+        """Returns {object key: (size, last modified epoch seconds)} under the keys' common prefix"""
+        object_keys = [self._object_key(key) for key in keys]
+        common = os.path.commonprefix(object_keys)
+        common = common[:common.rfind('/') + 1]
+
+        objects = {}
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=common):
+            self.list_requests += 1
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = (obj['Size'], obj['LastModified'].timestamp())
+        return objects
+
+    def resolve(self, keys, download=True):
+        """
+        Returns {key: local mirror path} for the keys present in the bucket, downloading
+        missing or changed objects first (download=False only checks presence)
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        objects = self._list(keys)
+        paths = {}
+        pending = []
+        for key in keys:
+            info = objects.get(self._object_key(key))
+            if info is None:
+                continue
+            path = self.mirror_dir / key
+            paths[key] = str(path)
+            if download and not self._is_current(path, *info):
+                pending.append((key, path, info))
+        if download:
+            self.reused += len(paths) - len(pending)
+
+        if pending:
+            start = time.perf_counter()
+            start_bytes = self.bytes
+            workers = min(self.max_concurrency, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda task: self._download(*task), pending))
+            for (key, _, _), ok in zip(pending, results):
+                if not ok:
+                    del paths[key]
+            elapsed = time.perf_counter() - start
+            logger.info(f"Downloaded {sum(results)}/{len(pending)} photos "
+                        f"({(self.bytes - start_bytes) / 1e6:.1f} MB) in {elapsed:.1f}s "
+                        f"over {workers} connections; {len(paths) - sum(results)} already mirrored")
+        return paths
+
+    @staticmethod
+    def _is_current(path, size, last_modified):
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        return stat.st_size == size and int(stat.st_mtime) == int(last_modified)
+
+    def _download(self, key, path, info):
+        """Streams one object into the mirror; returns False if it could not be fetched"""
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        size, last_modified = info
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+
+        for attempt in range(1, self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+                first_byte = time.perf_counter() - start
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response['Body'].iter_chunks(CHUNK_SIZE):
+                        f.write(chunk)
+                os.utime(tmp_path, (last_modified, last_modified))
+                os.replace(tmp_path, path)
+
+                with self._lock:
+                    self.downloads += 1
+                    self.bytes += size
+                    self.download_seconds += time.perf_counter() - start
+                    self.first_byte_latencies.append(first_byte)
+                return True
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                    logger.warning(f"Photo {self.location(key)} disappeared before download")
+                    break
+                error = e
+            except (BotoCoreError, OSError) as e:
+                error = e
+
+            if attempt < self.max_retries:
+                with self._lock:
+                    self.retries += 1
+                time.sleep(min(0.5 * 2 ** attempt, 10))
+            else:
+                logger.warning(f"Failed to download {self.location(key)} after {attempt} attempts: {error}")
+
+        tmp_path.unlink(missing_ok=True)
+        with self._lock:
+            self.failures += 1
+        return False
+
+    def stats(self):
+        latencies = np.array(self.first_byte_latencies) * 1000
+        return {
+            "backend": "s3",
+            "bucket": self.bucket,
+            "list_requests": self.list_requests,
+            "downloads": self.downloads,
+            "reused": self.reused,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "failures": self.failures,
+            "download_seconds": round(self.download_seconds, 2),
+            "first_byte_ms_p50": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+            "first_byte_ms_p95": round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None
+        }
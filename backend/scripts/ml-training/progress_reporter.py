@@ -0,0 +1,163 @@
+"""
+Asynchronous training job progress reporting
+Progress updates are handed to a background thread with its own database connection,
+so a slow or unavailable database never stalls the training loop
+"""
+
+import time
+import logging
+import threading
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_SQL = """
+    UPDATE "ModelTrainingJobs"
+    SET "ProgressPercentage" = %s,
+        "CurrentStage" = %s,
+        "UpdatedAt" = NOW()
+    WHERE "Id" = %s
+"""
+
+FAILED_SQL = """
+    UPDATE "ModelTrainingJobs"
+    SET "Status" = 'Failed',
+        "ProgressPercentage" = %s,
+        "CurrentStage" = %s,
+        "CompletedAt" = NOW(),
+        "ErrorMessage" = %s,
+        "DurationSeconds" = EXTRACT(EPOCH FROM (NOW() - "StartedAt"))::int,
+        "UpdatedAt" = NOW()
+    WHERE "Id" = %s
+"""
+
+
+def format_eta(seconds):
+    """Formats a remaining duration as e.g. '45s', '3m 05s' or '1h 02m'"""
+    seconds = int(max(seconds, 0))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+class ProgressReporter:
+    """
+    Writes job progress from a background thread. The queue holds a single slot: a new
+    update replaces one that has not been written yet, and writes are spaced at least
+    min_interval seconds apart. Connection errors trigger a reconnect with backoff.
+    The final state (finish) is written synchronously with retries.
+    """
+
+    def __init__(self, job_id, connection_string, min_interval=2.0, max_retries=5, connect=None):
+        self.job_id = job_id
+        self.connection_string = connection_string
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.connect = connect or (lambda: psycopg2.connect(connection_string))  # Opens the reporter's own connection
+        self.conn = None
+        self.writes = 0
+        self.coalesced = 0  # Updates replaced before they were written
+        self._pending = None
+        self._closed = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def report(self, progress, stage):
+        """Queues a progress update without blocking; returns False once the reporter is closed"""
+        with self._condition:
+            if self._closed:
+                return False
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = (progress, stage)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"progress-{self.job_id}", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return True
+
+    def _run(self):
+        last_write = 0.0
+        failures = 0
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                delay = last_write + self.min_interval - time.monotonic()
+                if delay > 0 and not self._closed:
+                    self._condition.wait(delay)
+                    continue
+                update = self._pending
+                self._pending = None
+
+            try:
+                self._write(*update)
+                failures = 0
+            except psycopg2.Error as e:
+                failures += 1
+                logger.warning(f"Failed to update job progress (attempt {failures}): {e}")
+                self._disconnect()
+                with self._condition:
+                    if self._closed:
+                        return  # finish() writes the final state with its own retries
+                    if self._pending is None:
+                        self._pending = update
+                    self._condition.wait(min(2 ** failures, 30))
+            last_write = time.monotonic()
+
+    def _write(self, progress, stage, error=None):
+        if self.conn is None or self.conn.closed:
+            self.conn = self.connect()
+
+        cursor = self.conn.cursor()
+        if error:
+            cursor.execute(FAILED_SQL, (progress, stage, error, self.job_id))
+        else:
+            cursor.execute(PROGRESS_SQL, (progress, stage, self.job_id))
+        self.conn.commit()
+        self.writes += 1
+        logger.info(f"Job {self.job_id} progress: {progress}% - {stage}")
+
+    def _disconnect(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except psycopg2.Error:
+                pass
+            self.conn = None
+
+    def close(self, timeout=30):
+        """Writes any pending update, then stops the background thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.coalesced:
+            logger.info(f"Progress reporter: {self.writes} writes, {self.coalesced} updates coalesced")
+            self.coalesced = 0
+
+    def finish(self, progress, stage, error=None):
+        """Stops background reporting and writes the final state, retrying with backoff; returns True if written"""
+        self.close()
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self._write(progress, stage, error)
+                return True
+            except psycopg2.Error as e:
+                logger.warning(f"Failed to write final job state (attempt {attempt}/{self.max_retries}): {e}")
+                self._disconnect()
+                if attempt < self.max_retries:
+                    time.sleep(min(2 ** attempt, 30))
+        logger.error(f"Giving up writing final state of job {self.job_id}")
+        return False
+
+    def shutdown(self):
+        """Stops the reporter and closes its connection"""
+        self.close()
+        self._disconnect()
@@ -0,0 +1,94 @@
+"""
+Per-stage timing instrumentation for training jobs
+Records wall time, CPU time (including finished child processes) and the RSS change
+for each pipeline stage, plus per-epoch throughput
+"""
+
+import os
+import sys
+import time
+import logging
+from contextlib import contextmanager
+from image_loader import pool_cpu_seconds
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def current_rss_mb():
+    """Returns the current resident set size of this process in MB (Linux), or None if unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+def cpu_seconds():
+    """Returns user + system CPU time of this process, its reaped children and the decode pool"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system + pool_cpu_seconds()
+
+
+class StageTimings:
+    """Collects timing records for named stages and training epochs"""
+
+    def __init__(self):
+        self.stages = []
+        self.epochs = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block as one stage; the record is kept even if it raises"""
+        wall_start = time.perf_counter()
+        cpu_start = cpu_seconds()
+        rss_start = current_rss_mb()
+        try:
+            yield
+        finally:
+            rss_end = current_rss_mb()
+            record = {
+                "stage": name,
+                "wall_seconds": round(time.perf_counter() - wall_start, 3),
+                "cpu_seconds": round(cpu_seconds() - cpu_start, 3),
+                # Current RSS growth over the stage; negative when it released memory
+                "rss_delta_mb": round(rss_end - rss_start, 1) if rss_start is not None and rss_end is not None else None,
+                # ru_maxrss is a process-wide high-water mark, so this is cumulative up to the stage's end
+                "process_peak_rss_mb": peak_rss_mb()
+            }
+            self.stages.append(record)
+            logger.info(f"Stage {name}: {record['wall_seconds']:.1f}s wall, "
+                        f"{record['cpu_seconds']:.1f}s CPU, RSS change {record['rss_delta_mb']} MB "
+                        f"(process peak so far {record['process_peak_rss_mb']} MB)")
+
+    def record_epoch(self, epoch, seconds, samples):
+        """Records one training epoch's duration and throughput"""
+        self.epochs.append({
+            "epoch": epoch,
+            "wall_seconds": round(seconds, 3),
+            "samples": samples,
+            "images_per_sec": round(samples / seconds, 1) if seconds > 0 else None
+        })
+
+    def to_dict(self):
+        return {
+            "total_wall_seconds": round(time.perf_counter() - self.started, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.stages,
+            "epochs": self.epochs
+        }
@@ -9,18 +9,29 @@ import os
 import sys
 import json
 import argparse
+import cProfile
+import hashlib
 import logging
+import math
+import shutil
+import time
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 from pathlib import Path
 import psycopg2
-from PIL import Image
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from sklearn.model_selection import train_test_split
-import tensorflowjs as tfjs
+from array_cache import ArrayCache, file_fingerprint
+from image_loader import decode_photos, default_workers
+from embedding_index import EmbeddingIndex
+from stage_timings import StageTimings, current_rss_mb
+from progress_reporter import ProgressReporter, format_eta
+from checkpoints import CheckpointStore
+from photo_storage import LocalPhotoStorage, S3PhotoStorage
+from photo_dedup import PhotoHashCache, hash_photos, find_duplicate_groups
+from head_sweep import DEFAULT_CONFIG, sample_configs, save_shared_data, run_sweep
+from perf_profile import detect_hardware, plan_profile, choose_batch_size, available_memory_mb
+from distributed import cluster_role, tf_config, launch_local_workers
+from evaluation import evaluation_report, compact_metrics
 
 # Configure logging
 logging.basicConfig(
@@ -29,11 +40,154 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Heavy ML dependencies, imported on first use by import_ml_modules() so that preflight
+# checks and jobs that fail validation do not pay for loading TensorFlow
+tf = None
+keras = None
+MobileNetV2 = None
+tfjs = None
+
+# Storage key of a product photo: ProductPhotoService uploads to the "products" folder under a
+# unique file name, for both local storage and S3
+PHOTO_KEY_TEMPLATE = "products/{file_name}"
+
+# Throughput assumed by preflight estimates when no previous job recorded timings
+PREFLIGHT_DECODE_IMAGES_PER_SEC_PER_WORKER = 40
+PREFLIGHT_TRAIN_IMAGES_PER_SEC = 25
+
+# Seconds a distributed worker waits on a collective before failing (e.g. a peer crashed)
+COLLECTIVE_TIMEOUT_SECONDS = 600
+
+# Validation images per predict call in the evaluation report
+EVALUATION_BATCH_SIZE = 256
+
+# Column size of ModelMetadata.AccuracyMetrics
+ACCURACY_METRICS_MAX_LENGTH = 2000
+
+# Postgres advisory lock held while a job trains, so one database (deployment) runs one training at a time
+TRAINING_LOCK_ID = 7_243_001
+# Exit code when another training holds the lock; the job stays queued and is retried later
+EXIT_DEFERRED = 75
+
+# Marks the other queued jobs as covered by the job that is starting: its photos are read
+# afterwards, so its dataset is the same as or a superset of theirs. Jobs already covered by
+# one of those queued jobs (after an interrupted run) move along with it.
+SUPERSEDE_QUEUED_JOBS_SQL = """
+    UPDATE "ModelTrainingJobs"
+    SET "Status" = 'Superseded',
+        "SupersededByJobId" = %s,
+        "CurrentStage" = %s,
+        "UpdatedAt" = NOW()
+    WHERE "Id" <> %s
+      AND ("Status" = 'Queued'
+           OR ("Status" = 'Superseded' AND "SupersededByJobId" IN (
+               SELECT "Id" FROM "ModelTrainingJobs" WHERE "Status" = 'Queued')))
+    RETURNING "Id"
+"""
+
+
+def import_ml_modules():
+    """Imports TensorFlow and tensorflowjs into the module namespace (once)"""
+    global tf, keras, MobileNetV2, tfjs
+    if tf is not None:
+        return
+    
+    start = time.perf_counter()
+    import tensorflow as tf
+    from tensorflow import keras
+    from tensorflow.keras.applications import MobileNetV2
+    import tensorflowjs as tfjs
+    logger.info(f"Imported TensorFlow {tf.__version__} in {time.perf_counter() - start:.1f}s")
+
+
+def stratified_split(labels, val_fraction=0.2, seed=42, groups=None):
+    """
+    Splits sample indices class by class. A class with n >= 2 samples puts round(n * val_fraction)
+    of them (at least 1, never all) in validation; single-sample classes stay train-only.
+    Samples sharing a group id (near-duplicates) always land on the same side, so a class
+    whose samples form a single group stays train-only as well.
+    Returns (train indices, validation indices, train-only class labels).
+    """
+    labels = np.asarray(labels)
+    groups = np.arange(len(labels)) if groups is None else np.asarray(groups)
+    rng = np.random.default_rng(seed)
+    order = np.argsort(labels, kind='stable')
+    classes, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+    
+    train, val, train_only = [], [], []
+    for label, start, count in zip(classes, starts, counts):
+        idx = order[start:start + count]
+        class_groups = rng.permutation(np.unique(groups[idx]))
+        if len(class_groups) < 2:
+            train.extend(idx)
+            train_only.append(int(label))
+            continue
+        n_val = min(max(1, int(round(count * val_fraction))), count - 1)
+        # Whole groups go to validation until it holds n_val samples; the last group always trains
+        taken = 0
+        for k, group in enumerate(class_groups):
+            members = idx[groups[idx] == group]
+            if taken < n_val and k < len(class_groups) - 1:
+                val.extend(members)
+                taken += len(members)
+            else:
+                train.extend(members)
+    
+    return np.sort(np.array(train, dtype=np.int64)), np.sort(np.array(val, dtype=np.int64)), train_only
+
+
+def class_balance_weights(labels):
+    """Per-sample weights inversely proportional to class frequency, averaging 1"""
+    labels = np.asarray(labels)
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    return (len(labels) / (len(counts) * counts[inverse])).astype(np.float32)
+
+
+def weights_digest(model, variant=''):
+    """Returns a SHA-256 over a model's weight shapes, dtypes and values, used to content-address artifacts"""
+    digest = hashlib.sha256(variant.encode('utf-8'))
+    for weight in model.get_weights():
+        digest.update(f"{weight.shape}:{weight.dtype}".encode('utf-8'))
+        digest.update(np.ascontiguousarray(weight).tobytes())
+    return digest.hexdigest()
+
+
+def quantize_weights(weights, mode):
+    """
+    Simulates TF.js weight quantization (quantize then dequantize) so the exported
+    precision can be evaluated in Python. uint8 uses per-tensor affine min/max ranges.
+    """
+    if mode == 'none':
+        return weights
+    
+    result = []
+    for weight in weights:
+        if weight.dtype != np.float32:
+            result.append(weight)
+        elif mode == 'float16':
+            result.append(weight.astype(np.float16).astype(np.float32))
+        else:
+            w_min, w_max = float(weight.min()), float(weight.max())
+            scale = (w_max - w_min) / 255.0 if w_max > w_min else 1.0
+            quantized = np.round((weight - w_min) / scale).clip(0, 255)
+            result.append((quantized * scale + w_min).astype(np.float32))
+    return result
+
 
 class ModelTrainer:
     """Handles ML model training for product classification"""
     
-    def __init__(self, job_id, connection_string, storage_path, output_path):
+    def __init__(self, job_id, connection_string, storage_path, output_path,
+                 streaming=False, dataset_cache='none', cache_dir=None, image_cache_mb=2048,
+                 cache_verify_hash=False, training_mode='full', feature_augmentations=2,
+                 feature_cache_mb=512, decode_workers=None, incremental=False, incremental_epochs=5,
+                 incremental_max_change=0.3, export_mode='classifier', prototypes_per_product=3,
+                 export_layout='full', quantization='none', profile=False, progress_interval=2.0,
+                 early_stopping_patience=4, time_budget=None, export_reserve=300, resume=False,
+                 perf_profile='none', sweep_trials=0, sweep_workers=None, photo_storage='local',
+                 s3_bucket=None, s3_prefix='', s3_endpoint_url=None, s3_concurrency=32,
+                 photo_key_template=PHOTO_KEY_TEMPLATE,
+                 duplicates='group', duplicate_distance=6, distributed=False):
         self.job_id = job_id
         self.connection_string = connection_string
         self.storage_path = Path(storage_path)
@@ -41,48 +195,107 @@ class ModelTrainer:
         self.img_size = (224, 224)  # MobileNetV2 input size
         self.batch_size = 32
         self.epochs = 15
+        self.streaming = streaming  # Decode lazily with tf.data instead of loading everything in RAM
+        self.dataset_cache = dataset_cache  # none | memory | disk (streaming mode only)
+        self.cache_dir = Path(cache_dir) if cache_dir else self.output_path / ".cache"
+        self.image_cache_mb = image_cache_mb  # 0 disables the preprocessed image cache
+        self.cache_verify_hash = cache_verify_hash
+        self.image_cache = None
+        self.training_mode = training_mode  # full | features (train head on cached backbone embeddings)
+        self.feature_augmentations = feature_augmentations  # Augmented variants per photo in features mode
+        self.feature_cache_mb = feature_cache_mb
+        self.feature_cache = None
+        self.base_model = None
+        self.decode_workers = decode_workers or default_workers()
+        self.augmentation = None
+        self.incremental = incremental  # Warm-start the head from the active model version
+        self.incremental_epochs = incremental_epochs
+        self.incremental_max_change = incremental_max_change  # Max share of added/removed classes before falling back
+        self.export_mode = export_mode  # classifier | embedding-index
+        self.prototypes_per_product = prototypes_per_product
+        self.export_layout = export_layout  # full | split (shared backbone artifact + per-version head)
+        self.quantization = quantization  # none | float16 | uint8 TF.js weight quantization
+        self.product_skus = {}
+        self.validation_data = None  # Set by train_model for post-training evaluation
+        self.validation_inputs = None  # images | features
+        self.validation_photos = None  # (photo_id, photo_path, label) of the validation split in features mode
+        self.timings = StageTimings()
+        self.profile = profile  # Capture cProfile and TensorFlow profiler traces
+        self.run_info = {}  # Extra training details recorded in metadata.json
+        self.progress_interval = progress_interval  # Minimum seconds between progress writes
+        self.progress = None  # ProgressReporter, created on the first update
+        self.early_stopping_patience = early_stopping_patience  # Epochs without val_accuracy gain (0 disables)
+        self.time_budget = time_budget  # Wall-clock seconds for the whole job (None: no limit)
+        self.export_reserve = export_reserve  # Seconds of the budget kept for export and the database update
+        self.resume = resume  # Continue from this job's last epoch checkpoint if the dataset is unchanged
+        self.checkpoints = CheckpointStore(self.output_path / ".checkpoints" / str(job_id))
+        self.dataset_manifest = None  # Hash of the photos and class order, set by train()
+        self.class_mapping = []  # Product ids in class-index order, stored with checkpoints
+        self.perf_profile = perf_profile  # none | auto | throughput | low-memory
+        self.perf_settings = None  # Resolved profile, set by apply_performance_profile
+        self.head_config = dict(DEFAULT_CONFIG)  # learning_rate, hidden_units, dropout
+        self.sweep_trials = sweep_trials  # Head configurations tried in parallel on cached features (0 disables)
+        self.sweep_workers = sweep_workers or default_workers()
+        self.photo_storage = photo_storage  # local | s3
+        self.s3_bucket = s3_bucket
+        self.s3_prefix = s3_prefix
+        self.s3_endpoint_url = s3_endpoint_url  # MinIO or another S3-compatible endpoint
+        self.s3_concurrency = s3_concurrency  # Parallel downloads (and pooled connections)
+        self.photo_key_template = photo_key_template  # Storage key of a photo, from {product_id} and {file_name}
+        self.storage = None  # Photo storage backend, created on first use
+        self.duplicates = duplicates  # group | drop | off (near-duplicate photo handling)
+        self.duplicate_distance = duplicate_distance  # Max differing bits of 64 for near-duplicate hashes
+        self.photo_groups = {}  # Photo id -> id of the first photo of its near-duplicate group
+        self.lock_conn = None  # Holds the training advisory lock while train() runs
+        self.claimed = False  # Set by the worker, which marked the job InProgress before train()
+        self.superseded_jobs = []  # Queued jobs this run covers
+        self.distributed = distributed  # Data-parallel training over the TF_CONFIG cluster
+        self.num_workers = 1
+        self.worker_index = 0
+        self.is_chief = True  # Worker 0 owns the job row, checkpoints, export and ModelMetadata
+        self.strategy = None  # MultiWorkerMirroredStrategy, created right after TensorFlow is imported
+        if distributed:
+            role = cluster_role()
+            self.num_workers, self.worker_index, self.is_chief = role["num_workers"], role["worker_index"], role["is_chief"]
+            if not self.is_chief:
+                # Workers sharing a host must not write the same cache files
+                self.cache_dir = self.cache_dir / "workers" / str(self.worker_index)
         self.conn = None
         
+    def _connect(self):
+        return psycopg2.connect(self.connection_string)
+    
     def update_job_progress(self, progress, stage, error=None):
-        """Updates training job status in database"""
-        try:
-            if not self.conn:
-                self.conn = psycopg2.connect(self.connection_string)
-            
-            cursor = self.conn.cursor()
-            if error:
-                cursor.execute("""
-                    UPDATE "ModelTrainingJobs"
-                    SET "Status" = 'Failed',
-                        "ProgressPercentage" = %s,
-                        "CurrentStage" = %s,
-                        "CompletedAt" = NOW(),
-                        "ErrorMessage" = %s,
-                        "DurationSeconds" = EXTRACT(EPOCH FROM (NOW() - "StartedAt"))::int,
-                        "UpdatedAt" = NOW()
-                    WHERE "Id" = %s
-                """, (progress, stage, error, self.job_id))
-            else:
-                cursor.execute("""
-                    UPDATE "ModelTrainingJobs"
-                    SET "ProgressPercentage" = %s,
-                        "CurrentStage" = %s,
-                        "UpdatedAt" = NOW()
-                    WHERE "Id" = %s
-                """, (progress, stage, self.job_id))
-            
-            self.conn.commit()
-            logger.info(f"Job {self.job_id} progress: {progress}% - {stage}")
-            
-        except Exception as e:
-            logger.error(f"Failed to update job progress: {e}")
+        """
+        Updates training job status in database. Progress is queued to a background
+        reporter (coalesced and rate-limited); failures, and any update made after the
+        reporter was closed, are written synchronously with retries. Only worker 0 writes
+        in distributed mode.
+        """
+        if not self.is_chief:
+            return
+        
+        if self.progress is None:
+            self.progress = ProgressReporter(self.job_id, self.connection_string, self.progress_interval,
+                                             connect=self._connect)
+        
+        if error is None and self.progress.report(progress, stage):
+            return
+        self.progress.finish(progress, stage, error)
     
     def fetch_product_photos(self):
         """Fetches product photos from database"""
         self.update_job_progress(5, "Fetching product photos from database")
         
+        photos = self._query_product_photos()
+        logger.info(f"Fetched {len(photos)} photos from {len(set(p[1] for p in photos))} products")
+        
+        return photos
+    
+    def _query_product_photos(self):
+        """Returns (photo id, product id, file name, SKU, name) rows for active products"""
         if not self.conn:
-            self.conn = psycopg2.connect(self.connection_string)
+            self.conn = self._connect()
         
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -98,124 +311,1038 @@ class ModelTrainer:
             ORDER BY pp."ProductId", pp."DisplayOrder"
         """)
         
-        photos = cursor.fetchall()
-        logger.info(f"Fetched {len(photos)} photos from {len(set(p[1] for p in photos))} products")
-        
-        return photos
+        return cursor.fetchall()
     
     def download_and_prepare_dataset(self, photos):
         """Downloads photos and prepares dataset"""
         self.update_job_progress(10, f"Preparing dataset with {len(photos)} photos")
         
-        # Group photos by product
+        product_photos, _ = self._group_photos(photos)
+        
+        # Filter products with at least 1 photo
+        valid_products = {k: v for k, v in product_photos.items() if len(v['photos']) > 0}
+        
+        logger.info(f"Found {len(valid_products)} products with photos")
+        
+        if len(valid_products) < 2:
+            raise ValueError("At least 2 products with photos required for training")
+        
+        return valid_products
+    
+    def _photo_storage(self):
+        if self.storage is None:
+            if self.photo_storage == 's3':
+                if not self.s3_bucket:
+                    raise ValueError("--s3-bucket is required with --photo-storage s3")
+                self.storage = S3PhotoStorage(
+                    self.s3_bucket,
+                    self.cache_dir / "photos" / self.s3_bucket,
+                    prefix=self.s3_prefix,
+                    endpoint_url=self.s3_endpoint_url,
+                    max_concurrency=self.s3_concurrency
+                )
+            else:
+                self.storage = LocalPhotoStorage(self.storage_path)
+        return self.storage
+    
+    def _group_photos(self, photos, download=True):
+        """
+        Groups photo rows by product, keeping only files present in storage (fetched to
+        local files when download is set); returns (products, missing locations)
+        """
+        storage = self._photo_storage()
+        # Key relative to the storage root; the backend stores every photo as products/<file>
+        keys = [self.photo_key_template.format(product_id=photo[1], file_name=photo[2]) for photo in photos]
+        paths = storage.resolve(keys, download=download)
+        if download:
+            self.run_info["photo_storage"] = storage.stats()
+        
         product_photos = {}
-        for photo in photos:
+        missing = []
+        for photo, key in zip(photos, keys):
             product_id = str(photo[1])
             sku = photo[3]
             
             if product_id not in product_photos:
+                self.product_skus[product_id] = sku
                 product_photos[product_id] = {
                     'sku': sku,
-                    'photos': []
+                    'photos': [],
+                    'photo_ids': []
                 }
             
-            # Construct file path (assuming local storage for MVP)
-            photo_path = self.storage_path / "products" / product_id / photo[2]
-            if photo_path.exists():
-                product_photos[product_id]['photos'].append(str(photo_path))
+            if key in paths:
+                product_photos[product_id]['photos'].append(paths[key])
+                product_photos[product_id]['photo_ids'].append(str(photo[0]))
+            else:
+                missing.append(storage.location(key))
         
-        # Filter products with at least 1 photo
-        valid_products = {k: v for k, v in product_photos.items() if len(v['photos']) > 0}
+        return product_photos, missing
+    
+    def deduplicate_photos(self, product_photos):
+        """
+        Finds near-duplicate photos of each product by perceptual hash. 'group' keeps each
+        duplicate group on one side of the train/validation split; 'drop' keeps only the
+        first photo of each group. Duplicates across products are only reported.
+        """
+        self.update_job_progress(15, "Checking for near-duplicate photos")
         
-        logger.info(f"Found {len(valid_products)} products with photos")
+        items = []  # (photo_id, photo_path, class index)
+        product_ids = list(product_photos.keys())
+        for idx, product_id in enumerate(product_ids):
+            for photo_id, photo_path in zip(product_photos[product_id]['photo_ids'], product_photos[product_id]['photos']):
+                items.append((photo_id, photo_path, idx))
+        
+        start = time.perf_counter()
+        cache = PhotoHashCache(self.cache_dir / "photo_hashes.json")
+        hashes = hash_photos([(item[0], item[1]) for item in items], cache, self.decode_workers,
+                             lambda path: file_fingerprint(path, with_hash=self.cache_verify_hash))
+        cache.save()
+        
+        hashed = [i for i, value in enumerate(hashes) if value is not None]
+        groups, cross_pairs = find_duplicate_groups(
+            np.array([hashes[i] for i in hashed], dtype=np.uint64),
+            [items[i][2] for i in hashed],
+            self.duplicate_distance
+        )
+        self.photo_groups = {items[hashed[k]][0]: items[hashed[g]][0] for k, g in enumerate(groups) if g != k}
+        
+        num_groups = len(set(self.photo_groups.values()))
+        logger.info(f"Found {len(self.photo_groups)} near-duplicate photos in {num_groups} groups "
+                    f"({cache.hits} hashes cached, {cache.misses} computed in {time.perf_counter() - start:.1f}s)")
+        for i, j in cross_pairs[:10]:
+            logger.warning(f"Near-duplicate photos across products: {items[hashed[i]][1]} "
+                           f"({self.product_skus.get(product_ids[items[hashed[i]][2]])}) and {items[hashed[j]][1]} "
+                           f"({self.product_skus.get(product_ids[items[hashed[j]][2]])})")
+        
+        if self.duplicates == 'drop':
+            for product in product_photos.values():
+                keep = [k for k, photo_id in enumerate(product['photo_ids']) if photo_id not in self.photo_groups]
+                product['photos'] = [product['photos'][k] for k in keep]
+                product['photo_ids'] = [product['photo_ids'][k] for k in keep]
+        
+        self.run_info["duplicates"] = {
+            "policy": self.duplicates,
+            "max_distance": self.duplicate_distance,
+            "photos_hashed": len(hashed),
+            "hashes_cached": cache.hits,
+            "groups": num_groups,
+            "duplicate_photos": len(self.photo_groups),
+            "dropped": len(self.photo_groups) if self.duplicates == 'drop' else 0,
+            "cross_product_pairs": len(cross_pairs)
+        }
+        if self.duplicates == 'drop':
+            self.photo_groups = {}
+        return product_photos
+    
+    def preflight(self):
+        """
+        Runs the database query and storage checks of a training job without importing
+        TensorFlow or touching the job row, and returns a report with per-class photo
+        counts, missing files, validation errors and rough memory/time estimates
+        """
+        start = time.perf_counter()
+        photos = self._query_product_photos()
+        product_photos, missing = self._group_photos(photos, download=False)
+        valid_products = {k: v for k, v in product_photos.items() if v['photos']}
+        num_photos = sum(len(v['photos']) for v in valid_products.values())
         
+        errors = []
+        if len(photos) < 10:
+            errors.append(f"Insufficient photos for training. Found: {len(photos)}, Required: 10+")
         if len(valid_products) < 2:
-            raise ValueError("At least 2 products with photos required for training")
+            errors.append("At least 2 products with photos required for training")
         
-        return valid_products
+        warnings = [f"Product {v['sku']} has only {len(v['photos'])} photo(s) available"
+                    for v in product_photos.values() if len(v['photos']) < 2]
+        
+        # Photos already decoded by a previous run skip the decode step
+        cached = 0
+        image_cache_root = self.cache_dir / "images" / f"{self.img_size[0]}x{self.img_size[1]}"
+        if self.image_cache_mb > 0 and (image_cache_root / ArrayCache.INDEX_FILE).exists():
+            self._ensure_image_cache()
+            for product in valid_products.values():
+                for photo_id, photo_path in zip(product['photo_ids'], product['photos']):
+                    if not os.path.exists(photo_path):
+                        continue  # Not mirrored from object storage yet
+                    fingerprint = file_fingerprint(photo_path, with_hash=self.cache_verify_hash)
+                    cached += self.image_cache.contains(photo_id, fingerprint)
+        
+        image_bytes = self.img_size[0] * self.img_size[1] * 3
+        if self.training_mode == 'features' or self.export_mode == 'embedding-index':
+            backbone_passes = num_photos * (1 + self.feature_augmentations)
+            dataset_bytes = backbone_passes * 1280 * 4
+            train_images = backbone_passes
+        else:
+            dataset_bytes = 0 if self.streaming else num_photos * image_bytes
+            train_images = int(num_photos * 0.8) * self.epochs
+        
+        train_rate, basis = self._previous_train_throughput()
+        decode_seconds = (num_photos - cached) / (PREFLIGHT_DECODE_IMAGES_PER_SEC_PER_WORKER * self.decode_workers)
+        
+        return {
+            "ok": not errors,
+            "errors": errors,
+            "warnings": warnings,
+            "products": len(valid_products),
+            "photos": num_photos,
+            "photo_rows": len(photos),
+            "missing_files": missing,
+            "classes": [
+                {"product_id": pid, "sku": v['sku'], "photos": len(v['photos'])}
+                for pid, v in product_photos.items()
+            ],
+            "cached_images": cached,
+            "estimates": {
+                "dataset_memory_mb": round(dataset_bytes / 1e6, 1),
+                "batch_memory_mb": round(self.batch_size * image_bytes * 4 / 1e6, 1),
+                "decode_seconds": round(decode_seconds, 1),
+                "train_seconds": round(train_images / train_rate, 1),
+                "throughput_basis": basis
+            },
+            "preflight_seconds": round(time.perf_counter() - start, 3)
+        }
+    
+    def _previous_train_throughput(self):
+        """Returns (images/sec, basis) from the epochs of the latest completed job, or the default assumption"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT "StageTimings"
+            FROM "ModelTrainingJobs"
+            WHERE "Status" = 'Completed' AND "StageTimings" IS NOT NULL
+            ORDER BY "CompletedAt" DESC
+            LIMIT 1
+        """)
+        row = cursor.fetchone()
+        rates = [epoch["images_per_sec"] for epoch in json.loads(row[0]).get("epochs", [])
+                 if epoch.get("images_per_sec")] if row else []
+        if rates:
+            return float(np.median(rates)), "previous job"
+        return PREFLIGHT_TRAIN_IMAGES_PER_SEC, "default assumption"
     
     def augment_and_load_data(self, product_photos):
         """Loads and augments image data"""
         self.update_job_progress(20, "Loading and augmenting images")
         
-        X = []
-        y = []
+        items = []  # (photo_id, photo_path)
+        labels = []
         product_ids = list(product_photos.keys())
         
         for idx, product_id in enumerate(product_ids):
             photos = product_photos[product_id]['photos']
+            photo_ids = product_photos[product_id]['photo_ids']
             
-            for photo_path in photos:
+            for photo_id, photo_path in zip(photo_ids, photos):
+                items.append((photo_id, photo_path))
+                labels.append(idx)  # Use index as class label
+        
+        # Load resized uint8 images (decoded in parallel, only if new or changed)
+        images = self._load_images(items)
+        
+        # Kept as uint8; normalisation and augmentation happen per batch in the input pipeline
+        X = np.array([img for img in images if img is not None], dtype=np.uint8)
+        y = np.array([label for img, label in zip(images, labels) if img is not None])
+        loaded_ids = [item[0] for img, item in zip(images, items) if img is not None]
+        
+        logger.info(f"Loaded {len(X)} images from {len(product_ids)} classes")
+        
+        # Split by index over the unique photos; the balanced sampler handles class imbalance
+        train_idx, val_idx = self._split(y, product_ids, loaded_ids)
+        
+        return X[train_idx], X[val_idx], y[train_idx], y[val_idx], product_ids
+    
+    def _ensure_image_cache(self):
+        if self.image_cache_mb > 0 and self.image_cache is None:
+            self.image_cache = ArrayCache(
+                self.cache_dir / "images" / f"{self.img_size[0]}x{self.img_size[1]}",
+                max_bytes=self.image_cache_mb * 1024 * 1024
+            )
+    
+    def _load_images(self, items):
+        """
+        Returns resized uint8 RGB arrays for (photo_id, photo_path) items, in order.
+        Cached images are reused; the rest are decoded by a process pool.
+        Photos that cannot be loaded are logged and returned as None.
+        """
+        self._ensure_image_cache()
+        
+        results = [None] * len(items)
+        fingerprints = [None] * len(items)
+        misses = []
+        
+        for i, (photo_id, photo_path) in enumerate(items):
+            if self.image_cache:
                 try:
-                    # Load and resize image
-                    img = Image.open(photo_path)
-                    img = img.convert('RGB')
-                    img = img.resize(self.img_size)
-                    img_array = np.array(img) / 255.0  # Normalize
-                    
-                    X.append(img_array)
-                    y.append(idx)  # Use index as class label
-                    
-                except Exception as e:
+                    fingerprints[i] = file_fingerprint(photo_path, with_hash=self.cache_verify_hash)
+                except OSError as e:
                     logger.warning(f"Failed to load {photo_path}: {e}")
+                    continue
+                cached = self.image_cache.get(photo_id, fingerprints[i])
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            misses.append(i)
         
-        X = np.array(X)
-        y = np.array(y)
+        if misses:
+            start = time.perf_counter()
+            decoded = decode_photos([items[i][1] for i in misses], self.img_size, self.decode_workers)
+            
+            for i, (img_array, error) in zip(misses, decoded):
+                if error is not None:
+                    logger.warning(f"Failed to load {items[i][1]}: {error}")
+                    continue
+                results[i] = img_array
+                if self.image_cache:
+                    self.image_cache.put(items[i][0], fingerprints[i], img_array)
+            
+            elapsed = max(time.perf_counter() - start, 1e-6)
+            logger.info(f"Decoded {len(misses)} images in {elapsed:.1f}s "
+                        f"({len(misses) / elapsed:.1f} images/sec, {self.decode_workers} workers)")
         
-        logger.info(f"Loaded {len(X)} images from {len(product_ids)} classes")
+        if self.image_cache:
+            self.image_cache.save()
+            stats = self.image_cache.stats()
+            logger.info(f"Image cache: {stats['hits']} hits, {stats['misses']} decoded, "
+                        f"{stats['entries']} entries ({stats['bytes'] / 1e6:.1f} MB)")
         
-        # Split dataset
-        X_train, X_val, y_train, y_val = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y if len(np.unique(y)) > 1 else None
-        )
+        return results
+    
+    def build_streaming_datasets(self, product_photos):
+        """
+        Builds lazily-decoded tf.data pipelines from photo file paths.
+        Returns the same tuple shape as augment_and_load_data, with the train/val
+        datasets in place of X_train/X_val and no separate label arrays.
+        """
+        self.update_job_progress(20, "Building streaming input pipeline")
+        
+        paths = []
+        labels = []
+        photo_ids = []
+        product_ids = list(product_photos.keys())
+        
+        for idx, product_id in enumerate(product_ids):
+            for photo_id, photo_path in zip(product_photos[product_id]['photo_ids'], product_photos[product_id]['photos']):
+                paths.append(photo_path)
+                labels.append(idx)  # Use index as class label
+                photo_ids.append(photo_id)
+        
+        logger.info(f"Streaming {len(paths)} images from {len(product_ids)} classes")
+        
+        # Split the path list, not decoded tensors, so nothing is materialised up front
+        train_idx, val_idx = self._split(labels, product_ids, photo_ids)
+        
+        train_ds = self._make_dataset([paths[i] for i in train_idx], [labels[i] for i in train_idx], training=True)
+        val_ds = self._make_dataset([paths[i] for i in val_idx], [labels[i] for i in val_idx], training=False)
+        
+        return train_ds, val_ds, None, None, product_ids
+    
+    def _split(self, labels, product_ids, photo_ids):
+        """
+        Stratified train/validation split over unique photos, recorded in run_info.
+        Near-duplicate photos (see deduplicate_photos) are kept on the same side.
+        """
+        _, groups = np.unique([self.photo_groups.get(photo_id, photo_id) for photo_id in photo_ids], return_inverse=True)
+        train_idx, val_idx, train_only = stratified_split(labels, groups=groups)
+        if len(val_idx) == 0:
+            raise ValueError("At least one product with 2+ photos is required for validation")
+        
+        if train_only:
+            logger.info(f"{len(train_only)} single-photo products are train-only: "
+                        f"{', '.join(self.product_skus.get(product_ids[c], product_ids[c]) for c in train_only[:10])}")
+        self.run_info["split"] = {
+            "train_photos": int(len(train_idx)),
+            "validation_photos": int(len(val_idx)),
+            "train_only_products": len(train_only),
+            "near_duplicates_grouped": sum(photo_id in self.photo_groups for photo_id in photo_ids),
+            "sampling": "class-balanced"
+        }
+        return train_idx, val_idx
+    
+    def _balanced_indices(self, y):
+        """
+        Returns a dataset of len(y) sample indices per epoch, drawing a class uniformly and
+        then a sample of that class uniformly (with replacement), so every class is seen
+        equally often without duplicating any data
+        """
+        y = np.asarray(y)
+        order = np.argsort(y, kind='stable')
+        _, starts, counts = np.unique(y[order], return_index=True, return_counts=True)
+        order, starts, counts = (tf.constant(a, dtype=tf.int64) for a in (order, starts, counts))
+        num_classes = len(counts)
+        
+        def sample(_):
+            c = tf.random.uniform([], 0, num_classes, dtype=tf.int64)
+            return order[starts[c] + tf.random.uniform([], 0, counts[c], dtype=tf.int64)]
+        
+        return self._shard(tf.data.Dataset.range(len(y))).map(sample, num_parallel_calls=tf.data.AUTOTUNE)
+    
+    def _shard(self, ds):
+        """Keeps this worker's share of the elements in distributed mode, before any decoding"""
+        if self.num_workers == 1:
+            return ds
+        return ds.shard(self.num_workers, self.worker_index)
+    
+    def _make_dataset(self, paths, labels, training):
+        """
+        Creates a tf.data pipeline that keeps images uint8 until they are batched for the model.
+        Training batches carry class-balancing sample weights, since a lazily decoded stream
+        cannot be resampled by index without decoding photos repeatedly.
+        """
+        autotune = tf.data.AUTOTUNE
+        img_size = self.img_size
+        
+        def load_image(path, label, *weight):
+            img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+            img = tf.image.resize(img, img_size)
+            img = tf.cast(tf.clip_by_value(tf.round(img), 0, 255), tf.uint8)
+            return (img, label, *weight)
+        
+        if training and self.dataset_cache != 'none':
+            # The split lists photos class by class, and a cached stream replays its first order
+            # every epoch: shuffle once (fixed seed, so the cache stays valid) before decoding
+            order = np.random.default_rng(42).permutation(len(paths))
+            paths, labels = [paths[i] for i in order], [labels[i] for i in order]
+        
+        if training:
+            ds = tf.data.Dataset.from_tensor_slices((list(paths), list(labels), class_balance_weights(labels)))
+        else:
+            ds = tf.data.Dataset.from_tensor_slices((list(paths), list(labels)))
+        ds = self._shard(ds)
+        
+        if training and self.dataset_cache == 'none':
+            # Shuffling file names is cheap; decoded images are never buffered
+            ds = ds.shuffle(len(paths), seed=42, reshuffle_each_iteration=True)
+        
+        ds = ds.map(load_image, num_parallel_calls=autotune)
+        # Corrupt or unreadable files are skipped with a warning instead of failing the epoch
+        ds = ds.ignore_errors(log_warning=True)
+        
+        if self.dataset_cache == 'memory':
+            ds = ds.cache()
+        elif self.dataset_cache == 'disk':
+            # Under cache_dir, which is already per worker for non-chief workers on a shared host
+            cache_dir = self.cache_dir / "tfdata" / str(self.job_id)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            ds = ds.cache(str(cache_dir / ("train" if training else "val")))
+        
+        if training and self.dataset_cache != 'none':
+            # Varies the batches between epochs on top of the shuffled cache order
+            ds = ds.shuffle(self.batch_size * 8, seed=42, reshuffle_each_iteration=True)
+        
+        return self._batch_images(ds, training)
+    
+    def _array_dataset(self, X, y, training, images=True, shard=True):
+        """
+        Wraps in-memory arrays (uint8 images or embeddings) in a batched tf.data pipeline.
+        Training samples are drawn class-balanced by index from the arrays. In distributed
+        mode each worker gets its shard unless shard=False.
+        """
+        if training:
+            X_tensor, y_tensor = tf.convert_to_tensor(X), tf.convert_to_tensor(y)
+            ds = self._balanced_indices(y).map(
+                lambda i: (tf.gather(X_tensor, i), tf.gather(y_tensor, i)),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        else:
+            ds = tf.data.Dataset.from_tensor_slices((X, y))
+            if shard:
+                ds = self._shard(ds)
+        
+        if images:
+            return self._batch_images(ds, training)
+        return ds.batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+    
+    def _batch_images(self, ds, training):
+        """Batches uint8 images, then normalises (and augments, for training) whole batches in-graph"""
+        autotune = tf.data.AUTOTUNE
+        
+        # Extra elements (sample weights) pass through unchanged
+        def normalize(images, labels, *rest):
+            return (tf.cast(images, tf.float32) / 255.0, labels, *rest)
+        
+        def augment(images, labels, *rest):
+            return (self._augment_images(images), labels, *rest)
+        
+        ds = ds.batch(self.batch_size)
+        ds = ds.map(normalize, num_parallel_calls=autotune)
+        if training:
+            self._build_augmentation()  # Create the layers eagerly, outside the traced map function
+            ds = ds.map(augment, num_parallel_calls=autotune)
+        
+        return ds.prefetch(autotune)
+    
+    def _build_augmentation(self):
+        """Creates the batched augmentation layers: rotation 15 degrees, shifts 0.1, zoom 0.1, horizontal flip"""
+        if self.augmentation is None:
+            # Kept float32 under a mixed precision policy; they run in the input pipeline, not the model
+            self.augmentation = keras.Sequential([
+                keras.layers.RandomRotation(15 / 360, fill_mode='nearest', dtype='float32'),
+                keras.layers.RandomTranslation(0.1, 0.1, fill_mode='nearest', dtype='float32'),
+                keras.layers.RandomZoom(0.1, fill_mode='nearest', dtype='float32'),
+                keras.layers.RandomFlip('horizontal', dtype='float32')
+            ], name='augmentation')
+        return self.augmentation
+    
+    def _augment_images(self, images):
+        """Applies training augmentation to a float image batch in [0, 1]"""
+        images = self._build_augmentation()(images, training=True)
+        # Multiplicative brightness per image, matching ImageDataGenerator's brightness_range
+        brightness = tf.random.uniform([tf.shape(images)[0], 1, 1, 1], 0.8, 1.2)
+        return tf.clip_by_value(images * brightness, 0.0, 1.0)
+    
+    def extract_feature_dataset(self, product_photos):
+        """
+        Runs the frozen backbone once per photo (and per augmentation variant) and
+        returns pooled embeddings in the same tuple shape as augment_and_load_data.
+        Embeddings are cached on disk keyed by photo id, variant and file fingerprint.
+        """
+        self.update_job_progress(20, "Extracting backbone features")
+        
+        if self.feature_cache is None:
+            # Embeddings computed under mixed precision differ slightly, so they are cached separately
+            precision = keras.mixed_precision.global_policy().name
+            suffix = "" if precision == 'float32' else f"_{precision}"
+            self.feature_cache = ArrayCache(
+                self.cache_dir / "features" / f"mobilenet_v2_imagenet_{self.img_size[0]}x{self.img_size[1]}{suffix}",
+                max_bytes=self.feature_cache_mb * 1024 * 1024
+            )
+        extractor = keras.Sequential([self._load_backbone(), keras.layers.GlobalAveragePooling2D()])
+        num_variants = 1 + self.feature_augmentations
+        
+        items = []  # (photo_id, photo_path, label)
+        product_ids = list(product_photos.keys())
+        for idx, product_id in enumerate(product_ids):
+            for photo_id, photo_path in zip(product_photos[product_id]['photo_ids'], product_photos[product_id]['photos']):
+                items.append((photo_id, photo_path, idx))
+        
+        features = {}  # (item index, variant) -> embedding
+        pending = {False: ([], []), True: ([], [])}  # augmented? -> (keys, images)
+        
+        def flush(augmented):
+            keys, images = pending[augmented]
+            if not images:
+                return
+            batch = tf.cast(np.stack(images), tf.float32) / 255.0
+            if augmented:
+                batch = self._augment_images(batch)
+            vectors = tf.cast(extractor(batch, training=False), tf.float32).numpy()
+            for (key, fingerprint, slot), vector in zip(keys, vectors):
+                self.feature_cache.put(key, fingerprint, vector)
+                features[slot] = vector
+            keys.clear()
+            images.clear()
+        
+        # Look up cached embeddings first; only photos with a missing variant get decoded
+        to_compute = {}  # item index -> (fingerprint, missing variants)
+        for i, (photo_id, photo_path, _) in enumerate(items):
+            try:
+                fingerprint = file_fingerprint(photo_path, with_hash=self.cache_verify_hash)
+            except OSError as e:
+                logger.warning(f"Failed to load {photo_path}: {e}")
+                continue
+            for variant in range(num_variants):
+                cached = self.feature_cache.get(f"{photo_id}:{variant}", fingerprint)
+                if cached is not None:
+                    features[(i, variant)] = np.asarray(cached)
+                else:
+                    to_compute.setdefault(i, (fingerprint, []))[1].append(variant)
+        
+        # Decode in chunks so only a bounded number of images is held in memory
+        chunk_size = max(self.batch_size * 8, 256)
+        indices = list(to_compute.keys())
+        for chunk_start in range(0, len(indices), chunk_size):
+            chunk = indices[chunk_start:chunk_start + chunk_size]
+            images = self._load_images([(items[i][0], items[i][1]) for i in chunk])
+            
+            for i, img_array in zip(chunk, images):
+                if img_array is None:
+                    continue
+                fingerprint, variants = to_compute[i]
+                for variant in variants:
+                    # Variant 0 is the original photo; the rest are random augmented views
+                    augmented = variant > 0
+                    keys, batch_images = pending[augmented]
+                    keys.append((f"{items[i][0]}:{variant}", fingerprint, (i, variant)))
+                    batch_images.append(img_array)
+                    
+                    if len(batch_images) >= self.batch_size:
+                        flush(augmented)
+        flush(False)
+        flush(True)
+        
+        self.feature_cache.save()
+        stats = self.feature_cache.stats()
+        logger.info(f"Feature cache: {stats['hits']} hits, {stats['misses']} computed, "
+                    f"{stats['entries']} entries ({stats['bytes'] / 1e6:.1f} MB)")
+        
+        # Split by photo so augmented variants of a validation photo never land in training
+        loaded = [i for i in range(len(items)) if (i, 0) in features]
+        train_pos, val_pos = self._split([items[i][2] for i in loaded], product_ids, [items[i][0] for i in loaded])
+        train_idx = [loaded[k] for k in train_pos]
+        val_idx = [loaded[k] for k in val_pos]
+        
+        X_train = np.array([features[(i, v)] for i in train_idx for v in range(num_variants) if (i, v) in features])
+        y_train = np.array([items[i][2] for i in train_idx for v in range(num_variants) if (i, v) in features])
+        X_val = np.array([features[(i, 0)] for i in val_idx])
+        y_val = np.array([items[i][2] for i in val_idx])
+        self.validation_photos = [items[i] for i in val_idx]
+        
+        logger.info(f"Prepared {len(X_train)} training / {len(X_val)} validation embeddings "
+                    f"from {len(loaded)} images in {len(product_ids)} classes")
         
         return X_train, X_val, y_train, y_val, product_ids
     
-    def create_model(self, num_classes):
-        """Creates MobileNetV2-based model for transfer learning"""
-        self.update_job_progress(25, "Building MobileNetV2 model architecture")
+    def apply_performance_profile(self):
+        """
+        Imports TensorFlow with the --perf-profile settings: oneDNN, intra/inter-op thread
+        pools sized to the detected cores, bfloat16 mixed precision when the CPU has native
+        bf16 support, and the profile's starting batch size. Thread pools can only be set
+        before TensorFlow runs its first op.
+        """
+        if self.perf_profile == 'none' or self.perf_settings is not None:
+            import_ml_modules()
+            return
+        
+        hardware = detect_hardware()
+        settings = plan_profile(self.perf_profile, hardware)
+        os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '1')
+        import_ml_modules()
+        
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(settings['intra_op_threads'])
+            tf.config.threading.set_inter_op_parallelism_threads(settings['inter_op_threads'])
+        except RuntimeError:
+            # TensorFlow is already initialised (a later job in worker mode) and keeps its pools
+            settings['intra_op_threads'] = tf.config.threading.get_intra_op_parallelism_threads()
+            settings['inter_op_threads'] = tf.config.threading.get_inter_op_parallelism_threads()
         
-        # Load pre-trained MobileNetV2
-        base_model = MobileNetV2(
-            input_shape=(*self.img_size, 3),
-            include_top=False,
-            weights='imagenet'
+        keras.mixed_precision.set_global_policy(settings['mixed_precision'] or 'float32')
+        self.batch_size = settings['default_batch_size']
+        
+        self.perf_settings = {**settings, "batch_size": self.batch_size, "hardware": hardware}
+        self.run_info["performance"] = self.perf_settings
+        logger.info(f"Performance profile {settings['profile']}: {hardware['cores']} cores, "
+                    f"{hardware['memory_available_mb']} MB available, threads {settings['intra_op_threads']}/"
+                    f"{settings['inter_op_threads']}, precision {settings['mixed_precision'] or 'float32'}")
+    
+    def start_distribution(self):
+        """
+        Creates the MultiWorkerMirroredStrategy for --distributed runs. It must exist before
+        TensorFlow runs any other op, and blocks until every worker in TF_CONFIG has started.
+        Gradients are all-reduced each step, so every worker holds identical weights.
+        """
+        if not self.distributed or self.strategy is not None:
+            return
+        
+        self.strategy = tf.distribute.MultiWorkerMirroredStrategy(
+            communication_options=tf.distribute.experimental.CommunicationOptions(
+                timeout_seconds=COLLECTIVE_TIMEOUT_SECONDS
+            )
         )
+        self.run_info["distributed"] = {
+            "workers": self.num_workers,
+            "replicas": self.strategy.num_replicas_in_sync,
+            "batch_size_per_worker": self.batch_size,
+            "global_batch_size": self.batch_size * self.num_workers
+        }
+        logger.info(f"Distributed training as worker {self.worker_index} of {self.num_workers} "
+                    f"({self.strategy.num_replicas_in_sync} replicas in sync)")
+    
+    def _strategy_scope(self):
+        """Variables created inside this scope are mirrored across workers in distributed mode"""
+        return self.strategy.scope() if self.strategy is not None else nullcontext()
+    
+    def _sum_across_workers(self, values):
+        """
+        Returns the element-wise sum of a list of numbers over all workers. It is a collective
+        op, so every worker must call it at the same point of training.
+        """
+        if self.strategy is None:
+            return np.asarray(values, dtype=np.float64)
+        per_replica = self.strategy.run(lambda: tf.constant(values, dtype=tf.float32))
+        return self.strategy.reduce(tf.distribute.ReduceOp.SUM, per_replica, axis=None).numpy()
+    
+    def _distribute(self, train_data, validation_data, num_train, num_val):
+        """
+        Hands each worker's dataset shards to the strategy. Shards differ in length (by up to
+        a batch, or by skipped unreadable photos), so both repeat and every worker runs the
+        same number of steps; an uneven step count would leave workers waiting on each
+        other's all-reduce. Returns the datasets and the fit step counts.
+        """
+        global_batch = self.batch_size * self.num_workers
+        steps = {
+            "steps_per_epoch": max(1, math.ceil(num_train / global_batch)),
+            "validation_steps": max(1, math.ceil(num_val / global_batch))
+        }
+        distributed = [self.strategy.distribute_datasets_from_function(lambda _, ds=ds: ds.repeat())
+                       for ds in (train_data, validation_data)]
+        return distributed[0], distributed[1], steps
+    
+    def _measure_batch_size(self, model):
+        """
+        Picks the batch size from the model's measured per-sample memory: how much more the
+        current RSS grows across a probe forward/backward pass of 24 images than of 8, fitted
+        into the profile's share of available memory. Gradients are computed but never applied.
+        """
+        small, large = 8, 24
         
-        # Freeze base model layers
-        base_model.trainable = False
+        def probe(n):
+            images = tf.random.uniform((n, *self.img_size, 3))
+            labels = tf.zeros((n,), dtype=tf.int32)
+            start = current_rss_mb()
+            with tf.GradientTape() as tape:
+                loss = keras.losses.sparse_categorical_crossentropy(labels, model(images, training=True))
+            gradients = tape.gradient(loss, model.trainable_variables)
+            end = current_rss_mb()  # While the activations and gradients are still referenced
+            del gradients, tape
+            return None if start is None or end is None else end - start
         
-        # Add custom classification layers
-        model = keras.Sequential([
-            base_model,
-            keras.layers.GlobalAveragePooling2D(),
-            keras.layers.Dense(128, activation='relu'),
-            keras.layers.Dropout(0.2),
-            keras.layers.Dense(num_classes, activation='softmax')
-        ])
+        probe(small)  # Warm-up: builds the graph and allocator pools, which would count as growth
+        before, after = probe(small), probe(large)
+        available = available_memory_mb()
+        if before is None or after is None or after <= before or not available:
+            logger.info(f"Could not measure per-sample memory; keeping batch size {self.batch_size}")
+            return
         
+        per_sample_mb = (after - before) / (large - small)
+        budget_mb = available * self.perf_settings['memory_fraction']
+        self.batch_size = choose_batch_size(per_sample_mb, budget_mb, maximum=self.perf_settings['max_batch_size'])
+        self.perf_settings.update(batch_size=self.batch_size, per_sample_mb=round(per_sample_mb, 2),
+                                  batch_memory_budget_mb=round(budget_mb))
+        logger.info(f"Measured {per_sample_mb:.1f} MB per sample; batch size {self.batch_size} "
+                    f"for a {budget_mb:.0f} MB budget")
+    
+    def _float32_model(self, model):
+        """Rebuilds a model as float32 (and outside any distribution strategy), with the same weights"""
+        def to_float32(value):
+            if isinstance(value, dict):
+                if value.get('class_name') in ('Policy', 'DTypePolicy'):
+                    return 'float32'
+                return {key: to_float32(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [to_float32(item) for item in value]
+            return 'float32' if value in ('mixed_bfloat16', 'mixed_float16') else value
+        
+        copy = model.__class__.from_config(to_float32(model.get_config()))
+        copy.set_weights(model.get_weights())
+        if getattr(model, 'optimizer', None) is not None:
+            self._compile(copy)  # The quantization report evaluates the export model
+        return copy
+    
+    @contextmanager
+    def _export_precision(self):
+        """
+        Builds export models in float32 when training ran under mixed precision (TF.js has no
+        bfloat16), and outside the distribution strategy, whose mirrored variables only worker 0
+        would touch during export
+        """
+        policy = keras.mixed_precision.global_policy()
+        if policy.name == 'float32' and self.strategy is None:
+            yield
+            return
+        
+        base_model = self.base_model
+        keras.mixed_precision.set_global_policy('float32')
+        self.base_model = self._float32_model(base_model)
+        try:
+            yield
+        finally:
+            self.base_model = base_model
+            keras.mixed_precision.set_global_policy(policy)
+    
+    def _load_backbone(self):
+        """Loads the frozen pre-trained MobileNetV2 feature extractor (once per trainer)"""
+        if self.base_model is None:
+            self.apply_performance_profile()
+            
+            # Load pre-trained MobileNetV2
+            self.base_model = MobileNetV2(
+                input_shape=(*self.img_size, 3),
+                include_top=False,
+                weights='imagenet'
+            )
+            
+            # Freeze base model layers
+            self.base_model.trainable = False
+        
+        return self.base_model
+    
+    def _build_head_layers(self, num_classes):
+        """Creates the trainable classification layers that sit on top of the pooled backbone features"""
+        return [
+            keras.layers.Dense(self.head_config['hidden_units'], activation='relu'),
+            keras.layers.Dropout(self.head_config['dropout']),
+            keras.layers.Dense(num_classes, activation='softmax', dtype='float32')  # float32 softmax under mixed precision
+        ]
+    
+    def _compile(self, model):
         model.compile(
-            optimizer=keras.optimizers.Adam(learning_rate=0.001),
+            optimizer=keras.optimizers.Adam(learning_rate=self.head_config['learning_rate']),
             loss='sparse_categorical_crossentropy',
             metrics=['accuracy']
         )
+    
+    def create_model(self, num_classes):
+        """Creates MobileNetV2-based model for transfer learning"""
+        self.update_job_progress(25, "Building MobileNetV2 model architecture")
+        
+        # Add custom classification layers
+        model = keras.Sequential([
+            self._load_backbone(),
+            keras.layers.GlobalAveragePooling2D(),
+            *self._build_head_layers(num_classes)
+        ])
+        
+        self._compile(model)
         
         logger.info(f"Model created with {num_classes} output classes")
         return model
     
-    def train_model(self, model, X_train, y_train, X_val, y_val):
-        """Trains the model"""
+    def create_head_model(self, num_classes, report_progress=True, feature_dim=None):
+        """Creates the classification head alone, trained on cached backbone embeddings"""
+        if report_progress:
+            self.update_job_progress(25, "Building classification head")
+        
+        feature_dim = feature_dim or self._load_backbone().output_shape[-1]
+        model = keras.Sequential([
+            keras.Input(shape=(feature_dim,)),
+            *self._build_head_layers(num_classes)
+        ])
+        
+        self._compile(model)
+        
+        logger.info(f"Head model created with {feature_dim}-d input and {num_classes} output classes")
+        return model
+    
+    def assemble_model(self, head_model):
+        """Puts a trained head back on top of the backbone, giving the same exportable model as create_model"""
+        num_classes = head_model.output_shape[-1]
+        model = keras.Sequential([
+            self._load_backbone(),
+            keras.layers.GlobalAveragePooling2D(),
+            *self._build_head_layers(num_classes)
+        ])
+        
+        for source, target in zip(head_model.layers, model.layers[2:]):
+            target.set_weights(source.get_weights())
+        
+        self._compile(model)
+        return model
+    
+    def load_previous_head(self):
+        """
+        Loads the active model version's class mapping and head weights from output_path.
+        Returns None when there is no active model or its artifacts are missing.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT "Version"
+            FROM "ModelMetadata"
+            WHERE "IsActive" = true
+            ORDER BY "TrainedAt" DESC
+            LIMIT 1
+        """)
+        row = cursor.fetchone()
+        if not row:
+            logger.info("No active model to warm-start from")
+            return None
+        
+        version = row[0]
+        model_dir = self.output_path / version
+        mapping_file = model_dir / "product_mapping.json"
+        weights_file = model_dir / "head_weights.npz"
+        if not mapping_file.exists() or not weights_file.exists():
+            logger.info(f"Active model {version} has no reusable head weights")
+            return None
+        
+        with open(mapping_file) as f:
+            mapping = json.load(f)
+        
+        with np.load(weights_file) as weights:
+            return {
+                "version": version,
+                "product_ids": [mapping[str(idx)] for idx in range(len(mapping))],
+                "weights": {name: weights[name] for name in weights.files}
+            }
+    
+    def warm_start(self, model, previous, product_ids):
+        """
+        Initialises the head from a previous version: the hidden layer is copied and each
+        existing class keeps its old output row, so only rows for new products start
+        from random init. Returns False when the catalog changed too much to reuse it.
+        """
+        old_index = {product_id: idx for idx, product_id in enumerate(previous["product_ids"])}
+        kept = [product_id for product_id in product_ids if product_id in old_index]
+        added = len(product_ids) - len(kept)
+        removed = len(old_index) - len(kept)
+        
+        if added / len(product_ids) > self.incremental_max_change or removed / len(old_index) > self.incremental_max_change:
+            logger.info(f"Catalog changed too much since {previous['version']} "
+                        f"({added} added, {removed} removed); falling back to full training")
+            return False
+        
+        hidden, _, output = model.layers[-3:]
+        weights = previous["weights"]
+        if weights["hidden_kernel"].shape != hidden.get_weights()[0].shape:
+            logger.info(f"Head architecture differs from {previous['version']}; falling back to full training")
+            return False
+        
+        hidden.set_weights([weights["hidden_kernel"], weights["hidden_bias"]])
+        
+        kernel, bias = output.get_weights()
+        for idx, product_id in enumerate(product_ids):
+            old_idx = old_index.get(product_id)
+            if old_idx is not None:
+                kernel[:, idx] = weights["output_kernel"][:, old_idx]
+                bias[idx] = weights["output_bias"][old_idx]
+        output.set_weights([kernel, bias])
+        
+        logger.info(f"Warm-started head from {previous['version']}: "
+                    f"{len(kept)} classes reused, {added} new, {removed} removed")
+        self.run_info["warm_start"] = {
+            "from_version": previous["version"],
+            "classes_reused": len(kept),
+            "classes_added": added,
+            "classes_removed": removed
+        }
+        return True
+    
+    def sweep_head(self, X_train, y_train, X_val, y_val, num_classes):
+        """
+        Trains sweep_trials head configurations in parallel worker processes on the cached
+        embeddings and returns (best head, its validation accuracy). Every trial is
+        recorded in run_info, and head_config is set to the winner.
+        """
+        configs = sample_configs(self.sweep_trials)
+        self.update_job_progress(30, f"Hyperparameter sweep: 0/{len(configs)} trials")
+        
+        def on_result(results):
+            best = max(r["val_accuracy"] for r in results)
+            self.update_job_progress(30 + int(len(results) / len(configs) * 50),
+                                     f"Hyperparameter sweep: {len(results)}/{len(configs)} trials - best accuracy {best:.2%}")
+        
+        time_limit = None
+        if self.time_budget:
+            # Same deadline as a normal fit: the job budget minus the export reserve
+            time_limit = self.timings.started + self.time_budget - self.export_reserve - time.perf_counter()
+            if time_limit <= 0:
+                raise ValueError(f"Time budget of {self.time_budget}s exhausted before the sweep started")
+        
+        data_dir = save_shared_data(self.output_path / ".sweep" / str(self.job_id), X_train, y_train, X_val, y_val)
+        try:
+            results, best, weights = run_sweep(data_dir, configs, self.epochs, self.batch_size,
+                                               self.early_stopping_patience, self.sweep_workers, on_result,
+                                               time_limit=time_limit)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        
+        self.head_config = dict(best["config"])
+        head = self.create_head_model(num_classes, report_progress=False, feature_dim=X_train.shape[1])
+        head.set_weights(weights)
+        
+        self.validation_data = self._array_dataset(X_val, y_val, training=False, images=False)
+        self.validation_inputs = 'features'
+        # The winner was picked on the same validation split, so its score is optimistically biased
+        self.run_info["sweep"] = {"best": best, "trials": results, "trials_planned": len(configs)}
+        self.run_info["validation_accuracy_source"] = "sweep_selection"
+        logger.info(f"Best head configuration {best['config']}: {best['val_accuracy']:.2%} "
+                    f"(trial {best['trial'] + 1} of {len(results)})")
+        return head, best["val_accuracy"]
+    
+    def _dataset_manifest(self, product_photos):
+        """Hashes class order, photo ids, file fingerprints and input settings; checkpoints only resume on a match"""
+        digest = hashlib.sha256(json.dumps({
+            "img_size": self.img_size,
+            "training_mode": self.training_mode,
+            "feature_augmentations": self.feature_augmentations
+        }).encode('utf-8'))
+        for product_id, product in product_photos.items():
+            digest.update(product_id.encode('utf-8'))
+            for photo_id, photo_path in zip(product['photo_ids'], product['photos']):
+                fingerprint = file_fingerprint(photo_path)
+                digest.update(f"{photo_id}:{fingerprint['size']}:{fingerprint['mtime_ns']}".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def restore_checkpoint(self, model):
+        """
+        Loads this job's latest checkpoint into the model and optimizer when its dataset
+        manifest and class mapping match the current run. Returns the epoch to resume from.
+        In distributed mode every worker must find the same checkpoint, otherwise all of
+        them train from scratch.
+        """
+        checkpoint = self._load_checkpoint(model)
+        
+        if self.strategy is not None:
+            epoch = checkpoint[0]["epoch"] if checkpoint else 0
+            total, squares = self._sum_across_workers([epoch, epoch ** 2])
+            if squares * self.num_workers != total ** 2:
+                logger.warning("Workers found different checkpoints (is the output path shared?); training from scratch")
+                return 0
+        
+        if checkpoint is None:
+            return 0
+        
+        state, weights, optimizer_weights = checkpoint
+        trainable = model.trainable_weights
+        for variable, value in zip(trainable, weights):
+            variable.assign(value)
+        model.optimizer.build(trainable)
+        for variable, value in zip(model.optimizer.variables, optimizer_weights):
+            variable.assign(value)
+        model.optimizer.learning_rate.assign(state["learning_rate"])
+        
+        logger.info(f"Resumed from checkpoint after epoch {state['epoch']}")
+        self.run_info["resumed_from_epoch"] = state["epoch"]
+        return state["epoch"]
+    
+    def _load_checkpoint(self, model):
+        """Returns this job's latest (state, weights, optimizer weights) if it fits the current run, else None"""
+        checkpoint = self.checkpoints.load_latest()
+        if checkpoint is None:
+            logger.info("No checkpoint to resume from; training from scratch")
+            return None
+        
+        state, weights, _ = checkpoint
+        # Only worker 0 deletes checkpoints; the others may be reading the same directory
+        if state["manifest"] != self.dataset_manifest or state["product_ids"] != self.class_mapping:
+            logger.warning(f"Checkpoint from epoch {state['epoch']} was made for a different dataset; discarding it")
+            if self.is_chief:
+                self.checkpoints.clear()
+            return None
+        
+        if [w.shape for w in weights] != [tuple(v.shape) for v in model.trainable_weights]:
+            logger.warning("Checkpoint weights do not match the model architecture; discarding it")
+            if self.is_chief:
+                self.checkpoints.clear()
+            return None
+        
+        return checkpoint
+    
+    def train_model(self, model, X_train, y_train, X_val, y_val, augment=True):
+        """
+        Trains the model.
+        X_train/X_val are uint8 image arrays, or tf.data datasets of (images, labels)
+        batches (streaming mode), in which case y_train/y_val are None. Pass
+        augment=False for inputs that are not images (cached backbone embeddings).
+        """
         self.update_job_progress(30, f"Training model (0/{self.epochs} epochs)")
         
-        # Data augmentation for training
-        datagen = ImageDataGenerator(
-            rotation_range=15,
-            width_shift_range=0.1,
-            height_shift_range=0.1,
-            brightness_range=[0.8, 1.2],
-            horizontal_flip=True,
-            zoom_range=0.1
-        )
+        if isinstance(X_train, tf.data.Dataset):
+            train_data = X_train
+            validation_data = X_val
+        else:
+            # Data augmentation runs in-graph on whole batches (see _augment_images)
+            train_data = self._array_dataset(X_train, y_train, training=True, images=augment)
+            validation_data = self._array_dataset(X_val, y_val, training=False, images=augment)
+        
+        steps = {}
+        if self.strategy is not None:
+            split = self.run_info["split"]
+            train_data, validation_data, steps = self._distribute(
+                train_data, validation_data,
+                split["train_photos"] if y_train is None else len(y_train),
+                split["validation_photos"] if y_val is None else len(y_val)
+            )
         
         # Custom callback to update progress
         class ProgressCallback(keras.callbacks.Callback):
@@ -223,28 +1350,221 @@ class ModelTrainer:
                 super().__init__()
                 self.trainer = trainer
                 self.total_epochs = total_epochs
+                self.epoch = 0
+                self.initial_epoch = 0  # Set when resuming from a checkpoint
+            
+            def on_train_begin(self, logs=None):
+                self.start = time.perf_counter()
+            
+            def on_epoch_begin(self, epoch, logs=None):
+                self.epoch = epoch
+            
+            def on_train_batch_end(self, batch, logs=None):
+                # Per-batch progress with an ETA; the reporter coalesces these, so this stays cheap
+                steps = self.params.get('steps')
+                if not steps:
+                    return
+                done = (self.epoch + (batch + 1) / steps) / self.total_epochs
+                run_done = (self.epoch - self.initial_epoch + (batch + 1) / steps) / (self.total_epochs - self.initial_epoch)
+                eta = (time.perf_counter() - self.start) * (1 - run_done) / run_done
+                progress = 30 + int(done * 50)  # 30-80% range
+                stage = (f"Training epoch {self.epoch + 1}/{self.total_epochs}, "
+                         f"batch {batch + 1}/{steps} - ETA {format_eta(eta)}")
+                self.trainer.update_job_progress(progress, stage)
             
             def on_epoch_end(self, epoch, logs=None):
                 progress = 30 + int((epoch + 1) / self.total_epochs * 50)  # 30-80% range
                 stage = f"Training epoch {epoch + 1}/{self.total_epochs} - Accuracy: {logs.get('accuracy', 0):.2%}"
                 self.trainer.update_job_progress(progress, stage)
         
+        self.validation_data = validation_data
+        if self.strategy is not None:
+            # Worker 0 re-evaluates quantized weights alone, on the whole validation split
+            self.validation_data = None if y_val is None else self._array_dataset(X_val, y_val, training=False, images=augment, shard=False)
+        self.validation_inputs = 'images' if augment else 'features'
+        
+        # Records wall time and images/sec for every epoch
+        class EpochTimingCallback(keras.callbacks.Callback):
+            def __init__(self, timings, num_samples, batch_size):
+                super().__init__()
+                self.timings = timings
+                self.num_samples = num_samples
+                self.batch_size = batch_size
+            
+            def on_epoch_begin(self, epoch, logs=None):
+                self.epoch_start = time.perf_counter()
+                self.batches = 0
+            
+            def on_train_batch_end(self, batch, logs=None):
+                self.batches += 1
+            
+            def on_epoch_end(self, epoch, logs=None):
+                samples = self.num_samples or self.batches * self.batch_size
+                self.timings.record_epoch(epoch + 1, time.perf_counter() - self.epoch_start, samples)
+        
+        # Stops before the time budget runs out, leaving export_reserve seconds for export and the
+        # database update; the epoch plan is derived from the measured epoch time
+        class TimeBudgetCallback(keras.callbacks.Callback):
+            def __init__(self, deadline, total_epochs, progress_callback, early_stopping, any_worker=None):
+                super().__init__()
+                self.deadline = deadline
+                self.total_epochs = total_epochs
+                self.progress_callback = progress_callback
+                self.early_stopping = early_stopping
+                # Distributed workers stop together: only at epoch ends, when any of them is out of time
+                self.any_worker = any_worker
+                self.stopped_epoch = None
+            
+            def on_train_begin(self, logs=None):
+                self.start = time.perf_counter()
+                self.epochs_run = 0
+            
+            def on_train_batch_end(self, batch, logs=None):
+                if self.any_worker is None and time.perf_counter() >= self.deadline:
+                    self.stopped_epoch = self.progress_callback.epoch + 1
+                    self.model.stop_training = True
+            
+            def on_epoch_end(self, epoch, logs=None):
+                self.epochs_run += 1
+                epoch_seconds = (time.perf_counter() - self.start) / self.epochs_run
+                affordable = int((self.deadline - time.perf_counter()) / epoch_seconds)
+                planned = min(self.total_epochs, epoch + 1 + affordable)
+                if planned != self.progress_callback.total_epochs:
+                    logger.info(f"Time budget: {epoch_seconds:.1f}s per epoch, planning {planned} epochs")
+                    self.progress_callback.total_epochs = planned
+                stop = affordable < 1 and epoch + 1 < self.total_epochs
+                if self.any_worker is not None:
+                    stop = self.any_worker(stop)
+                if stop:
+                    self.stopped_epoch = epoch + 1
+                    self.model.stop_training = True
+            
+            def on_train_end(self, logs=None):
+                if self.stopped_epoch is not None:
+                    logger.info(f"Stopped after epoch {self.stopped_epoch} to stay within the time budget")
+                    if self.early_stopping and self.early_stopping.best_weights is not None:
+                        self.model.set_weights(self.early_stopping.best_weights)
+        
+        # Writes an atomic checkpoint after every epoch so an interrupted job can resume
+        class CheckpointCallback(keras.callbacks.Callback):
+            def __init__(self, trainer):
+                super().__init__()
+                self.trainer = trainer
+            
+            def on_epoch_end(self, epoch, logs=None):
+                optimizer = self.model.optimizer
+                self.trainer.checkpoints.save(
+                    epoch + 1,
+                    [w.numpy() for w in self.model.trainable_weights],
+                    [v.numpy() for v in optimizer.variables],
+                    {
+                        "manifest": self.trainer.dataset_manifest,
+                        "product_ids": self.trainer.class_mapping,
+                        "learning_rate": float(keras.backend.get_value(optimizer.learning_rate)),
+                        "val_accuracy": float(logs.get('val_accuracy', 0))
+                    }
+                )
+        
+        with self._strategy_scope():
+            initial_epoch = self.restore_checkpoint(model) if self.resume else 0
+        
+        progress_callback = ProgressCallback(self, self.epochs)
+        progress_callback.initial_epoch = initial_epoch
+        callbacks = [
+            progress_callback,
+            EpochTimingCallback(self.timings, None if y_train is None else len(y_train), self.batch_size * self.num_workers),
+            keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, min_lr=1e-5, verbose=1)
+        ]
+        
+        early_stopping = None
+        if self.early_stopping_patience > 0:
+            early_stopping = keras.callbacks.EarlyStopping(
+                monitor='val_accuracy', patience=self.early_stopping_patience,
+                restore_best_weights=True, verbose=1
+            )
+            callbacks.append(early_stopping)
+        
+        time_budget = None
+        if self.time_budget:
+            deadline = self.timings.started + self.time_budget - self.export_reserve
+            if deadline <= time.perf_counter():
+                raise ValueError(f"Time budget of {self.time_budget}s exhausted before training started")
+            any_worker = (lambda stop: self._sum_across_workers([stop])[0] > 0) if self.strategy is not None else None
+            time_budget = TimeBudgetCallback(deadline, self.epochs, progress_callback, early_stopping, any_worker)
+            callbacks.append(time_budget)
+        
+        # Last, so the checkpoint records the learning rate after ReduceLROnPlateau has run
+        if self.is_chief:
+            callbacks.append(CheckpointCallback(self))
+        
         # Train the model
         history = model.fit(
-            datagen.flow(X_train, y_train, batch_size=self.batch_size),
-            validation_data=(X_val, y_val),
+            train_data,
+            validation_data=validation_data,
             epochs=self.epochs,
-            callbacks=[ProgressCallback(self, self.epochs)],
-            verbose=1
+            initial_epoch=initial_epoch,
+            callbacks=callbacks,
+            verbose=1,
+            **steps
         )
         
+        stopped_by = None
+        if time_budget and time_budget.stopped_epoch is not None:
+            stopped_by = 'time_budget'
+        elif early_stopping and early_stopping.stopped_epoch > 0:
+            stopped_by = 'early_stopping'
+        val_history = history.history.get('val_accuracy', [])
+        self.run_info["training"] = {
+            "max_epochs": self.epochs,
+            "epochs_run": initial_epoch + len(history.epoch),
+            "best_epoch": initial_epoch + int(np.argmax(val_history)) + 1 if val_history else None,
+            "stopped_by": stopped_by,
+            "final_learning_rate": float(keras.backend.get_value(model.optimizer.learning_rate))
+        }
+        
         # Calculate accuracy metrics
-        val_loss, val_accuracy = model.evaluate(X_val, y_val, verbose=0)
+        val_loss, val_accuracy = model.evaluate(validation_data, steps=steps.get("validation_steps"), verbose=0)
         
         logger.info(f"Training complete. Validation accuracy: {val_accuracy:.2%}")
         
         return history, val_accuracy
     
+    def evaluate_model(self, model, product_ids):
+        """
+        Predicts the validation split once, in batches of EVALUATION_BATCH_SIZE, and records
+        top-1/3/5 accuracy, per-SKU precision/recall, the most confused products and the
+        predict time per image under "evaluation" in metadata.json
+        """
+        if self.validation_data is None:
+            logger.info("No validation dataset available on this worker; skipping the evaluation report")
+            return None
+        
+        self.update_job_progress(82, "Evaluating model on validation photos")
+        
+        # Embedding inputs only exercise the head, as in _quantization_report
+        evaluated = model if self.validation_inputs == 'images' else self._extract_head(model)
+        probabilities, labels = [], []
+        predict_seconds = 0.0
+        for i, (inputs, batch_labels) in enumerate(self.validation_data.unbatch().batch(EVALUATION_BATCH_SIZE)):
+            if i == 0:
+                evaluated.predict_on_batch(inputs)  # Untimed warm-up: builds the predict function
+            start = time.perf_counter()
+            probabilities.append(evaluated.predict_on_batch(inputs))
+            predict_seconds += time.perf_counter() - start
+            labels.append(batch_labels.numpy())
+        
+        names = [self.product_skus.get(product_id, product_id) for product_id in product_ids]
+        report = evaluation_report(np.concatenate(probabilities), np.concatenate(labels), names, predict_seconds)
+        report["evaluated_on"] = "full model" if self.validation_inputs == 'images' else "head only"
+        self.run_info["evaluation"] = report
+        
+        logger.info(f"Evaluation on {report['samples']} validation photos: top-1 {report['top1']:.2%}, "
+                    f"top-3 {report['top3']:.2%}, top-5 {report['top5']:.2%}, "
+                    f"{report['predict_ms_per_image']:.2f} ms per image ({report['evaluated_on']})")
+        for pair in report["confused_pairs"][:5]:
+            logger.info(f"Confused: {pair['true']} predicted as {pair['predicted']} ({pair['count']}x)")
+        return report
+    
     def export_model(self, model, product_ids, val_accuracy):
         """Exports model to TensorFlow.js format"""
         self.update_job_progress(85, "Exporting model to TensorFlow.js format")
@@ -268,52 +1588,290 @@ class ModelTrainer:
             "validation_accuracy": float(val_accuracy),
             "model_architecture": "MobileNetV2",
             "input_size": list(self.img_size),
-            "description": "Jewelry product classification model"
+            "description": "Jewelry product classification model",
+            **self.run_info
         }
         
+        if self.export_layout == 'split':
+            # Frozen backbone is written once per distinct weights and shared by every version;
+            # the version directory only holds the small classification head
+            backbone_name, backbone_digest = self._save_backbone_artifact()
+            head = self._extract_head(model)
+            metadata["layout"] = "split"
+            metadata["backbone"] = {
+                "hash": backbone_digest,
+                "path": f"models/{backbone_name}",
+                "model_file": "model.json",
+                "output_dim": head.input_shape[-1]
+            }
+            metadata["head"] = {
+                "hash": weights_digest(head),
+                "model_file": "model.json",
+                "input_dim": head.input_shape[-1]
+            }
+            
+            # Class labels in output order, in the format the browser client reads
+            with open(model_dir / "class_labels.json", 'w') as f:
+                json.dump({
+                    "labels": [self.product_skus.get(product_id, product_id) for product_id in product_ids],
+                    "trainedAt": metadata["trained_at"],
+                    "version": version
+                }, f, indent=2)
+        
+        # Save head weights so the next incremental retrain can warm-start from this version
+        hidden, _, output = model.layers[-3:]
+        np.savez(
+            model_dir / "head_weights.npz",
+            hidden_kernel=hidden.get_weights()[0],
+            hidden_bias=hidden.get_weights()[1],
+            output_kernel=output.get_weights()[0],
+            output_bias=output.get_weights()[1]
+        )
+        
+        # Export to TensorFlow.js format
+        if self.export_layout == 'split':
+            tfjs.converters.save_keras_model(head, str(model_dir), quantization_dtype_map=self._quantization_map())
+        else:
+            tfjs.converters.save_keras_model(model, str(model_dir), quantization_dtype_map=self._quantization_map())
+        
+        metadata["quantization"] = self._quantization_report(model, model_dir, val_accuracy)
+        
         metadata_file = model_dir / "metadata.json"
         with open(metadata_file, 'w') as f:
             json.dump(metadata, f, indent=2)
         
-        # Export to TensorFlow.js format
-        tfjs.converters.save_keras_model(model, str(model_dir))
-        
         logger.info(f"Model exported to {model_dir}")
         
         return version, metadata
     
-    def update_model_metadata_db(self, version, metadata, num_photos):
-        """Updates ModelMetadata table with new model"""
+    def build_embedding_index(self, X_train, y_train, X_val, y_val, product_ids, product_photos):
+        """
+        Builds a per-product prototype index from training embeddings and measures
+        nearest-prototype top-1 accuracy on the validation embeddings
+        """
+        self.update_job_progress(50, "Building product embedding index")
+        
+        index = EmbeddingIndex(X_train.shape[1])
+        for idx, product_id in enumerate(product_ids):
+            vectors = X_train[y_train == idx]
+            if len(vectors) == 0:
+                vectors = X_val[y_val == idx]
+            if len(vectors) > 0:
+                index.set_product(product_id, product_photos[product_id]['sku'], vectors, self.prototypes_per_product)
+        
+        val_accuracy = 0.0
+        if len(X_val) > 0:
+            predicted = [matches[0][0] for matches in index.search(X_val, k=1)]
+            val_accuracy = float(np.mean([pred == product_ids[label] for pred, label in zip(predicted, y_val)]))
+        
+        logger.info(f"Embedding index built with {len(index.row_products)} prototypes for "
+                    f"{len(index.skus)} products. Validation accuracy: {val_accuracy:.2%}")
+        return index, val_accuracy
+    
+    def export_embedding_index(self, index, product_ids, val_accuracy):
+        """Exports the frozen feature extractor (TensorFlow.js) plus the product embedding index"""
+        self.update_job_progress(85, "Exporting feature extractor and embedding index")
+        
+        # Generate version string
+        version = f"v{int(datetime.utcnow().timestamp())}_{datetime.utcnow().strftime('%Y%m%d')}"
+        model_dir = self.output_path / version
+        model_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Save product ID mapping
+        mapping = {idx: product_id for idx, product_id in enumerate(product_ids)}
+        with open(model_dir / "product_mapping.json", 'w') as f:
+            json.dump(mapping, f, indent=2)
+        
+        index.save(model_dir)
+        
+        # Save metadata
+        metadata = {
+            "version": version,
+            "trained_at": datetime.utcnow().isoformat(),
+            "num_products": len(product_ids),
+            "validation_accuracy": float(val_accuracy),
+            "model_architecture": "MobileNetV2",
+            "model_type": "embedding-index",
+            "input_size": list(self.img_size),
+            "embedding_dim": index.dim,
+            "embedding_index": {
+                "vectors_file": "embeddings.bin",
+                "index_file": "embeddings_index.json",
+                "dtype": "float16",
+                "num_vectors": len(index.row_products),
+                "max_prototypes_per_product": self.prototypes_per_product,
+                "similarity": "cosine"
+            },
+            "description": "Jewelry product feature extractor with per-product embedding index",
+            **self.run_info
+        }
+        
+        with open(model_dir / "metadata.json", 'w') as f:
+            json.dump(metadata, f, indent=2)
+        
+        # Export the frozen feature extractor to TensorFlow.js format
+        extractor = keras.Sequential([self._load_backbone(), keras.layers.GlobalAveragePooling2D()])
+        tfjs.converters.save_keras_model(extractor, str(model_dir), quantization_dtype_map=self._quantization_map())
+        
+        logger.info(f"Feature extractor and embedding index exported to {model_dir}")
+        
+        return version, metadata
+    
+    def _quantization_map(self):
+        """Returns the tensorflowjs quantization_dtype_map for the configured mode (None = float32)"""
+        if self.quantization == 'none':
+            return None
+        return {self.quantization: True}
+    
+    def _quantization_report(self, model, model_dir, val_accuracy):
+        """
+        Records exported size and shard count, and re-evaluates the validation split with
+        the weights quantized as exported to measure the accuracy delta against float32.
+        In features mode the export quantizes the backbone too, so the assembled model is
+        evaluated on the validation photos instead of the head on their embeddings.
+        """
+        shards = sorted(model_dir.glob("group*-shard*.bin"))
+        report = {
+            "mode": self.quantization,
+            "size_bytes": sum(shard.stat().st_size for shard in shards),
+            "shards": len(shards),
+            "float32_accuracy": float(val_accuracy)
+        }
+        
+        if self.quantization == 'none' or self.validation_data is None:
+            return report
+        
+        validation_data = self.validation_data
+        if self.validation_inputs == 'features':
+            validation_data = self._validation_image_dataset()
+            if validation_data is None:
+                return report
+            # Baseline on the same photos and model as the quantized run (the head was validated on embeddings)
+            _, val_accuracy = model.evaluate(validation_data, verbose=0)
+            report["float32_accuracy"] = float(val_accuracy)
+        
+        original = model.get_weights()
+        model.set_weights(quantize_weights(original, self.quantization))
+        try:
+            _, quantized_accuracy = model.evaluate(validation_data, verbose=0)
+        finally:
+            model.set_weights(original)
+        
+        report["quantized_accuracy"] = float(quantized_accuracy)
+        report["accuracy_delta"] = float(quantized_accuracy - val_accuracy)
+        report["evaluated_on"] = "full model"
+        
+        logger.info(f"Quantized ({self.quantization}) export: {report['size_bytes'] / 1e6:.2f} MB in "
+                    f"{report['shards']} shards, validation accuracy {quantized_accuracy:.2%} "
+                    f"({report['accuracy_delta']:+.2%} vs float32)")
+        return report
+    
+    def _validation_image_dataset(self):
+        """Decodes the features-mode validation photos into an image dataset (None if none load)"""
+        photos = self.validation_photos or []
+        images = self._load_images([(photo_id, photo_path) for photo_id, photo_path, _ in photos])
+        loaded = [k for k, image in enumerate(images) if image is not None]
+        if not loaded:
+            return None
+        X_val = np.stack([images[k] for k in loaded])
+        y_val = np.array([photos[k][2] for k in loaded])
+        return self._array_dataset(X_val, y_val, training=False, images=True, shard=False)
+    
+    def _extract_head(self, model):
+        """Copies the classification layers of a full model into a standalone head taking pooled features"""
+        head = self.create_head_model(model.output_shape[-1], report_progress=False)
+        for source, target in zip(model.layers[-3:], head.layers):
+            target.set_weights(source.get_weights())
+        return head
+    
+    def _save_backbone_artifact(self):
+        """
+        Writes the frozen feature extractor (backbone + pooling) as a TF.js artifact in
+        output_path/backbone-<hash>. Identical weights map to the same directory, so
+        the conversion only happens the first time.
+        """
+        extractor = keras.Sequential([
+            self._load_backbone(),
+            keras.layers.GlobalAveragePooling2D(name='backbone_pool')
+        ], name='backbone')
+        digest = weights_digest(extractor, self.quantization)
+        backbone_name = f"backbone-{digest[:16]}"
+        backbone_dir = self.output_path / backbone_name
+        
+        if (backbone_dir / "model.json").exists():
+            logger.info(f"Reusing backbone artifact {backbone_name}")
+            return backbone_name, digest
+        
+        # Convert into a temporary directory and rename, so readers never see a partial artifact
+        tmp_dir = self.output_path / f".tmp-{backbone_name}-{self.job_id}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tfjs.converters.save_keras_model(extractor, str(tmp_dir), quantization_dtype_map=self._quantization_map())
+        try:
+            os.replace(tmp_dir, backbone_dir)
+            logger.info(f"Backbone artifact written to {backbone_dir}")
+        except OSError:
+            # Another job published the same backbone first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        
+        return backbone_name, digest
+    
+    def update_model_metadata_db(self, version, metadata, num_photos, activate=True):
+        """
+        Updates ModelMetadata table with new model. With activate=False the version is recorded
+        but the active model stays in place, for exports the POS client cannot load yet.
+        """
         self.update_job_progress(95, "Updating model metadata in database")
         
+        # Drain queued progress so no update lands after the job is marked Completed
+        self.progress.close()
+        
         cursor = self.conn.cursor()
         
         # Deactivate previous models
-        cursor.execute("""
-            UPDATE "ModelMetadata"
-            SET "IsActive" = false,
-                "UpdatedAt" = NOW()
-            WHERE "IsActive" = true
-        """)
+        if activate:
+            cursor.execute("""
+                UPDATE "ModelMetadata"
+                SET "IsActive" = false,
+                    "UpdatedAt" = NOW()
+                WHERE "IsActive" = true
+            """)
+        else:
+            logger.info(f"Model {version} is recorded without being activated ({metadata.get('layout', 'full')} layout)")
         
         # Insert new model metadata
         model_path = f"models/{version}"
-        accuracy_metrics = json.dumps({
+        accuracy_metrics = {
             "validation_accuracy": metadata["validation_accuracy"],
             "top1": metadata["validation_accuracy"]
-        })
+        }
+        if metadata.get("validation_accuracy_source"):
+            accuracy_metrics["validation_accuracy_source"] = metadata["validation_accuracy_source"]
+        quantization = metadata.get("quantization")
+        if quantization:
+            accuracy_metrics["quantization"] = quantization["mode"]
+            accuracy_metrics["size_bytes"] = quantization["size_bytes"]
+            if "accuracy_delta" in quantization:
+                accuracy_metrics["quantized_accuracy"] = quantization["quantized_accuracy"]
+                accuracy_metrics["quantization_accuracy_delta"] = quantization["accuracy_delta"]
+        if metadata.get("evaluation"):
+            # Summary figures plus as many weak SKUs and confused pairs as the column holds;
+            # the full report stays in metadata.json
+            accuracy_metrics = compact_metrics(metadata["evaluation"], ACCURACY_METRICS_MAX_LENGTH, base=accuracy_metrics)
+        else:
+            accuracy_metrics = json.dumps(accuracy_metrics)
         
         cursor.execute("""
             INSERT INTO "ModelMetadata" 
             ("Id", "Version", "TrainedAt", "ModelPath", "AccuracyMetrics", 
              "TotalPhotosUsed", "TotalProductsUsed", "IsActive", "CreatedAt", "UpdatedAt")
-            VALUES (gen_random_uuid(), %s, NOW(), %s, %s, %s, %s, true, NOW(), NOW())
+            VALUES (gen_random_uuid(), %s, NOW(), %s, %s, %s, %s, %s, NOW(), NOW())
         """, (
             version,
             model_path,
             accuracy_metrics,
             num_photos,
-            metadata["num_products"]
+            metadata["num_products"],
+            activate
         ))
         
         # Update training job as completed
@@ -329,130 +1887,276 @@ class ModelTrainer:
             WHERE "Id" = %s
         """, (version, self.job_id))
         
+        # Requests covered by this run link to the version that served them
+        cursor.execute("""
+            UPDATE "ModelTrainingJobs"
+            SET "Status" = 'Completed',
+                "ProgressPercentage" = 100,
+                "CompletedAt" = NOW(),
+                "ResultModelVersion" = %s,
+                "UpdatedAt" = NOW()
+            WHERE "SupersededByJobId" = %s AND "Status" = 'Superseded'
+        """, (version, self.job_id))
+        
         self.conn.commit()
         logger.info(f"Model metadata updated in database: {version}")
     
-    def train(self):
-        """Main training workflow"""
+    def _profile_dir(self):
+        profile_dir = self.output_path / ".profiles" / str(self.job_id)
+        if not self.is_chief:
+            profile_dir = profile_dir / f"worker-{self.worker_index}"
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        return profile_dir
+    
+    def save_stage_timings(self, version=None):
+        """Stores the stage timings in the version's metadata.json (if exported) and on the job record"""
+        timings = self.timings.to_dict()
+        if not self.is_chief:
+            logger.info(f"Worker {self.worker_index} stage timings: {json.dumps(timings)}")
+            return
+        
+        if version:
+            metadata_file = self.output_path / version / "metadata.json"
+            with open(metadata_file) as f:
+                metadata = json.load(f)
+            metadata["timings"] = timings
+            with open(metadata_file, 'w') as f:
+                json.dump(metadata, f, indent=2)
+        
         try:
-            # Start job
-            if not self.conn:
-                self.conn = psycopg2.connect(self.connection_string)
-            
+            if not self.conn or self.conn.closed:
+                self.conn = self._connect()
             cursor = self.conn.cursor()
             cursor.execute("""
                 UPDATE "ModelTrainingJobs"
-                SET "Status" = 'InProgress',
-                    "StartedAt" = NOW(),
-                    "ProgressPercentage" = 0,
-                    "CurrentStage" = 'Initializing training',
+                SET "StageTimings" = %s,
                     "UpdatedAt" = NOW()
                 WHERE "Id" = %s
+            """, (json.dumps(timings), self.job_id))
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to save stage timings: {e}")
+    
+    def acquire_training_lock(self):
+        """
+        Takes the deployment-wide training lock: a session-level advisory lock on a connection
+        of its own, released when train() closes it. Returns False if another training holds it.
+        """
+        self.lock_conn = self._connect()
+        cursor = self.lock_conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (TRAINING_LOCK_ID,))
+        acquired = bool(cursor.fetchone()[0])
+        self.lock_conn.commit()
+        if not acquired:
+            self.lock_conn.close()
+            self.lock_conn = None
+        return acquired
+    
+    def defer_job(self):
+        """Leaves the job queued while another training runs (a worker-claimed job is put back)"""
+        logger.info(f"Another training is running in this deployment; job {self.job_id} stays queued")
+        if not self.claimed:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            UPDATE "ModelTrainingJobs"
+            SET "Status" = 'Queued',
+                "StartedAt" = NULL,
+                "CurrentStage" = 'Queued - waiting for the running training',
+                "UpdatedAt" = NOW()
+            WHERE "Id" = %s AND "Status" = 'InProgress'
+        """, (self.job_id,))
+        self.conn.commit()
+    
+    def release_superseded_jobs(self):
+        """
+        Queues the jobs this run covered again after it failed, so their request is not lost.
+        Includes jobs superseded by an earlier, interrupted attempt of the same job, which are
+        not in this run's superseded_jobs.
+        """
+        if not self.is_chief:
+            return
+        try:
+            if not self.conn or self.conn.closed:
+                self.conn = self._connect()
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                UPDATE "ModelTrainingJobs"
+                SET "Status" = 'Queued',
+                    "SupersededByJobId" = NULL,
+                    "CurrentStage" = 'Queued - the training covering this job failed',
+                    "UpdatedAt" = NOW()
+                WHERE "SupersededByJobId" = %s AND "Status" = 'Superseded'
             """, (self.job_id,))
+            requeued = cursor.rowcount
             self.conn.commit()
+            if requeued:
+                logger.info(f"Re-queued {requeued} jobs covered by failed job {self.job_id}")
+        except Exception as e:
+            logger.error(f"Failed to re-queue superseded jobs: {e}")
+    
+    def train(self):
+        """
+        Main training workflow. Returns True on success, False on failure, and None when the
+        job was deferred because another training holds the deployment lock.
+        """
+        profiler = cProfile.Profile() if self.profile else None
+        if profiler:
+            profiler.enable()
+        deferred = False
+        
+        try:
+            # Start job
+            if not self.conn:
+                self.conn = self._connect()
+            
+            if self.distributed:
+                # Form the cluster before the chief decides on the lock, so that a deferral
+                # reaches every worker instead of leaving them waiting for a chief that exited
+                with self.timings.stage("import_ml_modules"):
+                    self.apply_performance_profile()
+                    self.start_distribution()
+            
+            locked = self.is_chief and self.acquire_training_lock()
+            if self.strategy is not None:
+                locked = self._sum_across_workers([1.0 if locked else 0.0])[0] > 0
+            if not locked:
+                deferred = True
+                if self.is_chief:
+                    self.defer_job()
+                else:
+                    logger.info(f"Worker 0 could not take the training lock; worker {self.worker_index} exits too")
+                return None
+            
+            if self.is_chief:
+                cursor = self.conn.cursor()
+                cursor.execute("""
+                    UPDATE "ModelTrainingJobs"
+                    SET "Status" = 'InProgress',
+                        "StartedAt" = NOW(),
+                        "ProgressPercentage" = 0,
+                        "CurrentStage" = 'Initializing training',
+                        "SupersededByJobId" = NULL,
+                        "UpdatedAt" = NOW()
+                    WHERE "Id" = %s
+                """, (self.job_id,))
+                cursor.execute(SUPERSEDE_QUEUED_JOBS_SQL,
+                               (self.job_id, f"Covered by training job {self.job_id}", self.job_id))
+                self.superseded_jobs = [str(row[0]) for row in cursor.fetchall()]
+                self.conn.commit()
+                if self.superseded_jobs:
+                    logger.info(f"Job {self.job_id} covers {len(self.superseded_jobs)} other requested trainings: "
+                                f"{', '.join(self.superseded_jobs)}")
+                    self.run_info["superseded_jobs"] = self.superseded_jobs
             
             logger.info(f"Starting training job {self.job_id}")
             
             # 1. Fetch photos from database
-            photos = self.fetch_product_photos()
+            with self.timings.stage("fetch_product_photos"):
+                photos = self.fetch_product_photos()
             
             if len(photos) < 10:
                 raise ValueError(f"Insufficient photos for training. Found: {len(photos)}, Required: 10+")
             
-            # Ensure each class has at least a minimal number of samples so stratified splits won't fail.
-            # Heuristically attempt to guarantee at least 2 samples per class, and retry with higher counts if needed.
-            def _extract_pid(p):
-                pid = None
-                try:
-                    if isinstance(p, dict):
-                        for key in ('product_id', 'productId', 'ProductId', 'productid'):
-                            if key in p:
-                                pid = p[key]
-                                break
-                        if pid is None:
-                            for k in p.keys():
-                                if 'product' in k.lower() and 'id' in k.lower():
-                                    pid = p[k]
-                                    break
-                    elif isinstance(p, (list, tuple)):
-                        if len(p) > 0:
-                            pid = p[0]
-                    else:
-                        pid = getattr(p, 'product_id', None)
-                        if pid is None:
-                            pid = getattr(p, 'productId', None)
-                except Exception:
-                    pid = None
-                return pid if pid is not None else id(p)
-            
-            # Build mapping of product id -> list of photo entries
-            pid_to_items = {}
-            for item in photos:
-                pid = _extract_pid(item)
-                pid_to_items.setdefault(pid, []).append(item)
-            
-            # Duplicate entries for classes that are under-represented.
-            # We'll attempt multiple rounds with increasing minimum requirements if needed.
-            max_attempts = 3
-            min_required = 2
-            attempt = 0
-            while attempt < max_attempts:
-                attempt += 1
-                # Ensure current photos list reflects pid_to_items
-                photos = []
-                for pid, items in pid_to_items.items():
-                    photos.extend(items)
-                # Check counts and duplicate where necessary to reach min_required
-                need_more = False
-                for pid, items in list(pid_to_items.items()):
-                    count = len(items)
-                    if count < min_required:
-                        need_more = True
-                        # Duplicate the first available item until count meets min_required
-                        if len(items) == 0:
-                            continue
-                        sample = items[0]
-                        while len(pid_to_items[pid]) < min_required:
-                            pid_to_items[pid].append(sample)
-                # If no need to increase, break and proceed
-                if not need_more:
-                    break
-                # If we did need more and this is not the last attempt, raise min_required and retry
-                min_required += 1
-            
             # 2. Prepare dataset
-            product_photos = self.download_and_prepare_dataset(photos)
-            
-            # 3. Load and augment data
-            try:
-                X_train, X_val, y_train, y_val, product_ids = self.augment_and_load_data(product_photos)
-            except ValueError as ve:
-                # As a robust fallback, attempt one more time after increasing minimum per-class samples.
-                # This retries download_and_prepare_dataset with more duplicated samples to avoid stratify errors.
-                logger.warning("augment_and_load_data failed with ValueError, attempting to increase per-class samples and retry.", exc_info=True)
-                # Increase per-class minimum and rebuild photos
-                for pid, items in list(pid_to_items.items()):
-                    # ensure at least 3 samples per class for retry
-                    while len(pid_to_items[pid]) < 3:
-                        pid_to_items[pid].append(items[0])
-                photos = []
-                for pid, items in pid_to_items.items():
-                    photos.extend(items)
+            with self.timings.stage("download_and_prepare_dataset"):
                 product_photos = self.download_and_prepare_dataset(photos)
-                X_train, X_val, y_train, y_val, product_ids = self.augment_and_load_data(product_photos)
+            if self.duplicates != 'off':
+                with self.timings.stage("deduplicate_photos"):
+                    product_photos = self.deduplicate_photos(product_photos)
+            self.dataset_manifest = self._dataset_manifest(product_photos)
+            
+            # 3. Load and augment data (build lazily-decoded pipelines in streaming mode,
+            #    or backbone embeddings when training the head on cached features)
+            if not self.distributed:
+                with self.timings.stage("import_ml_modules"):
+                    self.apply_performance_profile()
+            use_features = self.training_mode == 'features' or self.export_mode == 'embedding-index' or self.sweep_trials > 0
+            if use_features:
+                load_data = self.extract_feature_dataset
+            elif self.streaming:
+                load_data = self.build_streaming_datasets
+            else:
+                load_data = self.augment_and_load_data
+            with self.timings.stage(load_data.__name__):
+                X_train, X_val, y_train, y_val, product_ids = load_data(product_photos)
+            self.class_mapping = product_ids
+            
+            if self.export_mode == 'embedding-index':
+                # 4-6. Build and export a prototype index instead of training a classifier head
+                with self.timings.stage("build_embedding_index"):
+                    index, val_accuracy = self.build_embedding_index(X_train, y_train, X_val, y_val, product_ids, product_photos)
+                with self.timings.stage("export_model"), self._export_precision():
+                    version, metadata = self.export_embedding_index(index, product_ids, val_accuracy)
+                
+                # 7. Update database
+                with self.timings.stage("update_model_metadata_db"):
+                    # The POS client only runs softmax classifiers, so a bare feature extractor is not activated
+                    self.update_model_metadata_db(version, metadata, len(photos), activate=False)
+                self.save_stage_timings(version)
+                
+                self.update_job_progress(100, "Training completed successfully")
+                logger.info(f"Training job {self.job_id} completed successfully")
+                logger.info(f"Model version: {version}, Validation accuracy: {val_accuracy:.2%}")
+                return True
             
             # 4. Create model
             num_classes = len(product_ids)
-            model = self.create_model(num_classes)
+            if self.sweep_trials > 0:
+                # 4-5. Pick the head configuration by a parallel sweep on the cached features
+                with self.timings.stage("hyperparameter_sweep"):
+                    model, val_accuracy = self.sweep_head(X_train, y_train, X_val, y_val, num_classes)
+                    model = self.assemble_model(model)
+            else:
+                with self.timings.stage("create_model"), self._strategy_scope():
+                    model = self.create_head_model(num_classes) if use_features else self.create_model(num_classes)
+                    
+                    if self.incremental:
+                        previous = self.load_previous_head()
+                        if previous and self.warm_start(model, previous, product_ids):
+                            self.epochs = self.incremental_epochs
+                    
+                    # Distributed workers keep the same batch size; a measured one could differ per host.
+                    # Streaming datasets are already batched, so they keep the profile's default.
+                    if self.perf_settings and not use_features and not self.streaming and self.strategy is None:
+                        self._measure_batch_size(model)
+                
+                # 5. Train model
+                with self.timings.stage("train_model"):
+                    if self.profile:
+                        tf.profiler.experimental.start(str(self._profile_dir() / "tensorflow"))
+                    try:
+                        history, val_accuracy = self.train_model(model, X_train, y_train, X_val, y_val, augment=not use_features)
+                    finally:
+                        if self.profile:
+                            tf.profiler.experimental.stop()
+                    if use_features:
+                        model = self.assemble_model(model)
             
-            # 5. Train model
-            history, val_accuracy = self.train_model(model, X_train, y_train, X_val, y_val)
+            if not self.is_chief:
+                logger.info(f"Worker {self.worker_index} finished training; worker 0 exports the model")
+                self.save_stage_timings()
+                return True
             
-            # 6. Export model
-            version, metadata = self.export_model(model, product_ids, val_accuracy)
+            # 6. Evaluate and export the model (evaluated as exported, in float32)
+            with self._export_precision():
+                if (self.perf_settings and self.perf_settings['mixed_precision']) or self.strategy is not None:
+                    model = self._float32_model(model)
+                with self.timings.stage("evaluate_model"):
+                    self.evaluate_model(model, product_ids)
+                with self.timings.stage("export_model"):
+                    version, metadata = self.export_model(model, product_ids, val_accuracy)
             
             # 7. Update database
-            self.update_model_metadata_db(version, metadata, len(photos))
+            with self.timings.stage("update_model_metadata_db"):
+                # The POS client loads a single model.json on images, so a split head (which needs
+                # the backbone assembled in front of it) is not made the active model
+                self.update_model_metadata_db(version, metadata, len(photos), activate=self.export_layout != 'split')
+            self.save_stage_timings(version)
+            
+            # The model is exported and registered, so this job's checkpoints are no longer needed
+            self.checkpoints.clear()
+            CheckpointStore.remove_stale(self.checkpoints.root.parent)
             
             self.update_job_progress(100, "Training completed successfully")
             
@@ -464,37 +2168,218 @@ class ModelTrainer:
         except Exception as e:
             logger.error(f"Training failed: {e}", exc_info=True)
             self.update_job_progress(0, "Training failed", str(e))
+            self.save_stage_timings()
+            self.release_superseded_jobs()
             return False
             
         finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(str(self._profile_dir() / "train.prof"))
+                logger.info(f"Profiles written to {self._profile_dir()}")
+            if self.progress:
+                self.progress.shutdown()
+            if self.dataset_cache == 'disk' and not deferred:
+                # A deferred run never built the cache, and the job's other run may be using it
+                shutil.rmtree(self.cache_dir / "tfdata" / str(self.job_id), ignore_errors=True)
             if self.conn:
                 self.conn.close()
+            if self.lock_conn:
+                self.lock_conn.close()
 
 
 def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description='Train jewelry product classification model')
-    parser.add_argument('--job-id', required=True, help='Training job ID (UUID)')
+    parser.add_argument('--job-id', help='Training job ID (UUID); required unless --worker or --preflight is used')
     parser.add_argument('--connection-string', required=True, help='PostgreSQL connection string')
     parser.add_argument('--storage-path', required=True, help='Path to photo storage directory')
     parser.add_argument('--output-path', required=True, help='Path to output model directory')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Decode images lazily with tf.data instead of loading the whole dataset in memory')
+    parser.add_argument('--dataset-cache', choices=['none', 'memory', 'disk'], default='none',
+                        help='Cache decoded uint8 images between epochs (streaming mode only)')
+    parser.add_argument('--training-mode', choices=['full', 'features'], default='full',
+                        help='full: run the backbone every epoch; features: train the head on cached backbone embeddings')
+    parser.add_argument('--feature-augmentations', type=int, default=2,
+                        help='Augmented variants per photo embedded in features mode (in addition to the original)')
+    parser.add_argument('--feature-cache-mb', type=int, default=512,
+                        help='Size cap in MB for the backbone embedding cache')
+    parser.add_argument('--decode-workers', type=int, default=None,
+                        help='Processes used to decode and resize photos (default: number of CPU cores)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Warm-start the head from the active model version and fine-tune for fewer epochs')
+    parser.add_argument('--incremental-epochs', type=int, default=5,
+                        help='Epochs used when warm-starting (default: 5)')
+    parser.add_argument('--incremental-max-change', type=float, default=0.3,
+                        help='Fall back to full training when more than this share of classes was added or removed')
+    parser.add_argument('--export-mode', choices=['classifier', 'embedding-index'], default='classifier',
+                        help='classifier: softmax TF.js model; embedding-index: feature extractor plus per-product embedding index')
+    parser.add_argument('--prototypes-per-product', type=int, default=3,
+                        help='Maximum prototype vectors stored per product in embedding-index mode')
+    parser.add_argument('--export-layout', choices=['full', 'split'], default='full',
+                        help='full: one TF.js model per version; split: shared content-addressed backbone plus per-version head')
+    parser.add_argument('--quantization', choices=['none', 'float16', 'uint8'], default='none',
+                        help='TF.js weight quantization; the quantized weights are re-evaluated on the validation split')
+    parser.add_argument('--preflight', action='store_true',
+                        help='Only check the photo query and storage (no TensorFlow) and print a JSON report; exit code 1 if training would fail')
+    parser.add_argument('--worker', action='store_true',
+                        help='Run as a resident worker that claims queued jobs from ModelTrainingJobs instead of a single --job-id')
+    parser.add_argument('--poll-interval', type=int, default=10,
+                        help='Seconds between queue polls in worker mode when no NOTIFY arrives (default: 10)')
+    parser.add_argument('--max-jobs', type=int, default=None,
+                        help='Exit the worker after this many jobs (default: run until stopped)')
+    parser.add_argument('--max-interrupted-retries', type=int, default=3,
+                        help='Times the worker queues a job left InProgress by an interrupted run again before marking it Failed (default: 3)')
+    parser.add_argument('--progress-interval', type=float, default=2.0,
+                        help='Minimum seconds between job progress writes (default: 2)')
+    parser.add_argument('--early-stopping-patience', type=int, default=4,
+                        help='Stop after this many epochs without val_accuracy improvement and restore the best weights (0 disables)')
+    parser.add_argument('--time-budget', type=int, default=None,
+                        help='Wall-clock seconds for the whole job; training stops early so export and the database update still fit')
+    parser.add_argument('--export-reserve', type=int, default=300,
+                        help='Seconds of --time-budget reserved for export and the database update (default: 300)')
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue from the job's last epoch checkpoint when the dataset manifest still matches")
+    parser.add_argument('--perf-profile', choices=['none', 'auto', 'throughput', 'low-memory'], default='none',
+                        help='Tune thread pools, oneDNN, bfloat16 mixed precision and batch size to the detected CPU and memory')
+    parser.add_argument('--sweep-trials', type=int, default=0,
+                        help='Train this many head configurations (learning rate, hidden units, dropout) in parallel on cached features and export the best (0 disables)')
+    parser.add_argument('--sweep-workers', type=int, default=None,
+                        help='Worker processes for --sweep-trials (default: number of CPU cores)')
+    parser.add_argument('--photo-storage', choices=['local', 's3'], default='local',
+                        help='Where product photos are read from: --storage-path or an S3-compatible bucket mirrored to <cache-dir>/photos')
+    parser.add_argument('--s3-bucket', default=None,
+                        help='Bucket holding the product photos (credentials from the standard AWS environment)')
+    parser.add_argument('--s3-prefix', default='',
+                        help='Key prefix in front of the photo keys in the bucket')
+    parser.add_argument('--photo-key-template', default=PHOTO_KEY_TEMPLATE,
+                        help='Storage key of a photo, from {product_id} and {file_name} (default: the backend layout, products/{file_name})')
+    parser.add_argument('--s3-endpoint-url', default=None,
+                        help='Endpoint of an S3-compatible service such as MinIO (default: AWS)')
+    parser.add_argument('--s3-concurrency', type=int, default=32,
+                        help='Parallel photo downloads and pooled connections for --photo-storage s3')
+    parser.add_argument('--duplicates', choices=['group', 'drop', 'off'], default='group',
+                        help='Near-duplicate photos of a product (perceptual hash): keep each group in one split, train on one photo per group, or skip the check')
+    parser.add_argument('--duplicate-distance', type=int, default=6,
+                        help='Max differing bits (of 64) between perceptual hashes of near-duplicate photos')
+    parser.add_argument('--distributed', action='store_true',
+                        help='Data-parallel training across the workers in TF_CONFIG (MultiWorkerMirroredStrategy); worker 0 reports progress and exports')
+    parser.add_argument('--worker-hosts', default=None,
+                        help='Comma-separated host:port of every worker, in order; sets TF_CONFIG and implies --distributed')
+    parser.add_argument('--worker-index', type=int, default=0,
+                        help='Position of this process in --worker-hosts (0 is the chief)')
+    parser.add_argument('--local-workers', type=int, default=0,
+                        help='Run this job as a distributed cluster of N processes on this host, each pinned to 1/N of the CPUs')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write a cProfile dump and a TensorFlow profiler trace to <output-path>/.profiles/<job-id>')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Directory for persistent training caches (default: <output-path>/.cache)')
+    parser.add_argument('--image-cache-mb', type=int, default=2048,
+                        help='Size cap in MB for the preprocessed image cache (0 disables it)')
+    parser.add_argument('--cache-verify-hash', action='store_true',
+                        help='Also compare file SHA-1 hashes, not just size/mtime, before reusing cached images')
     
     args = parser.parse_args()
+    if not (args.worker or args.preflight) and not args.job_id:
+        parser.error('--job-id is required unless --worker or --preflight is used')
+    if args.worker_hosts:
+        os.environ['TF_CONFIG'] = tf_config(args.worker_hosts.split(','), args.worker_index)
+        args.distributed = True
+    if args.distributed or args.local_workers > 1:
+        if args.worker or args.preflight:
+            parser.error('--distributed and --local-workers train a single --job-id')
+        if args.training_mode == 'features' or args.export_mode == 'embedding-index' or args.sweep_trials > 0:
+            parser.error('Distributed training only applies to --training-mode full with a classifier export')
+    if args.local_workers > 1 and args.distributed:
+        parser.error('--local-workers builds its own cluster; do not combine it with --distributed or --worker-hosts')
     
     logger.info("=== ML Model Training Started ===")
-    logger.info(f"Job ID: {args.job_id}")
+    logger.info(f"Job ID: {args.job_id or 'worker mode'}")
     logger.info(f"Storage Path: {args.storage_path}")
     logger.info(f"Output Path: {args.output_path}")
     
-    trainer = ModelTrainer(
-        job_id=args.job_id,
-        connection_string=args.connection_string,
+    trainer_options = dict(
         storage_path=args.storage_path,
-        output_path=args.output_path
+        output_path=args.output_path,
+        streaming=args.streaming,
+        dataset_cache=args.dataset_cache,
+        cache_dir=args.cache_dir,
+        image_cache_mb=args.image_cache_mb,
+        cache_verify_hash=args.cache_verify_hash,
+        training_mode=args.training_mode,
+        feature_augmentations=args.feature_augmentations,
+        feature_cache_mb=args.feature_cache_mb,
+        decode_workers=args.decode_workers,
+        incremental=args.incremental,
+        incremental_epochs=args.incremental_epochs,
+        incremental_max_change=args.incremental_max_change,
+        export_mode=args.export_mode,
+        prototypes_per_product=args.prototypes_per_product,
+        export_layout=args.export_layout,
+        quantization=args.quantization,
+        profile=args.profile,
+        progress_interval=args.progress_interval,
+        early_stopping_patience=args.early_stopping_patience,
+        time_budget=args.time_budget,
+        export_reserve=args.export_reserve,
+        resume=args.resume,
+        perf_profile=args.perf_profile,
+        sweep_trials=args.sweep_trials,
+        sweep_workers=args.sweep_workers,
+        photo_storage=args.photo_storage,
+        s3_bucket=args.s3_bucket,
+        s3_prefix=args.s3_prefix,
+        s3_endpoint_url=args.s3_endpoint_url,
+        s3_concurrency=args.s3_concurrency,
+        photo_key_template=args.photo_key_template,
+        duplicates=args.duplicates,
+        duplicate_distance=args.duplicate_distance,
+        distributed=args.distributed
     )
     
+    if args.preflight:
+        trainer = ModelTrainer(job_id=args.job_id, connection_string=args.connection_string, **trainer_options)
+        report = trainer.preflight()
+        trainer.conn.close()
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["ok"] else 1)
+    
+    if args.worker:
+        from training_worker import TrainingWorker
+        
+        worker = TrainingWorker(ModelTrainer, args.connection_string, trainer_options,
+                                poll_interval=args.poll_interval, max_jobs=args.max_jobs,
+                                max_retries=args.max_interrupted_retries)
+        worker.run()
+        sys.exit(0)
+    
+    if args.local_workers > 1:
+        # Each worker re-runs this script with the same options; its TF_CONFIG says which worker it is
+        arguments = []
+        skip = False
+        for argument in sys.argv[1:]:
+            if skip or argument.startswith('--local-workers='):
+                skip = False
+                continue
+            if argument == '--local-workers':
+                skip = True
+                continue
+            arguments.append(argument)
+        codes = launch_local_workers(os.path.abspath(__file__), arguments, args.local_workers)
+        if codes[0] == EXIT_DEFERRED:
+            sys.exit(EXIT_DEFERRED)
+        if codes[0] not in (0, 1):
+            # Worker 0 records its own failures (exit code 1); here it was stopped or crashed
+            ProgressReporter(args.job_id, args.connection_string).finish(
+                0, "Training failed", f"Distributed training workers exited with codes {codes}")
+        sys.exit(0 if codes[0] == 0 else 1)
+    
+    trainer = ModelTrainer(job_id=args.job_id, connection_string=args.connection_string, **trainer_options)
     success = trainer.train()
     
+    if success is None:
+        sys.exit(EXIT_DEFERRED)
     sys.exit(0 if success else 1)
 
 
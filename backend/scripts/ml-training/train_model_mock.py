@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 """
 Mock ML Training Script for Testing
-Simulates training workflow without actual ML operations
-Completes in ~5 seconds for fast testing
+Simulates the training workflow without ML operations: progress updates, failures and
+TF.js artifacts of the real size, driven by load profiles. Worker mode runs many
+simulated jobs in parallel to load-test the training queue and the models/<version>
+download path. The default 'fast' profile completes in ~5 seconds for fast testing.
 """
 
 import os
 import sys
 import json
+import math
+import uuid
+import random
 import argparse
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
@@ -19,13 +25,61 @@ except ImportError:
     print("Warning: psycopg2 not installed, using mock database operations")
     psycopg2 = None
 
+# Job duration (seconds, +-20% per job), seconds between progress updates and share of failing jobs
+PROFILES = {
+    "fast": {"duration": 3.5, "progress_interval": 0.5, "failure_rate": 0.0},
+    "realistic": {"duration": 600, "progress_interval": 2.0, "failure_rate": 0.05},
+    "slow": {"duration": 1800, "progress_interval": 2.0, "failure_rate": 0.1},
+    "flaky": {"duration": 30, "progress_interval": 0.5, "failure_rate": 0.5}
+}
+
+# (progress, stage, share of the job duration), following train_model.py
+STAGES = [
+    (5, "Fetching product photos from database", 0.02),
+    (10, "Preparing dataset", 0.08),
+    (20, "Loading and augmenting images", 0.10),
+    (25, "Building model", 0.03),
+    (30, "Training", 0.62),
+    (85, "Exporting model to TensorFlow.js format", 0.10),
+    (95, "Updating model metadata in database", 0.05)
+]
+EPOCHS = 15
+
+# Exported network, as Dense layers that tf.loadLayersModel accepts: a stand-in for the
+# MobileNetV2 feature extractor of about its size (2.26M weights; 15 units over the flattened
+# image), producing FEATURE_DIM features, then the 128-unit hidden and softmax output layers
+IMAGE_SHAPE = [224, 224, 3]
+FEATURE_DIM = 1280
+HIDDEN_UNITS = 128
+BACKBONE_LAYERS = [("backbone", 15, "relu"), ("features", FEATURE_DIM, "relu")]  # (name, units, activation)
+SHARD_BYTES = 4 * 1024 * 1024  # tensorflowjs default weight shard size
+BYTES_PER_WEIGHT = {"none": 4, "float16": 2, "uint8": 1}
+
+# Claims the oldest queued job, as training_worker.py does
+CLAIM_JOB_SQL = """
+    UPDATE "ModelTrainingJobs"
+    SET "Status" = 'InProgress',
+        "StartedAt" = NOW(),
+        "ProgressPercentage" = 0,
+        "CurrentStage" = 'Claimed by mock worker',
+        "UpdatedAt" = NOW()
+    WHERE "Id" = (
+        SELECT "Id" FROM "ModelTrainingJobs"
+        WHERE "Status" = 'Queued'
+        ORDER BY "CreatedAt"
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING "Id"
+"""
+
 
 def update_job_progress(conn, job_id, progress, stage, error=None):
     """Updates training job status"""
     if not conn:
-        print(f"[MOCK] Progress: {progress}% - {stage}")
+        print(f"[MOCK] {job_id} Progress: {progress}% - {stage}")
         return
-        
+
     cursor = conn.cursor()
     if error:
         cursor.execute("""
@@ -47,33 +101,200 @@ def update_job_progress(conn, job_id, progress, stage, error=None):
                 "UpdatedAt" = NOW()
             WHERE "Id" = %s
         """, (progress, stage, job_id))
-    
+
     conn.commit()
-    print(f"Progress: {progress}% - {stage}")
+    print(f"{job_id} Progress: {progress}% - {stage}")
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--job-id', required=True)
-    parser.add_argument('--connection-string', required=True)
-    parser.add_argument('--storage-path', required=True)
-    parser.add_argument('--output-path', required=True)
-    
-    args = parser.parse_args()
-    
-    print(f"=== Mock Training Started ===")
-    print(f"Job ID: {args.job_id}")
-    
-    conn = None
+def connect(connection_string):
+    if not psycopg2:
+        return None
     try:
-        if psycopg2:
-            conn = psycopg2.connect(args.connection_string)
+        return psycopg2.connect(connection_string)
     except Exception as e:
         print(f"Could not connect to database: {e}")
-    
+        return None
+
+
+def load_products(conn, fallback_count):
+    """
+    Returns (product id, SKU) pairs in the class order train_model.py uses (active products
+    with photos, by product id) and the photo count; synthetic products without a database
+    """
+    if not conn:
+        return [(f"mock-product-{i + 1}", f"MOCK-{i + 1:04d}") for i in range(fallback_count)], fallback_count * 5
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT p."Id", p."SKU", COUNT(pp."Id")
+        FROM "Products" p
+        INNER JOIN "ProductPhotos" pp ON pp."ProductId" = p."Id"
+        WHERE p."IsActive" = true
+        GROUP BY p."Id", p."SKU"
+        ORDER BY p."Id"
+    """)
+    rows = cursor.fetchall()
+    return [(str(row[0]), row[1]) for row in rows], sum(row[2] for row in rows)
+
+
+def _dense_layer(name, units, activation, batch_input_shape=None):
+    config = {
+        "name": name, "trainable": True, "dtype": "float32", "units": units,
+        "activation": activation, "use_bias": True,
+        "kernel_initializer": {"class_name": "GlorotUniform", "config": {"seed": None}},
+        "bias_initializer": {"class_name": "Zeros", "config": {}},
+        "kernel_regularizer": None, "bias_regularizer": None, "activity_regularizer": None,
+        "kernel_constraint": None, "bias_constraint": None
+    }
+    if batch_input_shape:
+        config["batch_input_shape"] = batch_input_shape
+    return {"class_name": "Dense", "config": config}
+
+
+def write_tfjs_artifact(model_dir, input_shape, layers, quantization):
+    """
+    Writes model.json and group1-shard*of*.bin files of the size tensorflowjs produces for a
+    Sequential model of (name, units, activation) Dense layers on input_shape (flattened
+    first if it has more than one dimension). Shards hold random bytes, so they do not
+    compress better than real weights in transit. Returns the total weight bytes.
+    """
+    batch_input_shape = [None, *input_shape]
+    topology = []
+    if len(input_shape) > 1:
+        topology.append({"class_name": "Flatten", "config": {
+            "name": "flatten", "trainable": True, "dtype": "float32",
+            "data_format": "channels_last", "batch_input_shape": batch_input_shape}})
+    weights = []  # (name, shape) in layer order, as listed in the weights manifest
+    inputs = math.prod(input_shape)
+    for name, units, activation in layers:
+        topology.append(_dense_layer(name, units, activation, None if topology else batch_input_shape))
+        weights += [(f"{name}/kernel", [inputs, units]), (f"{name}/bias", [units])]
+        inputs = units
+
+    bytes_per_weight = BYTES_PER_WEIGHT[quantization]
+    total_bytes = sum(math.prod(shape) for _, shape in weights) * bytes_per_weight
+    num_shards = max(1, math.ceil(total_bytes / SHARD_BYTES))
+    paths = [f"group1-shard{i + 1}of{num_shards}.bin" for i in range(num_shards)]
+
+    remaining = total_bytes
+    for path in paths:
+        size = min(SHARD_BYTES, remaining)
+        with open(model_dir / path, 'wb') as f:
+            f.write(os.urandom(size))
+        remaining -= size
+
+    manifest_weights = []
+    for name, shape in weights:
+        entry = {"name": name, "shape": shape, "dtype": "float32"}
+        if quantization == 'uint8':
+            entry["quantization"] = {"dtype": "uint8", "min": -1.0, "scale": 2 / 255, "original_dtype": "float32"}
+        elif quantization != 'none':
+            entry["quantization"] = {"dtype": quantization, "original_dtype": "float32"}
+        manifest_weights.append(entry)
+
+    model_json = {
+        "format": "layers-model",
+        "generatedBy": "mock-training",
+        "convertedBy": "TensorFlow.js Converter",
+        "modelTopology": {
+            "class_name": "Sequential",
+            "config": {"name": "sequential", "layers": topology},
+            "keras_version": "2.15.0",
+            "backend": "tensorflow"
+        },
+        "weightsManifest": [{"paths": paths, "weights": manifest_weights}]
+    }
+    with open(model_dir / "model.json", 'w') as f:
+        json.dump(model_json, f)
+
+    return total_bytes
+
+
+def new_version(output_path):
+    """Creates the version directory, bumping the timestamp if a parallel job took it"""
+    timestamp = int(datetime.utcnow().timestamp())
+    while True:
+        version = f"v{timestamp}_{datetime.utcnow().strftime('%Y%m%d')}"
+        try:
+            (output_path / version).mkdir(parents=True)
+            return version
+        except FileExistsError:
+            timestamp += 1
+
+
+def export_artifacts(output_path, products, layout, quantization):
+    """Writes a model version like export_model does; returns (version, bytes written)"""
+    num_classes = len(products)
+    head = [("dense", HIDDEN_UNITS, "relu"), ("predictions", num_classes, "softmax")]
+
+    version = new_version(output_path)
+    model_dir = output_path / version
+    metadata = {
+        "version": version,
+        "trained_at": datetime.utcnow().isoformat(),
+        "num_products": num_classes,
+        "validation_accuracy": 0.85,
+        "model_architecture": "MobileNetV2",
+        "input_size": [224, 224],
+        "description": "Mock jewelry product classification model",
+        "mock": True
+    }
+
+    size = 0
+    if layout == 'split':
+        # Shared backbone artifact, written once per quantization mode
+        backbone_name = f"backbone-mock-{quantization}"
+        backbone_dir = output_path / backbone_name
+        if not (backbone_dir / "model.json").exists():
+            tmp_dir = output_path / f".tmp-{backbone_name}-{uuid.uuid4().hex[:8]}"
+            tmp_dir.mkdir(parents=True)
+            size += write_tfjs_artifact(tmp_dir, IMAGE_SHAPE, BACKBONE_LAYERS, quantization)
+            try:
+                os.replace(tmp_dir, backbone_dir)
+            except OSError:
+                pass  # Another mock job published it first
+        metadata["layout"] = "split"
+        metadata["backbone"] = {"hash": backbone_name, "path": f"models/{backbone_name}",
+                                "model_file": "model.json", "output_dim": FEATURE_DIM}
+        metadata["head"] = {"hash": version, "model_file": "model.json", "input_dim": FEATURE_DIM}
+        with open(model_dir / "class_labels.json", 'w') as f:
+            json.dump({"labels": [sku for _, sku in products], "trainedAt": metadata["trained_at"],
+                       "version": version}, f, indent=2)
+        size += write_tfjs_artifact(model_dir, [FEATURE_DIM], head, quantization)
+    else:
+        size += write_tfjs_artifact(model_dir, IMAGE_SHAPE, BACKBONE_LAYERS + head, quantization)
+
+    with open(model_dir / "product_mapping.json", 'w') as f:
+        json.dump({idx: product_id for idx, (product_id, _) in enumerate(products)}, f, indent=2)
+    metadata["quantization"] = {"mode": quantization, "size_bytes": size}
+    with open(model_dir / "metadata.json", 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    return version, size
+
+
+def run_job(job_id, args, conn, claimed=False):
+    """Simulates one training job; returns a result dict"""
+    rng = random.Random(f"{args.seed}:{job_id}")
+    duration = args.duration * rng.uniform(0.8, 1.2)
+    failing_stage = rng.randrange(len(STAGES)) if rng.random() < args.failure_rate else None
+    start = time.perf_counter()
+
+    print("=== Mock Training Started ===")
+    print(f"Job ID: {job_id}")
+
+    def wait(seconds, on_tick=None):
+        """Sleeps for seconds, calling on_tick(fraction done) every progress interval"""
+        elapsed = 0.0
+        while elapsed < seconds:
+            step = min(args.progress_interval, seconds - elapsed)
+            time.sleep(step)
+            elapsed += step
+            if on_tick:
+                on_tick(elapsed / seconds)
+
     try:
-        # Simulate training steps
-        if conn:
+        if conn and not claimed:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE "ModelTrainingJobs"
@@ -81,81 +302,59 @@ def main():
                     "StartedAt" = NOW(),
                     "UpdatedAt" = NOW()
                 WHERE "Id" = %s
-            """, (args.job_id,))
+            """, (job_id,))
             conn.commit()
-        
-        update_job_progress(conn, args.job_id, 10, "Fetching photos")
-        time.sleep(0.5)
-        
-        update_job_progress(conn, args.job_id, 30, "Building model")
-        time.sleep(0.5)
-        
-        update_job_progress(conn, args.job_id, 50, "Training epoch 5/10")
-        time.sleep(1)
-        
-        update_job_progress(conn, args.job_id, 70, "Training epoch 8/10")
-        time.sleep(1)
-        
-        update_job_progress(conn, args.job_id, 85, "Exporting model")
-        time.sleep(0.5)
-        
-        # Create mock model files
-        version = f"v{int(datetime.utcnow().timestamp())}_{datetime.utcnow().strftime('%Y%m%d')}"
-        output_path = Path(args.output_path)
-        model_dir = output_path / version
-        model_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Create mock model.json
-        model_json = {
-            "format": "graph-model",
-            "generatedBy": "mock-training",
-            "convertedBy": "TensorFlow.js Converter",
-            "modelTopology": {"node": []},
-            "weightsManifest": [
-                {
-                    "paths": ["group1-shard1of1.bin"],
-                    "weights": []
-                }
-            ]
-        }
-        
-        with open(model_dir / "model.json", 'w') as f:
-            json.dump(model_json, f)
-        
-        # Create mock weight file
-        with open(model_dir / "group1-shard1of1.bin", 'wb') as f:
-            f.write(b'\x00' * 1024)  # 1KB mock binary
-        
-        # Create product mapping
-        mapping = {"0": "product-1", "1": "product-2"}
-        with open(model_dir / "product_mapping.json", 'w') as f:
-            json.dump(mapping, f)
-        
-        update_job_progress(conn, args.job_id, 95, "Updating database")
-        time.sleep(0.5)
-        
+
+        products, num_photos = load_products(conn, args.products)
+        if len(products) < 2:
+            raise ValueError("At least 2 products with photos required for training")
+
+        version, size = None, 0
+        for i, (progress, stage, share) in enumerate(STAGES):
+            update_job_progress(conn, job_id, progress, stage)
+            seconds = duration * share
+            if i == failing_stage:
+                wait(seconds * rng.random())
+                raise RuntimeError(f"Simulated failure during: {stage}")
+
+            if stage == "Training":
+                def on_epoch(done):
+                    epoch = max(1, math.ceil(done * EPOCHS))
+                    remaining = seconds * (1 - done)
+                    update_job_progress(conn, job_id, 30 + int(50 * done),
+                                        f"Training epoch {epoch}/{EPOCHS} - ETA {int(remaining)}s")
+                wait(seconds, on_epoch)
+            else:
+                wait(seconds)
+
+            if progress == 85:
+                version, size = export_artifacts(Path(args.output_path), products, args.layout, args.quantization)
+
         if conn:
-            # Update ModelMetadata
+            # Update ModelMetadata; split versions are recorded but not activated, as by train_model.py
             cursor = conn.cursor()
+            activate = args.layout != 'split'
+            if activate:
+                cursor.execute("""
+                    UPDATE "ModelMetadata"
+                    SET "IsActive" = false
+                    WHERE "IsActive" = true
+                """)
+
             cursor.execute("""
-                UPDATE "ModelMetadata"
-                SET "IsActive" = false
-                WHERE "IsActive" = true
-            """)
-            
-            cursor.execute("""
-                INSERT INTO "ModelMetadata" 
-                ("Id", "Version", "TrainedAt", "ModelPath", "AccuracyMetrics", 
+                INSERT INTO "ModelMetadata"
+                ("Id", "Version", "TrainedAt", "ModelPath", "AccuracyMetrics",
                  "TotalPhotosUsed", "TotalProductsUsed", "IsActive", "CreatedAt", "UpdatedAt")
-                VALUES (gen_random_uuid(), %s, NOW(), %s, %s, %s, %s, true, NOW(), NOW())
+                VALUES (gen_random_uuid(), %s, NOW(), %s, %s, %s, %s, %s, NOW(), NOW())
             """, (
                 version,
                 f"models/{version}",
-                '{"validation_accuracy": 0.85}',
-                10,
-                2
+                json.dumps({"validation_accuracy": 0.85, "size_bytes": size}),
+                num_photos,
+                len(products),
+                activate
             ))
-            
+
             cursor.execute("""
                 UPDATE "ModelTrainingJobs"
                 SET "Status" = 'Completed',
@@ -166,21 +365,170 @@ def main():
                     "DurationSeconds" = EXTRACT(EPOCH FROM (NOW() - "StartedAt"))::int,
                     "UpdatedAt" = NOW()
                 WHERE "Id" = %s
-            """, (version, args.job_id))
-            
+            """, (version, job_id))
+
             conn.commit()
-        
-        print(f"Mock training completed successfully: {version}")
-        sys.exit(0)
-        
+
+        print(f"Mock training completed successfully: {version} ({size / 1e6:.1f} MB)")
+        return {"job_id": job_id, "status": "Completed", "version": version, "bytes": size,
+                "seconds": round(time.perf_counter() - start, 2)}
+
     except Exception as e:
         print(f"Mock training failed: {e}")
         if conn:
-            update_job_progress(conn, args.job_id, 0, "Failed", str(e))
-        sys.exit(1)
+            conn.rollback()
+            update_job_progress(conn, job_id, 0, "Failed", str(e))
+        return {"job_id": job_id, "status": "Failed", "error": str(e),
+                "seconds": round(time.perf_counter() - start, 2)}
+
+
+def enqueue_jobs(conn, count):
+    """Inserts queued jobs initiated by the first user, like the API does on request"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT "Id" FROM "Users" ORDER BY "CreatedAt" LIMIT 1')
+    row = cursor.fetchone()
+    if not row:
+        raise ValueError("No user found to initiate the queued jobs")
+    for _ in range(count):
+        cursor.execute("""
+            INSERT INTO "ModelTrainingJobs"
+            ("Id", "InitiatedBy", "Status", "ProgressPercentage", "CreatedAt", "UpdatedAt")
+            VALUES (gen_random_uuid(), %s, 'Queued', 0, NOW(), NOW())
+        """, (row[0],))
+    conn.commit()
+    print(f"Enqueued {count} jobs")
+
+
+def run_worker(args):
+    """
+    Runs --concurrency threads that each claim queued jobs and simulate them, until
+    --max-jobs have run or the queue stays empty for --idle-timeout seconds. Without a
+    database, --max-jobs jobs with generated ids are simulated.
+    """
+    if args.enqueue:
+        conn = connect(args.connection_string)
+        if not conn:
+            raise SystemExit("--enqueue requires a database connection")
+        enqueue_jobs(conn, args.enqueue)
+        conn.close()
+
+    probe = connect(args.connection_string)
+    if probe:
+        probe.close()
+    max_jobs = args.max_jobs if args.max_jobs is not None or probe else args.concurrency
+
+    results = []
+    lock = threading.Lock()
+    claimed = [0]
+
+    def next_job(conn):
+        with lock:
+            if max_jobs is not None and claimed[0] >= max_jobs:
+                return None
+            claimed[0] += 1
+        if not conn:
+            return str(uuid.uuid4())
+
+        idle_since = time.monotonic()
+        while time.monotonic() - idle_since < args.idle_timeout:
+            cursor = conn.cursor()
+            cursor.execute(CLAIM_JOB_SQL)
+            row = cursor.fetchone()
+            conn.commit()
+            if row:
+                return str(row[0])
+            time.sleep(1)
+        with lock:
+            claimed[0] -= 1
+        return None
+
+    def loop():
+        conn = connect(args.connection_string)
+        try:
+            while True:
+                job_id = next_job(conn)
+                if job_id is None:
+                    return
+                result = run_job(job_id, args, conn, claimed=True)
+                with lock:
+                    results.append(result)
+        finally:
+            if conn:
+                conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=loop, name=f"mock-worker-{i}") for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    completed = [r for r in results if r["status"] == "Completed"]
+    durations = sorted(r["seconds"] for r in results)
+    summary = {
+        "jobs": len(results),
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "wall_seconds": round(time.perf_counter() - start, 2),
+        "job_seconds_median": durations[len(durations) // 2] if durations else None,
+        "job_seconds_max": durations[-1] if durations else None,
+        "artifact_bytes": sum(r["bytes"] for r in completed)
+    }
+    print(json.dumps(summary, indent=2))
+    return summary["failed"] == 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--job-id', help='Training job ID; required unless --worker is used')
+    parser.add_argument('--connection-string', required=True)
+    parser.add_argument('--storage-path', required=True)
+    parser.add_argument('--output-path', required=True)
+    parser.add_argument('--mock-profile', choices=sorted(PROFILES), default='fast',
+                        help='Duration, progress update interval and failure rate preset')
+    parser.add_argument('--duration', type=float, default=None, help='Seconds per job (overrides the profile)')
+    parser.add_argument('--progress-interval', type=float, default=None,
+                        help='Seconds between progress updates (overrides the profile)')
+    parser.add_argument('--failure-rate', type=float, default=None,
+                        help='Share of jobs that fail at a random stage (overrides the profile)')
+    parser.add_argument('--layout', choices=['full', 'split'], default='full',
+                        help='Artifact layout, as --export-layout of train_model.py')
+    parser.add_argument('--quantization', choices=['none', 'float16', 'uint8'], default='none',
+                        help='Artifact weight precision, as --quantization of train_model.py')
+    parser.add_argument('--products', type=int, default=2,
+                        help='Synthetic products in the mapping when no database is available')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for durations and failures')
+    parser.add_argument('--worker', action='store_true',
+                        help='Claim queued jobs and simulate them, --concurrency at a time')
+    parser.add_argument('--concurrency', type=int, default=4, help='Parallel simulated jobs in worker mode')
+    parser.add_argument('--max-jobs', type=int, default=None, help='Stop worker mode after this many jobs')
+    parser.add_argument('--idle-timeout', type=float, default=10,
+                        help='Stop a worker thread after the queue has been empty this long')
+    parser.add_argument('--enqueue', type=int, default=0,
+                        help='Insert this many queued jobs before starting worker mode')
+
+    # Training flags passed by the BackgroundService (e.g. --time-budget, --resume) are accepted and ignored
+    args, ignored = parser.parse_known_args()
+    if ignored:
+        print(f"Ignoring training options: {' '.join(ignored)}")
+    if not args.worker and not args.job_id:
+        parser.error('--job-id is required unless --worker is used')
+
+    profile = PROFILES[args.mock_profile]
+    for key in profile:
+        if getattr(args, key) is None:
+            setattr(args, key, profile[key])
+
+    if args.worker:
+        sys.exit(0 if run_worker(args) else 1)
+
+    conn = connect(args.connection_string)
+    try:
+        result = run_job(args.job_id, args, conn)
     finally:
         if conn:
             conn.close()
+    sys.exit(0 if result["status"] == "Completed" else 1)
 
 
 if __name__ == "__main__":
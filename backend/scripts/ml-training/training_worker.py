@@ -0,0 +1,216 @@
+"""
+Resident training worker
+Claims queued ModelTrainingJobs rows and runs them through ModelTrainer in a single
+long-lived process, so imports, the MobileNetV2 backbone and the photo/feature caches
+are loaded once per deploy instead of once per job
+"""
+
+import gc
+import select
+import signal
+import time
+import logging
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "model_training_jobs"
+
+# Claims the oldest queued job; SKIP LOCKED lets several workers poll the same table
+CLAIM_JOB_SQL = """
+    UPDATE "ModelTrainingJobs"
+    SET "Status" = 'InProgress',
+        "StartedAt" = NOW(),
+        "ProgressPercentage" = 0,
+        "CurrentStage" = 'Claimed by training worker',
+        "UpdatedAt" = NOW()
+    WHERE "Id" = (
+        SELECT "Id" FROM "ModelTrainingJobs"
+        WHERE "Status" = 'Queued'
+        ORDER BY "CreatedAt"
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING "Id"
+"""
+
+# Seconds an InProgress job must have been idle before recovery touches it, so a job another
+# worker has just claimed (and not yet locked) is left alone
+RECOVERY_GRACE_SECONDS = 60
+
+# Run while holding the training lock, so no training is running: InProgress jobs were
+# interrupted (e.g. by a restart). Each is queued again to resume from its checkpoint,
+# or marked Failed once it has been retried max_retries times.
+RECOVER_JOBS_SQL = """
+    UPDATE "ModelTrainingJobs"
+    SET "Status" = CASE WHEN "RetryCount" < %(max_retries)s THEN 'Queued' ELSE 'Failed' END,
+        "CurrentStage" = CASE WHEN "RetryCount" < %(max_retries)s
+            THEN 'Queued - resuming after interruption (retry ' || ("RetryCount" + 1) || ' of ' || %(max_retries)s || ')'
+            ELSE "CurrentStage" END,
+        "ErrorMessage" = CASE WHEN "RetryCount" < %(max_retries)s THEN "ErrorMessage"
+            ELSE 'Training was interrupted ' || ("RetryCount" + 1) || ' times; not retrying again' END,
+        "CompletedAt" = CASE WHEN "RetryCount" < %(max_retries)s THEN "CompletedAt" ELSE NOW() END,
+        "DurationSeconds" = CASE WHEN "RetryCount" < %(max_retries)s THEN "DurationSeconds"
+            ELSE EXTRACT(EPOCH FROM NOW() - "StartedAt")::integer END,
+        "RetryCount" = LEAST("RetryCount" + 1, %(max_retries)s),
+        "UpdatedAt" = NOW()
+    WHERE "Status" = 'InProgress'
+      AND "UpdatedAt" < NOW() - %(grace_seconds)s * INTERVAL '1 second'
+    RETURNING "Id", "Status"
+"""
+
+# Requests coalesced into a job that was marked Failed need a training of their own
+RELEASE_SUPERSEDED_JOBS_SQL = """
+    UPDATE "ModelTrainingJobs"
+    SET "Status" = 'Queued',
+        "SupersededByJobId" = NULL,
+        "CurrentStage" = 'Queued - the training covering this job failed',
+        "UpdatedAt" = NOW()
+    WHERE "SupersededByJobId" = ANY(%s::uuid[]) AND "Status" = 'Superseded'
+"""
+
+
+class TrainingWorker:
+    """Polls ModelTrainingJobs for queued jobs (woken early by NOTIFY) and trains them with warm state"""
+
+    def __init__(self, trainer_class, connection_string, trainer_options, poll_interval=10, max_jobs=None,
+                 max_retries=3):
+        self.trainer_class = trainer_class  # ModelTrainer (passed in so train_model.py is not imported twice)
+        self.connection_string = connection_string
+        self.trainer_options = trainer_options  # ModelTrainer keyword arguments shared by every job
+        self.poll_interval = poll_interval
+        self.max_jobs = max_jobs  # Exit after this many jobs (None: run until stopped)
+        self.max_retries = max_retries  # Times an interrupted job is queued again before it is marked Failed
+        self.conn = None
+        self.stopping = False
+        self.jobs_run = 0
+
+        # Warm state handed from one ModelTrainer to the next
+        self.base_model = None
+        self.image_cache = None
+        self.feature_cache = None
+        self.augmentation = None
+        self.storage = None  # Photo storage backend (keeps its pooled S3 connections)
+
+    def _connect(self):
+        self.conn = psycopg2.connect(self.connection_string)
+        self.conn.autocommit = True
+        cursor = self.conn.cursor()
+        cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        logger.info(f"Worker connected, listening on '{NOTIFY_CHANNEL}' (poll fallback every {self.poll_interval}s)")
+
+    def _stop(self, signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current job")
+        self.stopping = True
+
+    def claim_job(self):
+        """Atomically marks the oldest queued job InProgress and returns its id, or None"""
+        cursor = self.conn.cursor()
+        cursor.execute(CLAIM_JOB_SQL)
+        row = cursor.fetchone()
+        return str(row[0]) if row else None
+
+    def recover_interrupted_jobs(self):
+        """
+        Queues jobs left InProgress by an interrupted run again (the BackgroundService does this
+        on startup, but is disabled when an external worker processes the queue). Skipped while
+        another training holds the deployment lock, since its job is not interrupted.
+        """
+        trainer = self.trainer_class(job_id='worker', connection_string=self.connection_string, **self.trainer_options)
+        if not trainer.acquire_training_lock():
+            logger.info("A training is running; not recovering InProgress jobs")
+            return
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(RECOVER_JOBS_SQL, {"max_retries": self.max_retries, "grace_seconds": RECOVERY_GRACE_SECONDS})
+            rows = cursor.fetchall()
+            failed = [str(job_id) for job_id, status in rows if status == 'Failed']
+            if failed:
+                cursor.execute(RELEASE_SUPERSEDED_JOBS_SQL, (failed,))
+        finally:
+            trainer.lock_conn.close()
+
+        for job_id, status in rows:
+            if status == 'Failed':
+                logger.warning(f"Interrupted training job {job_id} reached {self.max_retries} retries; marked Failed")
+            else:
+                logger.warning(f"Re-queued interrupted training job {job_id}")
+
+    def wait_for_jobs(self):
+        """Blocks until a NOTIFY arrives or the poll interval elapses"""
+        readable, _, _ = select.select([self.conn], [], [], self.poll_interval)
+        if readable:
+            self.conn.poll()
+            self.conn.notifies.clear()
+
+    def warm_up(self):
+        """Loads the backbone once so the first job does not pay for it"""
+        start = time.perf_counter()
+        trainer = self.trainer_class(job_id='worker', connection_string=self.connection_string, **self.trainer_options)
+        self.base_model = trainer._load_backbone()
+        logger.info(f"Backbone loaded in {time.perf_counter() - start:.1f}s")
+
+    def run_job(self, job_id):
+        """
+        Trains one claimed job, reusing the backbone and caches of previous jobs. Returns
+        None if the job was deferred because another training holds the deployment lock.
+        """
+        trainer = self.trainer_class(job_id=job_id, connection_string=self.connection_string, **self.trainer_options)
+        trainer.base_model = self.base_model
+        trainer.image_cache = self.image_cache
+        trainer.feature_cache = self.feature_cache
+        trainer.augmentation = self.augmentation
+        trainer.storage = self.storage
+        trainer.claimed = True  # The claim marked the job InProgress; a deferred job is put back in the queue
+
+        success = None
+        try:
+            success = trainer.train()
+            return success
+        finally:
+            self.base_model = trainer.base_model
+            self.image_cache = trainer.image_cache
+            self.feature_cache = trainer.feature_cache
+            self.augmentation = trainer.augmentation
+            self.storage = trainer.storage
+            if success is not None:
+                self.jobs_run += 1
+            del trainer
+            gc.collect()
+
+    def run(self):
+        """Main loop: claim and train jobs until stopped (SIGTERM/SIGINT) or max_jobs is reached"""
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.warm_up()
+
+        while not self.stopping and (self.max_jobs is None or self.jobs_run < self.max_jobs):
+            try:
+                if self.conn is None or self.conn.closed:
+                    self._connect()
+                    self.recover_interrupted_jobs()
+
+                job_id = self.claim_job()
+                if job_id is None:
+                    self.wait_for_jobs()
+                    continue
+
+                logger.info(f"Claimed training job {job_id}")
+                success = self.run_job(job_id)
+                if success is None:
+                    # Another process is training; wait instead of claiming the job straight back
+                    time.sleep(self.poll_interval)
+                    continue
+                logger.info(f"Training job {job_id} {'completed' if success else 'failed'} "
+                            f"({self.jobs_run} jobs run by this worker)")
+            except psycopg2.OperationalError as e:
+                logger.error(f"Database connection lost: {e}; reconnecting in {self.poll_interval}s")
+                if self.conn is not None:
+                    self.conn.close()
+                self.conn = None
+                time.sleep(self.poll_interval)
+
+        if self.conn is not None:
+            self.conn.close()
+        logger.info(f"Worker stopped after {self.jobs_run} jobs")
@@ -11,7 +11,7 @@ public class TrainingJobStatusDto
     public Guid JobId { get; set; }
 
     /// <summary>
-    /// Current status (Queued, InProgress, Completed, Failed).
+    /// Current status (Queued, InProgress, Superseded, Completed, Failed).
     /// </summary>
     public string Status { get; set; } = string.Empty;
 
@@ -49,4 +49,9 @@ public class TrainingJobStatusDto
     /// Duration in seconds.
     /// </summary>
     public int? DurationSeconds { get; set; }
+
+    /// <summary>
+    /// Job whose training covers this request, if it was coalesced into another run.
+    /// </summary>
+    public Guid? SupersededByJobId { get; set; }
 }
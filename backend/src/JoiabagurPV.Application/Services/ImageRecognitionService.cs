@@ -409,7 +409,8 @@ public class ImageRecognitionService : IImageRecognitionService
             CompletedAt = job.CompletedAt,
             ErrorMessage = job.ErrorMessage,
             ResultModelVersion = job.ResultModelVersion,
-            DurationSeconds = job.DurationSeconds
+            DurationSeconds = job.DurationSeconds,
+            SupersededByJobId = job.SupersededByJobId
         };
     }
 
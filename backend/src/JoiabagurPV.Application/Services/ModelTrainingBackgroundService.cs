@@ -20,6 +20,12 @@ public class ModelTrainingBackgroundService : BackgroundService
     private readonly ILogger<ModelTrainingBackgroundService> _logger;
     private readonly TimeSpan _pollInterval = TimeSpan.FromSeconds(10);
 
+    // Exit code of train_model.py when another training holds the deployment-wide training lock
+    private const int DeferredExitCode = 75;
+
+    // Times an interrupted job is queued again before it is marked Failed (ModelTraining:MaxInterruptedRetries)
+    private const int DefaultMaxInterruptedRetries = 3;
+
     public ModelTrainingBackgroundService(
         IServiceProvider serviceProvider,
         IConfiguration configuration,
@@ -32,8 +38,24 @@ public class ModelTrainingBackgroundService : BackgroundService
 
     protected override async Task ExecuteAsync(CancellationToken stoppingToken)
     {
+        if (bool.TryParse(_configuration["ModelTraining:UseExternalWorker"], out var useExternalWorker) && useExternalWorker)
+        {
+            // Jobs are claimed by a resident `train_model.py --worker` process instead
+            _logger.LogInformation("Model Training Background Service disabled: jobs are processed by an external training worker");
+            return;
+        }
+
         _logger.LogInformation("Model Training Background Service started");
 
+        try
+        {
+            await RequeueInterruptedJobsAsync(stoppingToken);
+        }
+        catch (Exception ex)
+        {
+            _logger.LogError(ex, "Error re-queuing interrupted training jobs");
+        }
+
         while (!stoppingToken.IsCancellationRequested)
         {
             try
@@ -51,6 +73,50 @@ public class ModelTrainingBackgroundService : BackgroundService
         _logger.LogInformation("Model Training Background Service stopped");
     }
 
+    /// <summary>
+    /// Jobs still InProgress when the service starts were interrupted (e.g. an instance restart),
+    /// since this service runs one job at a time. They are queued again and resume from their
+    /// last epoch checkpoint, up to ModelTraining:MaxInterruptedRetries times; a job interrupted
+    /// more often (e.g. one that crashes the instance) is marked Failed.
+    /// </summary>
+    private async Task RequeueInterruptedJobsAsync(CancellationToken stoppingToken)
+    {
+        using var scope = _serviceProvider.CreateScope();
+        var jobRepository = scope.ServiceProvider.GetRequiredService<IModelTrainingJobRepository>();
+        var unitOfWork = scope.ServiceProvider.GetRequiredService<IUnitOfWork>();
+
+        var maxRetries = int.TryParse(_configuration["ModelTraining:MaxInterruptedRetries"], out var configuredRetries)
+            ? configuredRetries
+            : DefaultMaxInterruptedRetries;
+
+        var interruptedJobs = await jobRepository.GetAll()
+            .Where(j => j.Status == "InProgress")
+            .ToListAsync(stoppingToken);
+
+        var requeued = 0;
+        foreach (var job in interruptedJobs)
+        {
+            if (job.RetryCount >= maxRetries)
+            {
+                await MarkJobAsFailedAsync(job.Id, $"Training was interrupted {job.RetryCount + 1} times; not retrying again");
+                continue;
+            }
+
+            job.Status = "Queued";
+            job.RetryCount++;
+            job.CurrentStage = $"Queued - resuming after interruption (retry {job.RetryCount} of {maxRetries})";
+            await jobRepository.UpdateAsync(job);
+            requeued++;
+            _logger.LogWarning("Re-queued interrupted training job {JobId} (retry {RetryCount} of {MaxRetries})",
+                job.Id, job.RetryCount, maxRetries);
+        }
+
+        if (requeued > 0)
+        {
+            await unitOfWork.SaveChangesAsync();
+        }
+    }
+
     private async Task ProcessQueuedJobsAsync(CancellationToken stoppingToken)
     {
         using var scope = _serviceProvider.CreateScope();
@@ -77,9 +143,11 @@ public class ModelTrainingBackgroundService : BackgroundService
         {
             // Get configuration
             var pythonPath = _configuration["ModelTraining:PythonPath"] ?? "python";
+            // train_model_mock.py can be configured here to load-test the queue without TensorFlow
+            var scriptName = _configuration["ModelTraining:Script"] ?? "train_model.py";
             var scriptPath = Path.Combine(
                 Directory.GetCurrentDirectory(),
-                "..", "..", "scripts", "ml-training", "train_model.py"
+                "..", "..", "scripts", "ml-training", scriptName
             );
             
             // Normalize path for cross-platform compatibility
@@ -102,12 +170,38 @@ public class ModelTrainingBackgroundService : BackgroundService
             // Get database connection string
             var connectionString = _configuration.GetConnectionString("DefaultConnection");
 
+            // The script plans its epochs to finish (including export) before the process is killed
+            var timeoutMinutes = int.TryParse(_configuration["ModelTraining:TimeoutMinutes"], out var minutes) ? minutes : 120;
+            var timeout = TimeSpan.FromMinutes(timeoutMinutes);
+            var timeBudgetSeconds = (int)Math.Max(timeout.TotalSeconds - 120, 60);
+
             // Prepare Python command
             var arguments = $"\"{scriptPath}\" " +
                           $"--job-id \"{job.Id}\" " +
                           $"--connection-string \"{connectionString}\" " +
                           $"--storage-path \"{storagePath}\" " +
-                          $"--output-path \"{outputPath}\"";
+                          $"--output-path \"{outputPath}\" " +
+                          $"--time-budget {timeBudgetSeconds} " +
+                          "--resume";
+
+            // Photos uploaded to S3 are mirrored by the script into its cache directory
+            if (string.Equals(_configuration["FileStorage:Provider"], "s3", StringComparison.OrdinalIgnoreCase))
+            {
+                var bucketName = _configuration["Aws:S3:BucketName"];
+                arguments += $" --photo-storage s3 --s3-bucket \"{bucketName}\"";
+                // Same endpoint setting as the AWS SDK client used by S3FileStorageService
+                var serviceUrl = _configuration["AWS:ServiceURL"];
+                if (!string.IsNullOrEmpty(serviceUrl))
+                {
+                    arguments += $" --s3-endpoint-url \"{serviceUrl}\"";
+                }
+            }
+
+            var extraArguments = _configuration["ModelTraining:ExtraArguments"];
+            if (!string.IsNullOrWhiteSpace(extraArguments))
+            {
+                arguments += $" {extraArguments}";
+            }
 
             _logger.LogInformation("Executing training script: {PythonPath} {Arguments}", pythonPath, arguments);
 
@@ -152,14 +246,21 @@ public class ModelTrainingBackgroundService : BackgroundService
 
             // Wait for process to complete (with timeout)
             var completed = await Task.Run(() => 
-                process.WaitForExit((int)TimeSpan.FromHours(2).TotalMilliseconds), 
+                process.WaitForExit((int)timeout.TotalMilliseconds), 
                 stoppingToken);
 
             if (!completed)
             {
-                _logger.LogError("Training process timed out after 2 hours");
+                _logger.LogError("Training process timed out after {TimeoutMinutes} minutes", timeoutMinutes);
                 process.Kill();
-                await MarkJobAsFailedAsync(job.Id, "Training timed out after 2 hours");
+                await MarkJobAsFailedAsync(job.Id, $"Training timed out after {timeoutMinutes} minutes");
+                return;
+            }
+
+            if (process.ExitCode == DeferredExitCode)
+            {
+                // The job is still queued; the running training may cover it when it starts next
+                _logger.LogInformation("Training job {JobId} deferred: another training is running", job.Id);
                 return;
             }
 
@@ -201,6 +302,19 @@ public class ModelTrainingBackgroundService : BackgroundService
                 }
 
                 await jobRepository.UpdateAsync(job);
+
+                // Requests that were coalesced into this job need a training of their own
+                var supersededJobs = await jobRepository.GetAll()
+                    .Where(j => j.SupersededByJobId == jobId && j.Status == "Superseded")
+                    .ToListAsync();
+                foreach (var supersededJob in supersededJobs)
+                {
+                    supersededJob.Status = "Queued";
+                    supersededJob.SupersededByJobId = null;
+                    supersededJob.CurrentStage = "Queued - the training covering this job failed";
+                    await jobRepository.UpdateAsync(supersededJob);
+                }
+
                 await unitOfWork.SaveChangesAsync();
 
                 _logger.LogWarning("Marked job {JobId} as failed: {Error}", jobId, errorMessage);
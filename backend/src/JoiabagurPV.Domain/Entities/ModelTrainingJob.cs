@@ -14,7 +14,7 @@ public class ModelTrainingJob : BaseEntity
     /// <summary>
     /// Current status of the training job.
     /// </summary>
-    public required string Status { get; set; } // Queued, InProgress, Completed, Failed
+    public required string Status { get; set; } // Queued, InProgress, Superseded, Completed, Failed
 
     /// <summary>
     /// Current progress percentage (0-100).
@@ -51,6 +51,25 @@ public class ModelTrainingJob : BaseEntity
     /// </summary>
     public int? DurationSeconds { get; set; }
 
+    /// <summary>
+    /// Per-stage timing breakdown (JSON) recorded by the training script:
+    /// wall time, CPU time, peak memory and per-epoch throughput.
+    /// </summary>
+    public string? StageTimings { get; set; }
+
+    /// <summary>
+    /// The job whose training covers this one (Status Superseded until it finishes).
+    /// A queued job is superseded when another job starts training, since that run reads
+    /// the same or a newer catalog; on completion ResultModelVersion links to its model.
+    /// </summary>
+    public Guid? SupersededByJobId { get; set; }
+
+    /// <summary>
+    /// Times the job was queued again after being found InProgress with no training running
+    /// (e.g. an instance restart); it is marked Failed once the retry limit is reached.
+    /// </summary>
+    public int RetryCount { get; set; } = 0;
+
     /// <summary>
     /// Navigation property for the user who initiated training.
     /// </summary>
@@ -43,6 +43,17 @@ public class ModelTrainingJobConfiguration : IEntityTypeConfiguration<ModelTrain
 
         builder.Property(j => j.DurationSeconds);
 
+        builder.Property(j => j.StageTimings)
+            .HasColumnType("text");
+
+        builder.Property(j => j.SupersededByJobId);
+
+        builder.HasIndex(j => j.SupersededByJobId);
+
+        builder.Property(j => j.RetryCount)
+            .IsRequired()
+            .HasDefaultValue(0);
+
         builder.Property(j => j.CreatedAt)
             .IsRequired();
 
@@ -0,0 +1,28 @@
+﻿using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace JoiabagurPV.Infrastructure.Data.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddTrainingStageTimings : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.AddColumn<string>(
+                name: "StageTimings",
+                table: "ModelTrainingJobs",
+                type: "text",
+                nullable: true);
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.DropColumn(
+                name: "StageTimings",
+                table: "ModelTrainingJobs");
+        }
+    }
+}
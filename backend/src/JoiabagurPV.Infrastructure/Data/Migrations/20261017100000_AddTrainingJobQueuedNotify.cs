@@ -0,0 +1,39 @@
+﻿using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace JoiabagurPV.Infrastructure.Data.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddTrainingJobQueuedNotify : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            // Wakes resident training workers (LISTEN model_training_jobs) as soon as a job is queued
+            migrationBuilder.Sql("""
+                CREATE OR REPLACE FUNCTION notify_model_training_job_queued() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('model_training_jobs', NEW."Id"::text);
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER "TR_ModelTrainingJobs_NotifyQueued"
+                    AFTER INSERT OR UPDATE OF "Status" ON "ModelTrainingJobs"
+                    FOR EACH ROW
+                    WHEN (NEW."Status" = 'Queued')
+                    EXECUTE FUNCTION notify_model_training_job_queued();
+                """);
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.Sql("""
+                DROP TRIGGER IF EXISTS "TR_ModelTrainingJobs_NotifyQueued" ON "ModelTrainingJobs";
+                DROP FUNCTION IF EXISTS notify_model_training_job_queued();
+                """);
+        }
+    }
+}
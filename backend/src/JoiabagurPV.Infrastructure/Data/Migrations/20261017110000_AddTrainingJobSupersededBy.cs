@@ -0,0 +1,38 @@
+﻿using System;
+using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace JoiabagurPV.Infrastructure.Data.Migrations
+{
+    /// <inheritdoc />
+    public partial class AddTrainingJobSupersededBy : Migration
+    {
+        /// <inheritdoc />
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.AddColumn<Guid>(
+                name: "SupersededByJobId",
+                table: "ModelTrainingJobs",
+                type: "uuid",
+                nullable: true);
+
+            migrationBuilder.CreateIndex(
+                name: "IX_ModelTrainingJobs_SupersededByJobId",
+                table: "ModelTrainingJobs",
+                column: "SupersededByJobId");
+        }
+
+        /// <inheritdoc />
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.DropIndex(
+                name: "IX_ModelTrainingJobs_SupersededByJobId",
+                table: "ModelTrainingJobs");
+
+            migrationBuilder.DropColumn(
+                name: "SupersededByJobId",
+                table: "ModelTrainingJobs");
+        }
+    }
+}